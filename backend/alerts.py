@@ -0,0 +1,130 @@
+"""Incremental stock alert engine evaluated inside the ingest transaction.
+
+After a detection batch (or a planogram change) is applied, :func:`evaluate`
+re-derives the stock level of only the products whose count that batch
+changed (or whose planogram entry it wrote), using ``determine_stock_level``
+against ``shelf_state`` totals and the planogram, and reconciles the
+engine-owned alert types:
+
+* ``OUT`` opens ``OUT_OF_STOCK`` and ``LOW`` opens ``LOW_STOCK``, unless an
+  unresolved alert of that type already exists for the product;
+* any other open engine alert for a touched product is auto-resolved, so an
+  item that recovers (or moves from LOW to OUT) doesn't keep a stale alert.
+
+Everything is set-based: one stock total read and one open alert read per
+500 products, with the planogram from ``planogram_cache``, then at most one
+bulk INSERT and one UPDATE. A unique partial index on open ``(product_name,
+alert_type)`` backs the dedup: the INSERT skips rows another transaction
+opened since the read. A rescan that leaves every count unchanged
+costs nothing. Alerts with other ``alert_type`` values (e.g. posted by hand to
+``/alerts``) are never touched. Disable with ``ALERT_ENGINE=false``.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import Row, Select, false, select, update
+from sqlalchemy.orm import Session
+
+from backend import crud, events, models
+from backend.planogram import planogram_cache
+from backend.stock import determine_stock_level
+from backend.versioning import mark_changed
+
+# Stock level -> alert type owned by the engine.
+LEVEL_ALERTS = {"OUT": "OUT_OF_STOCK", "LOW": "LOW_STOCK"}
+ENGINE_ALERT_TYPES = tuple(LEVEL_ALERTS.values())
+
+_MESSAGES = {
+    "OUT_OF_STOCK": "{name} is out of stock",
+    "LOW_STOCK": "{name} is running low ({count} on shelf{expected})",
+}
+
+
+def _message(alert_type: str, product_name: str, count: int, expected) -> str:
+    return _MESSAGES[alert_type].format(
+        name=product_name,
+        count=count,
+        expected=f", expected {expected}" if expected else "",
+    )
+
+
+def open_alerts_query(product_names: List[str]) -> Select:
+    alert = models.Alert
+    return select(alert.id, alert.product_name, alert.alert_type, alert.message).where(
+        alert.product_name.in_(product_names),
+        alert.alert_type.in_(ENGINE_ALERT_TYPES),
+        alert.resolved == false(),
+    )
+
+
+def evaluate(db: Session, product_names: Iterable[str]) -> Dict[str, List[int]]:
+    """Open and auto-resolve engine alerts for ``product_names`` without committing.
+
+    Returns the ids of alerts opened and resolved.
+    """
+    names = sorted(set(product_names))
+    if not names:
+        return {"opened": [], "resolved": []}
+
+    totals = crud.get_stock_totals(db, names)
+    planograms = planogram_cache.get(db)
+    wanted: Dict[str, str] = {}
+    details: Dict[str, tuple] = {}
+    for name in names:
+        count = totals.get(name, 0)
+        planogram = planograms.get(name)
+        expected = planogram.expected_stock if planogram else None
+        alert_type = LEVEL_ALERTS.get(determine_stock_level(count, expected))
+        if alert_type:
+            wanted[name] = alert_type
+            details[name] = (count, expected)
+
+    alert = models.Alert
+    columns = (alert.id, alert.product_name, alert.alert_type, alert.message)
+    open_alerts: List[Row] = []
+    for chunk in crud._chunked(names):
+        open_alerts.extend(db.execute(open_alerts_query(chunk)))
+
+    stale = [row for row in open_alerts if wanted.get(row.product_name) != row.alert_type]
+    already_open = {(row.product_name, row.alert_type) for row in open_alerts}
+    now = datetime.utcnow()
+    new_rows = [
+        {
+            "product_name": name,
+            "alert_type": alert_type,
+            "message": _message(alert_type, name, *details[name]),
+            "resolved": False,
+            "created_at": now,
+        }
+        for name, alert_type in wanted.items()
+        if (name, alert_type) not in already_open
+    ]
+    if not stale and not new_rows:
+        return {"opened": [], "resolved": []}
+
+    staged = []
+    if stale:
+        db.execute(
+            update(alert)
+            .where(alert.id.in_([row.id for row in stale]))
+            .values(resolved=True)
+            .execution_options(synchronize_session=False)
+        )
+        staged.extend(crud.alert_event(row, "resolved") for row in stale)
+    opened = []
+    if new_rows:
+        # Rows come back with their own product/type, so input order doesn't
+        # matter; skipping sort_by_parameter_order keeps SQLite batched. An
+        # alert a concurrent transaction opened meanwhile is skipped.
+        stmt = crud.dialect_insert(db)(alert).on_conflict_do_nothing(
+            index_elements=[alert.product_name, alert.alert_type], index_where=alert.resolved == false()
+        )
+        created = db.execute(stmt.returning(*columns), new_rows)
+        for row in created:
+            opened.append(row.id)
+            staged.append(crud.alert_event(row, "created"))
+    mark_changed(db)
+    events.stage(db, staged)
+    return {"opened": opened, "resolved": [row.id for row in stale]}
@@ -0,0 +1,91 @@
+"""Async handlers for the read-heavy endpoints.
+
+When ``DB_ASYNC`` is enabled ``backend.main`` includes this router ahead of
+its sync routes, so these handlers answer ``/stock/summary``, ``/alerts``,
+``/shelf/{shelf_id}`` and ``/analytics/stock-history`` on the event loop
+instead of occupying a threadpool worker for the duration of each query.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend import crud, pagination, schemas
+from backend.database import get_async_db
+from backend.planogram import planogram_cache
+from backend.serialization import APIResponse
+from backend.stock import build_stock_summary
+
+router = APIRouter()
+
+
+async def _stock_summary_products(db: AsyncSession) -> List[Dict[str, Any]]:
+    stock_entries = await crud.get_stock_counts_async(db)
+    planograms = await planogram_cache.get_async(db)
+    return build_stock_summary(stock_entries, planograms)
+
+
+@router.get("/stock/summary")
+async def stock_summary(db: AsyncSession = Depends(get_async_db)):
+    return APIResponse({"products": await _stock_summary_products(db)})
+
+
+@router.get("/stock")
+async def get_stock_alias(db: AsyncSession = Depends(get_async_db)):
+    """Alias for /stock/summary to match frontend expectations."""
+    return APIResponse(await _stock_summary_products(db))
+
+
+@router.get("/alerts", response_model=List[schemas.AlertRead])
+async def get_alerts(
+    request: Request,
+    resolved: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[schemas.ListFormat] = None,
+    accept: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        if pagination.wants_ndjson(format, accept):
+            stmt = crud.alerts_query(resolved, cursor, limit)
+            return pagination.ndjson_response(
+                crud.stream_rows_async(db, stmt), schemas.AlertRead
+            )
+        alerts, next_cursor = await crud.get_alerts_async(
+            db, resolved=resolved, cursor=cursor, limit=limit or pagination.ALERTS_PAGE_SIZE
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return pagination.page_response(request, alerts, next_cursor, schemas.AlertRead)
+
+
+@router.get("/shelf/{shelf_id}", response_model=schemas.ShelfSummary)
+async def shelf_summary(shelf_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await crud.get_shelf_summary_async(db, shelf_id)
+
+
+@router.get("/analytics/stock-history")
+async def stock_history(
+    days: int = 7,
+    resolution: schemas.HistoryResolution = "auto",
+    stat: schemas.HistoryStat = "last",
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get stock history for the last N days."""
+    return APIResponse(
+        {"history": await crud.get_stock_history_async(db, days, resolution, stat)}
+    )
+
+
+@router.get("/analytics")
+async def analytics_alias(
+    days: int = 7,
+    resolution: schemas.HistoryResolution = "auto",
+    stat: schemas.HistoryStat = "last",
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Alias for /analytics/stock-history to match frontend expectations."""
+    return await stock_history(days, resolution, stat, db)
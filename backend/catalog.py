@@ -0,0 +1,227 @@
+"""Indexed, file-backed product catalog.
+
+The catalog is loaded once from ``CATALOG_PATH`` (CSV, or Parquet when
+pandas/pyarrow are installed) with columns ``product_name`` (the Grozi code),
+``display_name``, ``category`` and ``price``. A :class:`Catalog` is immutable:
+its forward (code), reverse (case-folded display name) and category indexes
+are built at load time, so every enrichment call is a dict lookup and the
+object can be shared freely between threads. Under a preloading process
+manager (``gunicorn --preload``) forked workers share the loaded pages
+copy-on-write.
+
+:func:`get_catalog` returns the current catalog. When the file's mtime
+changes it is reloaded at most once per ``CATALOG_RELOAD_INTERVAL`` seconds
+and swapped in atomically; a file that fails to parse keeps the previous
+catalog in service. A reload bumps the data version, and the ETag middleware
+checks for one before comparing ``If-None-Match``, so a revalidating client
+sees the new catalog instead of a 304. Without a catalog file the legacy dictionaries in
+``product_mapping.py`` are used.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from backend.config import settings
+from backend.versioning import data_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORY = "Other"
+
+
+@dataclass(frozen=True)
+class Product:
+    product_name: str
+    display_name: str
+    category: str
+    price: float
+
+
+class Catalog:
+    """Immutable product catalog with precomputed lookup indexes."""
+
+    def __init__(self, products: Iterable[Product]) -> None:
+        by_code: Dict[str, Product] = {}
+        for product in products:
+            by_code[product.product_name] = product
+        by_name: Dict[str, str] = {}
+        by_category: Dict[str, List[str]] = {}
+        for code, product in by_code.items():
+            by_name.setdefault(product.display_name.casefold(), code)
+            by_category.setdefault(product.category, []).append(code)
+
+        self._by_code: Mapping[str, Product] = MappingProxyType(by_code)
+        self._by_name: Mapping[str, str] = MappingProxyType(by_name)
+        self._by_category: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+            {category: tuple(codes) for category, codes in by_category.items()}
+        )
+        self._records: Tuple[Dict[str, Any], ...] = tuple(
+            {
+                "product_name": p.product_name,
+                "display_name": p.display_name,
+                "category": p.category,
+                "price": p.price,
+            }
+            for p in by_code.values()
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self._by_code.values())
+
+    def __contains__(self, product_name: object) -> bool:
+        return product_name in self._by_code
+
+    def get(self, product_name: str) -> Optional[Product]:
+        return self._by_code.get(product_name)
+
+    def display_name(self, product_name: str) -> str:
+        product = self._by_code.get(product_name)
+        return product.display_name if product else product_name
+
+    def price(self, product_name: str) -> float:
+        product = self._by_code.get(product_name)
+        return product.price if product else 0.0
+
+    def category(self, product_name: str) -> str:
+        product = self._by_code.get(product_name)
+        return product.category if product else DEFAULT_CATEGORY
+
+    def resolve(self, name: str) -> str:
+        """Map a display name (any case) to its product code; codes and unknown names pass through."""
+        return self._by_name.get(name.casefold(), name)
+
+    def in_category(self, category: str) -> Tuple[str, ...]:
+        return self._by_category.get(category, ())
+
+    def categories(self) -> List[str]:
+        return sorted(self._by_category)
+
+    def records(self) -> Tuple[Dict[str, Any], ...]:
+        """Every product as a ``ProductRead``-shaped dict, built once per load."""
+        return self._records
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "Catalog":
+        with open(path, newline="", encoding="utf-8") as handle:
+            return cls(_product(row) for row in csv.DictReader(handle))
+
+    @classmethod
+    def from_parquet(cls, path: Path) -> "Catalog":
+        import pandas as pd
+
+        frame = pd.read_parquet(path)
+        return cls(_product(row) for row in frame.to_dict("records"))
+
+    @classmethod
+    def from_file(cls, path: Path) -> "Catalog":
+        if path.suffix.lower() == ".parquet":
+            return cls.from_parquet(path)
+        return cls.from_csv(path)
+
+    @classmethod
+    def from_product_mapping(cls) -> "Catalog":
+        """Build the catalog from the hard-coded dictionaries in ``product_mapping.py``."""
+        sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+        from product_mapping import PRODUCT_CATEGORIES, PRODUCT_NAME_MAP, PRODUCT_PRICES
+
+        return cls(
+            Product(
+                code,
+                name,
+                PRODUCT_CATEGORIES.get(code, DEFAULT_CATEGORY),
+                PRODUCT_PRICES.get(code, 0.0),
+            )
+            for code, name in PRODUCT_NAME_MAP.items()
+        )
+
+
+def _product(row: Mapping[str, Any]) -> Product:
+    code = str(row["product_name"]).strip()
+    return Product(
+        product_name=code,
+        display_name=str(row.get("display_name") or code).strip(),
+        category=str(row.get("category") or DEFAULT_CATEGORY).strip(),
+        price=float(row.get("price") or 0.0),
+    )
+
+
+class CatalogStore:
+    """Holds the current :class:`Catalog` and reloads it when its file changes."""
+
+    def __init__(self, path: Optional[Path], reload_interval: float = 5.0) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._catalog = self._load()
+
+    def _file_mtime(self) -> Optional[int]:
+        if self.path is None:
+            return None
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> Catalog:
+        mtime = self._file_mtime()
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        if mtime is None:
+            return Catalog.from_product_mapping()
+        return Catalog.from_file(self.path)
+
+    def reload_due(self) -> bool:
+        """Whether ``reload_interval`` has passed since the file was last checked."""
+        return bool(self.reload_interval) and time.monotonic() - self._checked_at >= self.reload_interval
+
+    def get(self) -> Catalog:
+        if self.reload_due():
+            self.reload_if_changed()
+        return self._catalog
+
+    def reload_if_changed(self) -> bool:
+        """Reload when the file's mtime moved; return True if a new catalog was swapped in."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            mtime = self._file_mtime()
+            if mtime == self._mtime:
+                return False
+            try:
+                catalog = self._load()
+            except Exception:
+                logger.exception("Failed to reload catalog from %s; keeping previous", self.path)
+                self._mtime = mtime  # don't retry a broken file until it changes again
+                return False
+            self._catalog = catalog
+        # Enrichment output changed, so cached stock and /products ETags are stale.
+        data_version.bump()
+        logger.info("Reloaded catalog from %s (%d products)", self.path, len(catalog))
+        return True
+
+
+catalog_store = CatalogStore(
+    Path(settings.catalog_path) if settings.catalog_path else None,
+    reload_interval=settings.catalog_reload_interval,
+)
+
+
+def get_catalog() -> Catalog:
+    return catalog_store.get()
+
+
+def catalog_reload_due() -> bool:
+    return catalog_store.reload_due()
@@ -1,9 +1,11 @@
 """Application configuration for OmniShelf AI backend."""
 from __future__ import annotations
 
+import json
 import os
 from functools import lru_cache
-from typing import Any
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 from pydantic import BaseModel
@@ -19,6 +21,92 @@ class Settings(BaseModel):
     )
     api_prefix: str = "/"
 
+    # Connection pool sizing; size per deployment as workers x (pool + overflow)
+    # must stay below Postgres max_connections. Ignored for in-memory SQLite.
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # seconds, -1 disables
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_statement_timeout_ms: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 disables
+
+    # Read replicas of DATABASE_URL (comma-separated) for the read endpoints.
+    # A replica is skipped while its health check fails or it lags the primary
+    # by more than DB_REPLICA_MAX_LAG_SECONDS (0 disables the bound); with no
+    # usable replica reads go to the primary (see ReplicaSet in backend/database.py).
+    db_replica_urls: List[str] = [
+        url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()
+    ]
+    db_replica_max_lag_seconds: float = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+    db_replica_check_interval: float = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+
+    # Serve the read-heavy endpoints from an asyncio engine (asyncpg/aiosqlite).
+    db_async: bool = os.getenv("DB_ASYNC", "false").lower() in {"1", "true", "yes"}
+
+    # product_detections partition width and how long raw partitions are kept
+    # before being rolled into stock_snapshots (see backend/partitions.py).
+    detection_partition_days: int = int(os.getenv("DETECTION_PARTITION_DAYS", "1"))
+    detection_retention_days: int = int(os.getenv("DETECTION_RETENTION_DAYS", "30"))
+
+    # Stock snapshot bucket width in seconds, and whether the API process
+    # takes them itself instead of cron running backend/snapshots.py.
+    snapshot_interval_seconds: int = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "3600"))
+    snapshot_scheduler: bool = os.getenv("SNAPSHOT_SCHEDULER", "false").lower() in {"1", "true", "yes"}
+
+    # Detection ingest: "sync" commits inside the request, "queue" hands
+    # payloads to the write-behind IngestQueue flushed by a background thread.
+    ingest_mode: str = os.getenv("INGEST_MODE", "sync")
+    ingest_queue_max_size: int = int(os.getenv("INGEST_QUEUE_MAX_SIZE", "50000"))
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "2000"))
+    ingest_flush_interval: float = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+    # A failing upload is retried after a doubling backoff, then dead-lettered.
+    ingest_max_attempts: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+    ingest_retry_backoff: float = float(os.getenv("INGEST_RETRY_BACKOFF", "1.0"))
+
+    # Derive LOW_STOCK/OUT_OF_STOCK alerts at ingest time (backend/alerts.py).
+    alert_engine: bool = os.getenv("ALERT_ENGINE", "true").lower() in {"1", "true", "yes"}
+
+    # ETag data version: unset keeps a per-process counter; a path on a shared
+    # filesystem lets several workers see each other's writes (backend/versioning.py).
+    data_version_file: Optional[str] = os.getenv("DATA_VERSION_FILE") or None
+
+    # /stream/stock: events kept for reconnecting clients and idle heartbeat.
+    stream_buffer_size: int = int(os.getenv("STREAM_BUFFER_SIZE", "10000"))
+    stream_heartbeat_seconds: float = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+    # Gzip responses larger than this many bytes when the client accepts it; 0 disables.
+    response_compress_min_bytes: int = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+    # Product catalog file (CSV or Parquet) and how often to check it for
+    # changes in seconds; 0 disables hot reload (see backend/catalog.py).
+    catalog_path: Optional[str] = os.getenv(
+        "CATALOG_PATH", str(Path(__file__).resolve().parents[1] / "product_catalog.csv")
+    )
+    catalog_reload_interval: float = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))
+
+    # Seconds a process trusts its in-memory planogram before re-reading it, to
+    # pick up writes from other workers; its own writes invalidate it at once.
+    planogram_cache_ttl: float = float(os.getenv("PLANOGRAM_CACHE_TTL", "30"))
+
+    # Per-route latency and query histograms on /metrics; SERVER_TIMING also
+    # adds each request's db/serialize/app split as a Server-Timing header.
+    request_metrics: bool = os.getenv("REQUEST_METRICS", "true").lower() in {"1", "true", "yes"}
+    server_timing: bool = os.getenv("SERVER_TIMING", "false").lower() in {"1", "true", "yes"}
+
+    # Opt-in request profiler (backend/profiling.py): requests sent with
+    # "X-Profile: <PROFILE_TOKEN>", plus a PROFILE_SAMPLE_RATE fraction of all
+    # requests, are stack-sampled into PROFILE_DIR. With neither set it is not installed.
+    profile_token: str = os.getenv("PROFILE_TOKEN", "")
+    profile_sample_rate: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    profile_dir: str = os.getenv("PROFILE_DIR", "profiles")
+    profile_interval_ms: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    profile_max_files: int = int(os.getenv("PROFILE_MAX_FILES", "200"))  # oldest pruned first
+
+    # Store shards as JSON: {"store_id": "database_url"} or
+    # {"store_id": {"url": ..., "schema": ...}}, where a missing url means
+    # DATABASE_URL. Stores not listed (other than "default") are rejected
+    # (see StoreRouter in backend/database.py).
+    store_shards: Dict[str, Any] = json.loads(os.getenv("STORE_SHARDS") or "{}")
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -1,136 +1,473 @@
 """CRUD helpers for persistence layer."""
 from __future__ import annotations
 
-from collections import defaultdict
-from datetime import datetime
-from typing import Any, Dict, Iterable, List, Optional
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Select, and_, delete, false, func, insert, or_, select, true
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import FromClause
 
-from backend import models
+from backend import events, models
+from backend.config import settings
+from backend.planogram import mark_planogram_changed
 from backend.schemas import DetectionCreate, PlanogramCreate
+from backend.stores import store_of
+from backend.versioning import mark_changed
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Column order shared by the executemany and COPY ingest paths.
+_DETECTION_COLUMNS = (
+    "product_name",
+    "confidence",
+    "bbox_x1",
+    "bbox_y1",
+    "bbox_x2",
+    "bbox_y2",
+    "shelf_id",
+    "timestamp",
+    "scan_id",
+    "store_id",
+)
 
 
 def create_detection(db: Session, detection: DetectionCreate) -> models.ProductDetection:
-    db_obj = models.ProductDetection(
-        product_name=detection.product_name,
-        confidence=detection.confidence,
-        bbox_x1=detection.bbox_x1,
-        bbox_y1=detection.bbox_y1,
-        bbox_x2=detection.bbox_x2,
-        bbox_y2=detection.bbox_y2,
-        shelf_id=detection.shelf_id,
-        timestamp=detection.timestamp or datetime.utcnow(),
-    )
+    rows = _detection_rows([detection], store_of(db))
+    scans = _record_scans(db, [rows])
+    db_obj = models.ProductDetection(**rows[0])
     db.add(db_obj)
+    changed = _apply_scans(db, scans)
+    if settings.alert_engine:
+        _evaluate_alerts(db, changed)
     db.commit()
     db.refresh(db_obj)
     return db_obj
 
 
-def bulk_create_detections(
-    db: Session, detections: Iterable[DetectionCreate]
-) -> List[models.ProductDetection]:
-    db_objs: List[models.ProductDetection] = []
+def _detection_rows(detections: Iterable[DetectionCreate], store_id: str) -> List[Dict[str, Any]]:
+    """Flatten validated payloads into insert parameter dicts."""
+    now = datetime.utcnow()
+    rows = []
     for detection in detections:
-        db_objs.append(
-            models.ProductDetection(
-                product_name=detection.product_name,
-                confidence=detection.confidence,
-                bbox_x1=detection.bbox_x1,
-                bbox_y1=detection.bbox_y1,
-                bbox_x2=detection.bbox_x2,
-                bbox_y2=detection.bbox_y2,
-                shelf_id=detection.shelf_id,
-                timestamp=detection.timestamp or datetime.utcnow(),
-            )
+        row = detection.model_dump(include=set(_DETECTION_COLUMNS))
+        if row["timestamp"] is None:
+            row["timestamp"] = now
+        row["scan_id"] = None
+        row["store_id"] = store_id
+        rows.append(row)
+    return rows
+
+
+def _record_scans(db: Session, uploads: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Insert one ``shelf_scans`` row per shelf per upload and stamp ``scan_id`` on the rows.
+
+    A scan's ``captured_at`` is the newest detection timestamp in it.
+    """
+    scans: List[Dict[str, Any]] = []
+    for rows in uploads:
+        by_shelf: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            shelf_id = row["shelf_id"] or models.UNASSIGNED_SHELF
+            scan = by_shelf.get(shelf_id)
+            if scan is None:
+                scan = by_shelf[shelf_id] = {"shelf_id": shelf_id, "captured_at": row["timestamp"], "rows": []}
+            scan["rows"].append(row)
+            if row["timestamp"] > scan["captured_at"]:
+                scan["captured_at"] = row["timestamp"]
+        scans.extend(by_shelf.values())
+    if not scans:
+        return scans
+
+    table = models.ShelfScan.__table__
+    ids = db.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        [
+            {"shelf_id": s["shelf_id"], "captured_at": s["captured_at"], "detection_count": len(s["rows"])}
+            for s in scans
+        ],
+    ).scalars()
+    for scan, scan_id in zip(scans, ids):
+        scan["id"] = scan_id
+        for row in scan["rows"]:
+            row["scan_id"] = scan_id
+    return scans
+
+
+def _copy_detection_rows(db: Session, rows: List[Dict[str, Any]]) -> bool:
+    """Stream rows into Postgres with COPY; return False when COPY is unavailable."""
+    connection = db.connection()
+    if connection.dialect.name != "postgresql" or connection.dialect.driver != "psycopg2":
+        return False
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            [
+                row["timestamp"].isoformat() if column == "timestamp" else row[column]
+                for column in _DETECTION_COLUMNS
+            ]
+        )
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {models.ProductDetection.__tablename__} ({', '.join(_DETECTION_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
         )
-    if not db_objs:
+    finally:
+        cursor.close()
+    return True
+
+
+def bulk_create_detections(
+    db: Session,
+    detections: Iterable[DetectionCreate],
+    return_rows: bool = True,
+    evaluate_alerts: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """Insert one upload of detections as a scan of each shelf it covers.
+
+    With ``return_rows=True`` the rows are inserted with a single
+    ``INSERT ... RETURNING`` executemany and echoed back in input order.
+    With ``return_rows=False`` nothing is read back, which lets Postgres
+    (psycopg2) load the batch with ``COPY``; other backends fall back to a
+    plain executemany. Either way the batch costs a handful of round-trips
+    instead of one per row.
+
+    Unless disabled (``evaluate_alerts=False`` or ``ALERT_ENGINE=false``) the
+    stock alerts of the affected products are re-evaluated in the same
+    transaction.
+    """
+    return bulk_create_uploads(db, [list(detections)], return_rows, evaluate_alerts)
+
+
+def bulk_create_uploads(
+    db: Session,
+    uploads: Iterable[List[DetectionCreate]],
+    return_rows: bool = True,
+    evaluate_alerts: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """Like :func:`bulk_create_detections` for several uploads in one transaction.
+
+    Each upload is scanned separately, so uploads buffered together (e.g. by
+    the ingest queue) don't merge into one scan of a shelf.
+    """
+    store_id = store_of(db)
+    uploads_rows = [_detection_rows(upload, store_id) for upload in uploads]
+    rows = [row for upload_rows in uploads_rows for row in upload_rows]
+    if not rows:
         return []
-    db.add_all(db_objs)
+
+    scans = _record_scans(db, uploads_rows)
+    table = models.ProductDetection.__table__
+    created: List[Dict[str, Any]] = []
+    if return_rows:
+        result = db.execute(
+            insert(table).returning(*table.c, sort_by_parameter_order=True), rows
+        )
+        created = [dict(row) for row in result.mappings()]
+    elif not _copy_detection_rows(db, rows):
+        db.execute(insert(table), rows)
+
+    changed = _apply_scans(db, scans)
+    if settings.alert_engine if evaluate_alerts is None else evaluate_alerts:
+        _evaluate_alerts(db, changed)
     db.commit()
-    for obj in db_objs:
-        db.refresh(obj)
-    return db_objs
+    return created
 
 
-def get_stock_counts(db: Session) -> List[Dict[str, Optional[str]]]:
-    rows = (
-        db.query(
-            models.ProductDetection.product_name,
-            func.count(models.ProductDetection.id).label("total_count"),
-            func.max(models.ProductDetection.timestamp).label("last_seen"),
+def _evaluate_alerts(db: Session, product_names: Iterable[str]) -> None:
+    from backend import alerts
+
+    alerts.evaluate(db, product_names)
+
+
+def dialect_insert(db: Session):
+    """Return the dialect-specific ``insert`` construct supporting ON CONFLICT."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return upsert_insert
+
+
+def _apply_scans(db: Session, scans: List[Dict[str, Any]]) -> List[str]:
+    """Make each shelf's newest scan its current state in ``shelf_state``, without committing.
+
+    Products counted in the scan get its counts; products the shelf held
+    before but the scan didn't see drop to zero. A scan older than the
+    shelf's current one (a late upload) is kept for audit but changes
+    nothing. One read and one upsert cover the whole batch. Returns the
+    products whose count changed on some shelf.
+    """
+    mark_changed(db)
+    latest: Dict[str, Dict[str, Any]] = {}
+    for scan in scans:
+        current = latest.get(scan["shelf_id"])
+        if current is None or (scan["captured_at"], scan["id"]) > (current["captured_at"], current["id"]):
+            latest[scan["shelf_id"]] = scan
+    if not latest:
+        return []
+
+    state = models.ShelfState
+    held: Dict[str, Dict[str, int]] = {}
+    shelf_time: Dict[str, datetime] = {}
+    for chunk in _chunked(sorted(latest)):
+        for shelf_id, product_name, count, captured_at in db.execute(
+            select(state.shelf_id, state.product_name, state.count, state.captured_at).where(
+                state.shelf_id.in_(chunk)
+            )
+        ):
+            held.setdefault(shelf_id, {})[product_name] = count
+            if shelf_id not in shelf_time or captured_at > shelf_time[shelf_id]:
+                shelf_time[shelf_id] = captured_at
+
+    rows: List[Dict[str, Any]] = []
+    staged: List[Dict[str, Any]] = []
+    for shelf_id, scan in latest.items():
+        if shelf_id in shelf_time and scan["captured_at"] < shelf_time[shelf_id]:
+            continue
+        counts: Dict[str, Dict[str, Any]] = {}
+        for row in scan["rows"]:
+            entry = counts.setdefault(row["product_name"], {"count": 0, "last_seen": row["timestamp"]})
+            entry["count"] += 1
+            if row["timestamp"] > entry["last_seen"]:
+                entry["last_seen"] = row["timestamp"]
+        previous = held.get(shelf_id, {})
+        for product_name in counts.keys() | previous.keys():
+            entry = counts.get(product_name, {"count": 0, "last_seen": None})
+            rows.append(
+                {
+                    "product_name": product_name,
+                    "shelf_id": shelf_id,
+                    "count": entry["count"],
+                    "last_seen": entry["last_seen"],
+                    "scan_id": scan["id"],
+                    "captured_at": scan["captured_at"],
+                }
+            )
+            delta = entry["count"] - previous.get(product_name, 0)
+            if delta:
+                staged.append(
+                    {
+                        "type": "stock",
+                        "product_name": product_name,
+                        "shelf_id": shelf_id or None,
+                        "count": entry["count"],
+                        "delta": delta,
+                        "last_seen": entry["last_seen"],
+                        "scan_id": scan["id"],
+                    }
+                )
+    if not rows:
+        return []
+
+    table = state.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.product_name, table.c.shelf_id],
+        set_={
+            "count": stmt.excluded.count,
+            # Zeroed products keep the time they were last actually seen.
+            "last_seen": func.coalesce(stmt.excluded.last_seen, table.c.last_seen),
+            "scan_id": stmt.excluded.scan_id,
+            "captured_at": stmt.excluded.captured_at,
+        },
+        # A concurrent ingest may have applied a newer scan since the read above.
+        where=stmt.excluded.captured_at >= table.c.captured_at,
+    )
+    db.execute(stmt, rows)
+    events.stage(db, staged)
+    return sorted({event["product_name"] for event in staged})
+
+
+def alert_event(alert: models.Alert, action: str) -> Dict[str, Any]:
+    return {
+        "type": "alert",
+        "action": action,
+        "alert_id": alert.id,
+        "product_name": alert.product_name,
+        "alert_type": alert.alert_type,
+        "message": alert.message,
+    }
+
+
+def shelf_state_source(detections: Optional[FromClause] = None) -> Select:
+    """``shelf_state`` rows derived from scans and the detections kept for audit.
+
+    Each shelf's latest scan supplies the counts; every other product ever
+    scanned on the shelf gets a zero row, matching what ingest maintains.
+    ``detections`` defaults to the live ``product_detections`` table.
+    """
+    detection = (models.ProductDetection.__table__ if detections is None else detections).c
+    scan = models.ShelfScan
+    ranked = select(
+        scan.id,
+        scan.shelf_id,
+        scan.captured_at,
+        func.row_number()
+        .over(partition_by=scan.shelf_id, order_by=(scan.captured_at.desc(), scan.id.desc()))
+        .label("recency"),
+    ).subquery()
+    latest = select(ranked.c.id, ranked.c.shelf_id, ranked.c.captured_at).where(ranked.c.recency == 1).subquery()
+    seen = (
+        select(
+            scan.shelf_id,
+            detection.product_name,
+            func.max(detection.timestamp).label("last_seen"),
         )
-        .group_by(models.ProductDetection.product_name)
-        .all()
+        .join(scan, scan.id == detection.scan_id)
+        .group_by(scan.shelf_id, detection.product_name)
+        .subquery()
+    )
+    current = (
+        select(detection.scan_id, detection.product_name, func.count().label("count"))
+        .where(detection.scan_id.in_(select(latest.c.id)))
+        .group_by(detection.scan_id, detection.product_name)
+        .subquery()
     )
+    return (
+        select(
+            seen.c.product_name,
+            seen.c.shelf_id,
+            func.coalesce(current.c.count, 0),
+            seen.c.last_seen,
+            latest.c.id,
+            latest.c.captured_at,
+        )
+        .join(latest, latest.c.shelf_id == seen.c.shelf_id)
+        .outerjoin(
+            current,
+            and_(current.c.scan_id == latest.c.id, current.c.product_name == seen.c.product_name),
+        )
+    )
+
+
+def rebuild_shelf_state(db: Session) -> int:
+    """Recompute ``shelf_state`` from ``shelf_scans`` and the raw detections.
 
-    shelf_rows = (
-        db.query(
-            models.ProductDetection.product_name,
-            models.ProductDetection.shelf_id,
-            func.count(models.ProductDetection.id).label("count"),
+    Detections ingested before scans were recorded (``scan_id`` NULL) are not
+    part of any scan and are ignored. Sealed SQLite periods are read too, but
+    a shelf whose latest scan's detections were dropped by retention loses
+    its rows. Returns the number of rows written.
+    """
+    from backend import partitions
+
+    mark_changed(db)
+    db.execute(delete(models.ShelfState))
+    db.execute(
+        insert(models.ShelfState).from_select(
+            ["product_name", "shelf_id", "count", "last_seen", "scan_id", "captured_at"],
+            shelf_state_source(partitions.detections_source(db)),
         )
-        .group_by(models.ProductDetection.product_name, models.ProductDetection.shelf_id)
-        .all()
     )
+    db.commit()
+    return db.query(func.count(models.ShelfState.id)).scalar() or 0
 
-    shelf_map: Dict[str, Dict[str, int]] = defaultdict(dict)
-    for product_name, shelf_id, count in shelf_rows:
-        if shelf_id is None:
-            continue
-        shelf_map[product_name][shelf_id] = count
 
-    stock = []
-    for product_name, total_count, last_seen in rows:
-        stock.append(
-            {
+def _aggregate_stock_rows(
+    rows: Iterable[Tuple[str, str, int, Optional[datetime]]]
+) -> Dict[str, Dict[str, Any]]:
+    """Fold (product, shelf, count, last_seen) ``shelf_state`` rows into per-product stock."""
+    stock: Dict[str, Dict[str, Any]] = {}
+    for product_name, shelf_id, count, last_seen in rows:
+        entry = stock.get(product_name)
+        if entry is None:
+            entry = stock[product_name] = {
                 "product_name": product_name,
-                "total_count": total_count,
-                "last_seen": last_seen,
-                "shelf_breakdown": shelf_map.get(product_name, {}),
+                "total_count": 0,
+                "shelf_ids": [],
+                "shelf_breakdown": {},
+                "last_seen": None,
             }
-        )
+        entry["total_count"] += count
+        if last_seen and (entry["last_seen"] is None or last_seen > entry["last_seen"]):
+            entry["last_seen"] = last_seen
+        if shelf_id != models.UNASSIGNED_SHELF:
+            if count:
+                entry["shelf_ids"].append(shelf_id)
+            entry["shelf_breakdown"][shelf_id] = count
     return stock
 
 
-def get_product_stock(db: Session, product_name: str) -> Optional[Dict[str, Any]]:
-    rows = (
-        db.query(models.ProductDetection)
-        .filter(models.ProductDetection.product_name == product_name)
-        .all()
-    )
-    if not rows:
-        return None
+def _chunked(values: List[str], size: int = 500) -> Iterable[List[str]]:
+    """Split IN-list parameters so large lookups stay under driver limits."""
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
 
-    shelf_counts: Dict[str, int] = defaultdict(int)
-    last_seen = None
-    for row in rows:
-        if row.shelf_id:
-            shelf_counts[row.shelf_id] += 1
-        if not last_seen or row.timestamp > last_seen:
-            last_seen = row.timestamp
-    return {
-        "product_name": product_name,
-        "total_count": len(rows),
-        "shelf_ids": list(shelf_counts.keys()),
-        "shelf_breakdown": shelf_counts,
-        "last_seen": last_seen,
-    }
 
+def _stock_rows_query(product_names: Optional[List[str]] = None) -> Select:
+    agg = models.ShelfState
+    stmt = select(agg.product_name, agg.shelf_id, agg.count, agg.last_seen)
+    if product_names is not None:
+        stmt = stmt.where(agg.product_name.in_(product_names))
+    return stmt.order_by(agg.product_name, agg.shelf_id)
 
-def get_shelf_summary(db: Session, shelf_id: str) -> Dict[str, Any]:
-    rows = (
-        db.query(
-            models.ProductDetection.product_name,
-            func.count(models.ProductDetection.id).label("count"),
-            func.max(models.ProductDetection.timestamp).label("last_seen"),
+
+def get_stock_counts(db: Session) -> List[Dict[str, Optional[str]]]:
+    rows = db.execute(_stock_rows_query()).all()
+    return list(_aggregate_stock_rows(rows).values())
+
+
+def get_stock_for_products(
+    db: Session, product_names: Iterable[str]
+) -> Dict[str, Dict[str, Any]]:
+    """Resolve stock and shelf breakdown for many products in one round-trip.
+
+    Products never seen in a shelf scan are absent from the returned mapping.
+    """
+    names = sorted(set(product_names))
+    rows: List[Tuple[str, str, int, Optional[datetime]]] = []
+    for chunk in _chunked(names):
+        rows.extend(db.execute(_stock_rows_query(chunk)).all())
+    return _aggregate_stock_rows(rows)
+
+
+def get_stock_totals(db: Session, product_names: Iterable[str]) -> Dict[str, int]:
+    """Total count over all shelves per product; products never scanned are absent."""
+    state = models.ShelfState
+    totals: Dict[str, int] = {}
+    for chunk in _chunked(sorted(set(product_names))):
+        totals.update(
+            db.execute(
+                select(state.product_name, func.sum(state.count))
+                .where(state.product_name.in_(chunk))
+                .group_by(state.product_name)
+            ).tuples().all()
         )
-        .filter(models.ProductDetection.shelf_id == shelf_id)
-        .group_by(models.ProductDetection.product_name)
-        .all()
+    return totals
+
+
+def get_product_stock(db: Session, product_name: str) -> Optional[Dict[str, Any]]:
+    return get_stock_for_products(db, [product_name]).get(product_name)
+
+
+def _shelf_summary_query(shelf_id: str) -> Select:
+    agg = models.ShelfState
+    return (
+        select(agg.product_name, agg.count, agg.last_seen)
+        .where(agg.shelf_id == shelf_id)
+        .order_by(agg.product_name)
     )
+
+
+def _shelf_summary(
+    shelf_id: str, rows: Iterable[Tuple[str, int, Optional[datetime]]]
+) -> Dict[str, Any]:
     products = [
         {
             "product_name": product_name,
@@ -143,6 +480,35 @@ def get_shelf_summary(db: Session, shelf_id: str) -> Dict[str, Any]:
     return {"shelf_id": shelf_id, "products": products}
 
 
+def get_shelf_summary(db: Session, shelf_id: str) -> Dict[str, Any]:
+    return _shelf_summary(shelf_id, db.execute(_shelf_summary_query(shelf_id)).all())
+
+
+def get_shelf_scans(db: Session, shelf_id: str, limit: int = 50) -> List[models.ShelfScan]:
+    scan = models.ShelfScan
+    return list(
+        db.scalars(
+            select(scan)
+            .where(scan.shelf_id == shelf_id)
+            .order_by(scan.captured_at.desc(), scan.id.desc())
+            .limit(limit)
+        )
+    )
+
+
+def get_scan_detections(db: Session, scan_id: int) -> Optional[List[models.ProductDetection]]:
+    """Detections recorded in a scan, or None if there is no such scan."""
+    from backend import partitions
+
+    if db.get(models.ShelfScan, scan_id) is None:
+        return None
+    source = partitions.detections_source(db)
+    detection = models.ProductDetection
+    if source is not detection.__table__:
+        detection = aliased(detection, source)
+    return list(db.scalars(select(detection).where(detection.scan_id == scan_id).order_by(detection.id)))
+
+
 def get_planogram_entry(db: Session, product_name: str) -> Optional[models.Planogram]:
     return (
         db.query(models.Planogram)
@@ -151,51 +517,259 @@ def get_planogram_entry(db: Session, product_name: str) -> Optional[models.Plano
     )
 
 
-def create_or_update_planogram(db: Session, planogram: PlanogramCreate) -> models.Planogram:
-    existing = get_planogram_entry(db, planogram.product_name)
-    if existing:
-        existing.shelf_id = planogram.shelf_id
-        existing.expected_stock = planogram.expected_stock
-        db.commit()
-        db.refresh(existing)
-        return existing
-    new_entry = models.Planogram(
-        product_name=planogram.product_name,
-        shelf_id=planogram.shelf_id,
-        expected_stock=planogram.expected_stock,
+def get_planogram_entries(
+    db: Session, product_names: Optional[Iterable[str]] = None
+) -> Dict[str, models.Planogram]:
+    """Return planogram rows keyed by product name.
+
+    With ``product_names=None`` the whole planogram is loaded in one query,
+    which is cheaper than an IN-list when serving a full stock summary.
+    """
+    if product_names is None:
+        return {entry.product_name: entry for entry in db.scalars(select(models.Planogram))}
+    entries: Dict[str, models.Planogram] = {}
+    for chunk in _chunked(sorted(set(product_names))):
+        for entry in db.query(models.Planogram).filter(models.Planogram.product_name.in_(chunk)):
+            entries[entry.product_name] = entry
+    return entries
+
+
+def upsert_planogram(db: Session, planograms: Iterable[PlanogramCreate]) -> int:
+    """Insert or update planogram entries with a single INSERT ... ON CONFLICT.
+
+    The rows go out as one executemany, which SQLAlchemy renders as
+    multi-row VALUES batches on Postgres. A product listed twice keeps its
+    last entry; products not listed are left alone. Returns the number of
+    products written.
+    """
+    rows = {
+        entry.product_name: {
+            "product_name": entry.product_name,
+            "shelf_id": entry.shelf_id,
+            "expected_stock": entry.expected_stock,
+        }
+        for entry in planograms
+    }
+    if not rows:
+        return 0
+    mark_changed(db)
+    mark_planogram_changed(db)
+    table = models.Planogram.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.product_name],
+        set_={"shelf_id": stmt.excluded.shelf_id, "expected_stock": stmt.excluded.expected_stock},
     )
-    db.add(new_entry)
+    db.execute(stmt, list(rows.values()))
+    if settings.alert_engine:
+        _evaluate_alerts(db, list(rows))
     db.commit()
-    db.refresh(new_entry)
-    return new_entry
+    return len(rows)
+
+
+def create_or_update_planogram(db: Session, planogram: PlanogramCreate) -> models.Planogram:
+    upsert_planogram(db, [planogram])
+    return get_planogram_entry(db, planogram.product_name)
 
 
 def create_alert(db: Session, alert: schemas.AlertCreate) -> models.Alert:
+    mark_changed(db)
     db_obj = models.Alert(
         product_name=alert.product_name,
         alert_type=alert.alert_type,
         message=alert.message,
         resolved=alert.resolved,
     )
-    db.add(db_obj)
+    # A second open alert of one type for a product violates the unique
+    # partial index; the savepoint leaves the session usable for the caller.
+    with db.begin_nested():
+        db.add(db_obj)
+    events.stage(db, [alert_event(db_obj, "created")])
     db.commit()
     db.refresh(db_obj)
     return db_obj
 
 
-def get_alerts(db: Session, resolved: bool = False) -> List[models.Alert]:
-    return (
-        db.query(models.Alert)
-        .filter(models.Alert.resolved == resolved)
-        .order_by(models.Alert.created_at.desc())
-        .all()
+def encode_cursor(moment: datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing just past (moment, row_id) in descending order."""
+    raw = json.dumps([moment.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        moment, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(moment), int(row_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid pagination cursor") from exc
+
+
+class _KeysetTime(FunctionElement):
+    """A DateTime column in a form that compares exactly against bound datetimes.
+
+    SQLite stores ``func.now()`` defaults as ``YYYY-MM-DD HH:MM:SS`` but bound
+    datetimes as ``YYYY-MM-DD HH:MM:SS.ffffff``, so text comparison breaks ties
+    on whole seconds; padding the stored value fixes that. Other dialects use
+    the bare column so the (time, id) index still applies.
+    """
+
+    type = DateTime()
+    name = "keyset_time"
+    inherit_cache = True
+
+
+@compiles(_KeysetTime)
+def _compile_keyset_time(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(_KeysetTime, "sqlite")
+def _compile_keyset_time_sqlite(element, compiler, **kw):
+    return f"substr({compiler.process(element.clauses, **kw)} || '.000000', 1, 26)"
+
+
+def _keyset(stmt: Select, time_column: Any, id_column: Any, cursor: Optional[str]) -> Select:
+    """Order newest-first on (time, id) and resume after ``cursor`` if given."""
+    if cursor:
+        moment, row_id = decode_cursor(cursor)
+        key = _KeysetTime(time_column)
+        stmt = stmt.where(
+            # Redundant with the OR below, but a plain range on the column lets
+            # the planner seek the index instead of filtering from the top.
+            time_column <= moment,
+            or_(key < moment, and_(key == moment, id_column < row_id)),
+        )
+    return stmt.order_by(time_column.desc(), id_column.desc())
+
+
+def _page_limit(limit: Optional[int]) -> Optional[int]:
+    # Fetch one extra row so callers can tell whether another page exists.
+    return limit + 1 if limit is not None else None
+
+
+def page_cursor(
+    rows: List[Any], limit: Optional[int], time_attr: str
+) -> Tuple[List[Any], Optional[str]]:
+    """Trim a ``limit + 1`` fetch to ``limit`` rows and derive the next cursor."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, time_attr), last.id)
+
+
+def alerts_query(
+    resolved: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Select:
+    stmt = _keyset(
+        # Literal true/false so unresolved listings can use the partial index.
+        select(models.Alert).where(models.Alert.resolved == (true() if resolved else false())),
+        models.Alert.created_at,
+        models.Alert.id,
+        cursor,
     )
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def snapshots_query(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    since: Optional[datetime] = None,
+) -> Select:
+    snapshot = models.StockSnapshot
+    stmt = select(snapshot)
+    if since is not None:
+        stmt = stmt.where(snapshot.snapshot_time >= since)
+    stmt = _keyset(stmt, snapshot.snapshot_time, snapshot.id, cursor)
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def get_alerts(
+    db: Session, resolved: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Tuple[List[models.Alert], Optional[str]]:
+    """Return one newest-first page of alerts and the cursor for the next page."""
+    rows = list(db.scalars(alerts_query(resolved, cursor, _page_limit(limit))))
+    return page_cursor(rows, limit, "created_at")
+
+
+def get_snapshots(
+    db: Session,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = 1000,
+    since: Optional[datetime] = None,
+) -> Tuple[List[models.StockSnapshot], Optional[str]]:
+    """Return one newest-first page of raw snapshots and the cursor for the next page."""
+    rows = list(db.scalars(snapshots_query(cursor, _page_limit(limit), since)))
+    return page_cursor(rows, limit, "snapshot_time")
+
+
+def stream_rows(db: Session, stmt: Select, batch_size: int = 1000) -> Iterator[Any]:
+    """Iterate ORM rows with a server-side cursor, holding one batch in memory at a time."""
+    yield from db.scalars(stmt.execution_options(yield_per=batch_size))
+
+
+def get_stock_history(
+    db: Session, days: int = 7, resolution: str = "auto", stat: str = "last"
+) -> Dict[str, Dict[str, float]]:
+    """Per-product stock series for the last ``days`` days, aggregated in SQL from rollups."""
+    from backend import rollups
+
+    resolution = rollups.choose_resolution(days, resolution)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    rows = db.execute(rollups.history_query(cutoff, resolution, stat)).all()
+    return rollups.group_history(rows, resolution)
 
 
 def resolve_alert(db: Session, alert_id: int) -> Optional[models.Alert]:
     alert = db.query(models.Alert).filter(models.Alert.id == alert_id).first()
     if alert:
         alert.resolved = True
+        mark_changed(db)
+        events.stage(db, [alert_event(alert, "resolved")])
         db.commit()
         db.refresh(alert)
     return alert
+
+
+# Async read variants used by backend.async_api when DB_ASYNC is enabled.
+# They share the query builders above so both paths stay in lockstep.
+
+
+async def get_stock_counts_async(db: AsyncSession) -> List[Dict[str, Optional[str]]]:
+    rows = (await db.execute(_stock_rows_query())).all()
+    return list(_aggregate_stock_rows(rows).values())
+
+
+async def get_shelf_summary_async(db: AsyncSession, shelf_id: str) -> Dict[str, Any]:
+    rows = (await db.execute(_shelf_summary_query(shelf_id))).all()
+    return _shelf_summary(shelf_id, rows)
+
+
+async def get_alerts_async(
+    db: AsyncSession,
+    resolved: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[models.Alert], Optional[str]]:
+    rows = list(await db.scalars(alerts_query(resolved, cursor, _page_limit(limit))))
+    return page_cursor(rows, limit, "created_at")
+
+
+async def stream_rows_async(
+    db: AsyncSession, stmt: Select, batch_size: int = 1000
+) -> AsyncIterator[Any]:
+    result = await db.stream_scalars(stmt.execution_options(yield_per=batch_size))
+    async for row in result:
+        yield row
+
+
+async def get_stock_history_async(
+    db: AsyncSession, days: int = 7, resolution: str = "auto", stat: str = "last"
+) -> Dict[str, Dict[str, float]]:
+    from backend import rollups
+
+    resolution = rollups.choose_resolution(days, resolution)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    rows = (await db.execute(rollups.history_query(cutoff, resolution, stat))).all()
+    return rollups.group_history(rows, resolution)
@@ -1,22 +1,451 @@
 """Database utilities and session management."""
 from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.requests import Request
 
 from backend.config import settings
+from backend.metrics import record_query
+from backend.stores import DEFAULT_STORE, STORE_KEY, UnknownStoreError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Thread-safe counters describing how a connection pool is being used."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts_total = 0
+        self.overflow_checkouts_total = 0
+        self.timeouts_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, wait_seconds: float, overflowed: bool) -> None:
+        with self._lock:
+            self.checkouts_total += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            if overflowed:
+                self.overflow_checkouts_total += 1
+
+    def record_timeout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.timeouts_total += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self, pool: Any) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {
+                "checkouts_total": self.checkouts_total,
+                "overflow_checkouts_total": self.overflow_checkouts_total,
+                "timeouts_total": self.timeouts_total,
+                "wait_ms_total": round(self.wait_seconds_total * 1000, 3),
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+                "wait_ms_avg": (
+                    round(self.wait_seconds_total / self.checkouts_total * 1000, 3)
+                    if self.checkouts_total
+                    else None
+                ),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(
+                pool_size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+            )
+        return stats
+
+
+class _InstrumentedPoolMixin:
+    """Time every checkout that goes through the pool's queue.
+
+    ``_do_get`` is where QueuePool blocks waiting for a free connection or
+    opens an overflow one, so timing it captures exactly the pool wait.
+    """
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        overflow_before = self.overflow()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        self.metrics.record_checkout(
+            time.perf_counter() - started, self.overflow() > max(overflow_before, 0)
+        )
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics.
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(
+    database_url: str, is_async: bool = False, schema: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build pool and timeout keyword arguments for ``create_engine`` from settings.
+
+    ``schema`` pins the Postgres ``search_path`` of every connection, so raw
+    SQL, COPY and migrations all land in that schema too.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if schema is not None and backend != "postgresql":
+        raise ValueError(f"Store schemas need Postgres; give each {backend} store its own database")
+    # pool_pre_ping keeps Postgres connections healthy across restarts
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite is a single shared connection; pool sizing doesn't apply.
+        return options
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle,
+        pool_timeout=settings.db_pool_timeout,
+    )
+    server_settings: Dict[str, str] = {}
+    if backend == "postgresql" and settings.db_statement_timeout_ms:
+        server_settings["statement_timeout"] = str(settings.db_statement_timeout_ms)
+    if schema is not None:
+        server_settings["search_path"] = schema
+    if server_settings:
+        if is_async:
+            options["connect_args"] = {"server_settings": server_settings}
+        else:
+            options["connect_args"] = {
+                "options": " ".join(f"-c {name}={value}" for name, value in server_settings.items())
+            }
+    return options
+
+
+def create_db_engine(database_url: str, schema: Optional[str] = None, **overrides: Any) -> Engine:
+    options = engine_options(database_url, schema=schema)
+    options.update(overrides)
+    db_engine = create_engine(database_url, future=True, **options)
+    if isinstance(db_engine.pool, _InstrumentedPoolMixin):
+        db_engine.pool.metrics = PoolMetrics()
+    return db_engine
+
+
+_QUERY_STARTED = "query_started"
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault(_QUERY_STARTED, []).append(time.perf_counter())
+
+
+def _record_query_time(conn, cursor, statement, parameters, context, executemany) -> None:
+    record_query(time.perf_counter() - conn.info[_QUERY_STARTED].pop())
+
+
+def _discard_query_timer(context) -> None:
+    started = context.connection.info.get(_QUERY_STARTED) if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+if settings.request_metrics:
+    # On the Engine class, so every engine (shards, replicas, the async
+    # engine's sync core, benchmark and test engines) reports its queries.
+    event.listen(Engine, "before_cursor_execute", _start_query_timer)
+    event.listen(Engine, "after_cursor_execute", _record_query_time)
+    event.listen(Engine, "handle_error", _discard_query_timer)
+
+
+def pool_stats(db_engine: Any) -> Optional[Dict[str, Any]]:
+    """Return telemetry for an engine's pool, or None when it isn't instrumented."""
+    if db_engine is None:
+        return None
+    pool = getattr(db_engine, "sync_engine", db_engine).pool
+    metrics = getattr(pool, "metrics", None)
+    if metrics is None:
+        return None
+    return metrics.snapshot(pool)
+
+
+@dataclass(frozen=True)
+class StoreShard:
+    store_id: str
+    engine: Engine
+    schema: Optional[str] = None
+
+
+class StoreRouter:
+    """Map store ids to the database, and optionally Postgres schema, holding their data.
+
+    ``shards`` has the ``STORE_SHARDS`` format: a database URL per store, or
+    ``{"url": ..., "schema": ...}`` where a missing URL means the default
+    database. The default store lives in ``default_sessions`` unless it is
+    listed itself. Every (url, schema) namespace holds exactly one store, so
+    a store can be moved to its own server without touching the others.
+    """
+
+    def __init__(self, default_sessions: sessionmaker, shards: Mapping[str, Any]) -> None:
+        default_engine = default_sessions.kw["bind"]
+        default_url = default_engine.url.render_as_string(hide_password=False)
+        engines: Dict[Tuple[str, Optional[str]], Engine] = {(default_url, None): default_engine}
+        owners: Dict[Tuple[str, Optional[str]], str] = {}
+        self._shards: Dict[str, StoreShard] = {DEFAULT_STORE: StoreShard(DEFAULT_STORE, default_engine)}
+        self._sessions: Dict[str, sessionmaker] = {DEFAULT_STORE: default_sessions}
+        if DEFAULT_STORE not in shards:
+            owners[(default_url, None)] = DEFAULT_STORE
 
-engine = create_engine(
-    settings.database_url,
-    future=True,
-    pool_pre_ping=True,  # keep Postgres connections healthy across restarts
+        for store_id, target in shards.items():
+            if isinstance(target, str):
+                target = {"url": target}
+            key = (target.get("url") or default_url, target.get("schema"))
+            if key in owners:
+                raise ValueError(f"Stores {owners[key]!r} and {store_id!r} map to the same database and schema")
+            owners[key] = store_id
+            if key not in engines:
+                engines[key] = create_db_engine(key[0], schema=key[1])
+            self._shards[store_id] = StoreShard(store_id, engines[key], key[1])
+            # The execution option stamps store_id on inserts (backend/stores.py).
+            self._sessions[store_id] = sessionmaker(
+                bind=engines[key].execution_options(store_id=store_id),
+                autoflush=False,
+                autocommit=False,
+                future=True,
+                info={STORE_KEY: store_id},
+            )
+
+    def stores(self) -> List[str]:
+        return sorted(self._shards)
+
+    def shard(self, store_id: str) -> StoreShard:
+        try:
+            return self._shards[store_id]
+        except KeyError:
+            raise UnknownStoreError(f"Unknown store {store_id!r}") from None
+
+    def session(self, store_id: str = DEFAULT_STORE) -> Session:
+        self.shard(store_id)
+        return self._sessions[store_id]()
+
+
+# Session.info key set on sessions that read from a replica.
+REPLICA_KEY = "replica"
+# Request scope key set when a read must see the primary's latest writes.
+PRIMARY_READ_KEY = "read_from_primary"
+
+_PG_REPLICATION_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
 )
+
+
+def replication_lag(connection: Connection) -> float:
+    """Seconds the replica's replayed data trails the primary; 0 when fully caught up.
+
+    Only Postgres streaming replicas report lag; other backends just answer
+    a trivial query and count as current.
+    """
+    if connection.dialect.name != "postgresql":
+        connection.execute(text("SELECT 1"))
+        return 0.0
+    return float(connection.execute(_PG_REPLICATION_LAG).scalar() or 0.0)
+
+
+class Replica:
+    """One read replica: its engine, sessions and last health check result."""
+
+    def __init__(self, url: str) -> None:
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_db_engine(url)
+        self.sessions = sessionmaker(
+            bind=self.engine, autoflush=False, autocommit=False, future=True, info={REPLICA_KEY: self.name}
+        )
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at = float("-inf")
+        self._checking = threading.Lock()
+        event.listen(self.engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        # A dropped connection mid-request takes the replica out until its next check.
+        if context.is_disconnect:
+            self.healthy = False
+            self.error = str(context.original_exception)
+
+    def check(self) -> None:
+        try:
+            with self.engine.connect() as connection:
+                self.lag = replication_lag(connection)
+            self.healthy, self.error = True, None
+        except SQLAlchemyError as exc:
+            if self.healthy:
+                logger.warning("Read replica %s failed its health check: %s", self.name, exc)
+            self.healthy, self.error = False, str(exc)
+        self.checked_at = time.monotonic()
+
+
+class ReplicaSet:
+    """Round-robin read replicas with health checks and a staleness bound.
+
+    Each replica is re-checked at most every ``check_interval`` seconds, by
+    whichever request picks it first once the interval has passed; other
+    requests meanwhile use the last result. A replica is usable while its
+    check passes and, if ``max_lag`` is set, it trails the primary by no
+    more than ``max_lag`` seconds.
+    """
+
+    def __init__(self, urls: Sequence[str], max_lag: float = 0.0, check_interval: float = 5.0) -> None:
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = itertools.count()
+        self.fallbacks_total = 0
+
+    def _usable(self, replica: Replica) -> bool:
+        if time.monotonic() - replica.checked_at >= self.check_interval and replica._checking.acquire(
+            blocking=False
+        ):
+            try:
+                replica.check()
+            finally:
+                replica._checking.release()
+        if not replica.healthy:
+            return False
+        return not self.max_lag or replica.lag is None or replica.lag <= self.max_lag
+
+    def choose(self) -> Optional[Replica]:
+        """The next usable replica in round-robin order, or None to read from the primary."""
+        if not self.replicas:
+            return None
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._usable(replica):
+                return replica
+        self.fallbacks_total += 1
+        return None
+
+    def may_trail(self, changed_at: float) -> bool:
+        """Whether a usable replica may not hold writes committed at ``changed_at`` (epoch seconds) yet.
+
+        A replica passes its check at most ``max_lag`` behind and is only
+        re-checked every ``check_interval``, so in between it can fall behind
+        by up to their sum. Without a lag bound any replica may trail.
+        """
+        if not self.max_lag:
+            return True
+        return time.time() - changed_at < self.max_lag + self.check_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_lag_seconds": self.max_lag,
+            "fallbacks_total": self.fallbacks_total,
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag,
+                    "error": replica.error,
+                    "pool": pool_stats(replica.engine),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+engine = create_db_engine(settings.database_url)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+stores = StoreRouter(SessionLocal, settings.store_shards)
+replicas = ReplicaSet(
+    settings.db_replica_urls,
+    max_lag=settings.db_replica_max_lag_seconds,
+    check_interval=settings.db_replica_check_interval,
+)
+
+# Async drivers used when DB_ASYNC is enabled, keyed by backend name.
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def to_async_url(database_url: str) -> str:
+    """Swap the sync DBAPI driver in a URL for its asyncio counterpart."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.db_async:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_url = to_async_url(settings.database_url)
+    async_engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+    if isinstance(async_engine.sync_engine.pool, _InstrumentedPoolMixin):
+        async_engine.sync_engine.pool.metrics = PoolMetrics()
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
 
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    """Session for the store named in the path (``/stores/{store_id}/...``), else the default store."""
+    db = stores.session(request.path_params.get("store_id", DEFAULT_STORE))
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints: a usable replica of the default store, else the primary.
+
+    Replicas mirror ``DATABASE_URL`` only, so other stores always read their own shard.
+    Requests flagged with ``PRIMARY_READ_KEY`` read from the primary too.
+    """
+    store_id = request.path_params.get("store_id", DEFAULT_STORE)
+    on_replica = store_id == DEFAULT_STORE and not request.scope.get(PRIMARY_READ_KEY)
+    replica = replicas.choose() if on_replica else None
+    db = replica.sessions() if replica is not None else stores.session(store_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database access is disabled; set DB_ASYNC=true")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,148 @@
+"""In-process stock event bus behind ``/stream/stock``.
+
+Detection ingest and the alert endpoints stage small delta events on their
+session (``stock``: per product/shelf count delta; ``alert``: created or
+resolved) and the bus publishes them once the transaction commits, so
+subscribers never see writes that were rolled back.
+
+Every event gets a sequence number and the most recent ``STREAM_BUFFER_SIZE``
+events are kept in a ring buffer. A reconnecting client passes the last
+sequence number it saw and receives only what it missed; if that number has
+already fallen out of the buffer (or belongs to a previous process) it gets
+a single ``reset`` event and should refetch ``/stock/summary`` before
+applying further deltas.
+
+The bus lives in the API process, like the write-behind ingest queue, so
+each worker streams the writes it handled itself. It is shared by all stores
+the process serves; every event carries the ``store_id`` it belongs to.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, List, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.stores import store_of
+
+_PENDING_KEY = "pending_stock_events"
+
+
+class StockEventBus:
+    """Sequenced ring buffer of events with asyncio wake-ups for subscribers."""
+
+    def __init__(self, capacity: int = 10_000) -> None:
+        self.capacity = capacity
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def last_seq(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def publish(self, events: List[Dict[str, Any]]) -> int:
+        """Assign sequence numbers to ``events``, buffer them and wake subscribers.
+
+        Safe to call from any thread (request threadpool, ingest flusher).
+        """
+        if not events:
+            return self.last_seq
+        with self._lock:
+            for item in events:
+                self._seq += 1
+                self._events.append({"seq": self._seq, **item})
+            waiters = list(self._waiters)
+            last = self._seq
+        for loop, wakeup in waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # subscriber's loop already closed
+        return last
+
+    def since(self, seq: int) -> List[Dict[str, Any]]:
+        """Events after ``seq``, or a single ``reset`` event if they are no longer buffered."""
+        with self._lock:
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return [{"seq": self._seq, "type": "reset"}]
+            return [item for item in self._events if item["seq"] > seq]
+
+    async def subscribe(
+        self, since: int, heartbeat: float = 15.0
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield batches of new events; an empty batch means ``heartbeat`` seconds passed idle."""
+        wakeup = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wakeup)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            cursor = since
+            while True:
+                # Clear before checking so a publish between the check and the
+                # wait still wakes us up.
+                wakeup.clear()
+                batch = self.since(cursor)
+                if batch:
+                    cursor = batch[-1]["seq"]
+                    yield batch
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield []
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+def matches(
+    item: Dict[str, Any], product_name: str | None, shelf_id: str | None, store_id: str | None = None
+) -> bool:
+    """Apply the optional ``/stream/stock`` filters; reset events always pass."""
+    if item["type"] == "reset":
+        return True
+    if store_id and item.get("store_id") != store_id:
+        return False
+    if product_name and item.get("product_name") != product_name:
+        return False
+    if shelf_id and item["type"] == "stock" and item.get("shelf_id") != shelf_id:
+        return False
+    return True
+
+
+def _jsonable(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+stock_events = StockEventBus(settings.stream_buffer_size)
+
+
+def stage(db: Session, events: List[Dict[str, Any]]) -> None:
+    """Queue events on ``db`` to be published when its transaction commits."""
+    pending = db.info.setdefault(_PENDING_KEY, [])
+    store_id = store_of(db)
+    pending.extend(
+        {**{key: _jsonable(value) for key, value in item.items()}, "store_id": store_id} for item in events
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        stock_events.publish(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop(_PENDING_KEY, None)
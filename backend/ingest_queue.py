@@ -0,0 +1,263 @@
+"""Write-behind ingestion queue for detection payloads.
+
+When ``INGEST_MODE=queue`` the ``/detections/`` endpoint validates payloads
+and hands them to an :class:`IngestQueue` instead of committing inside the
+request. A background thread drains the queue in size- or time-triggered
+batches through ``crud.bulk_create_uploads`` so bursts from many shelf
+cameras become a few large transactions rather than many small ones. Each
+request stays a separate upload, so it is still recorded as its own shelf
+scan, and a batch only ever holds requests for one store.
+
+When a batch fails its uploads are retried one at a time, so the good ones
+are still written. A failing upload goes back to the head of the queue and
+flushing pauses for an exponential backoff. After ``max_attempts`` failures
+it is moved to :attr:`IngestQueue.dead_letters` and no longer blocks the
+uploads queued behind it.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend import crud
+from backend.schemas import DetectionCreate
+from backend.stores import DEFAULT_STORE
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when accepting a batch would exceed the queue capacity."""
+
+
+class IngestQueue:
+    """Bounded in-process buffer flushed to the database by a worker thread."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[str], Session],
+        max_size: int = 50_000,
+        batch_size: int = 2_000,
+        flush_interval: float = 1.0,
+        max_attempts: int = 5,
+        retry_backoff: float = 1.0,
+        max_retry_backoff: float = 60.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        # One (store_id, detections, failed attempts) entry per accepted
+        # request; _depth counts the detections in them.
+        self._items: Deque[Tuple[str, List[DetectionCreate], int]] = deque()
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Uploads that failed max_attempts times: (store_id, detections, error).
+        self.dead_letters: Deque[Tuple[str, List[DetectionCreate], str]] = deque(maxlen=100)
+        self._retry_at = 0.0  # time.monotonic() before which flushing is paused
+        self._consecutive_failures = 0
+
+        self._enqueued_total = 0
+        self._flushed_total = 0
+        self._rejected_total = 0
+        self._flush_count = 0
+        self._failed_flushes = 0
+        self._dead_lettered_uploads = 0
+        self._dead_lettered_total = 0
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_max = 0.0
+        self._last_flush_seconds: Optional[float] = None
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return self._depth
+
+    def enqueue(self, detections: List[DetectionCreate], store_id: str = DEFAULT_STORE) -> int:
+        """Accept a whole batch or none of it; return the queue depth afterwards.
+
+        Detections without a timestamp are stamped now, not when they are
+        (re)tried, so a delayed upload doesn't pose as a newer scan of its shelf.
+        """
+        accepted = datetime.utcnow()
+        upload = [
+            detection if detection.timestamp is not None else detection.model_copy(update={"timestamp": accepted})
+            for detection in detections
+        ]
+        with self._wakeup:
+            if self._depth + len(upload) > self.max_size:
+                self._rejected_total += len(upload)
+                raise QueueFullError(
+                    f"Ingest queue full ({self._depth}/{self.max_size} detections pending)"
+                )
+            self._items.append((store_id, upload, 0))
+            self._depth += len(upload)
+            self._enqueued_total += len(upload)
+            if self._depth >= self.batch_size:
+                self._wakeup.notify()
+            return self._depth
+
+    def flush(self, ignore_backoff: bool = False) -> int:
+        """Write everything currently queued in batches of about ``batch_size`` detections.
+
+        Requests are never split, so a batch can exceed ``batch_size`` when a
+        single request does, and a batch ends where the next request is for a
+        different store. Stops at the first upload that has to be retried and
+        does nothing while its backoff runs, unless ``ignore_backoff``.
+        Returns rows written.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._items or (not ignore_backoff and time.monotonic() < self._retry_at):
+                        break
+                    store_id, first, attempts = self._items.popleft()
+                    batch = [(first, attempts)]
+                    count = len(first)
+                    while (
+                        self._items
+                        and self._items[0][0] == store_id
+                        and count + len(self._items[0][1]) <= self.batch_size
+                    ):
+                        count += len(self._items[0][1])
+                        batch.append(self._items.popleft()[1:])
+                    self._depth -= count
+                error = self._write(store_id, [upload for upload, _ in batch], count)
+                if error is None:
+                    written += count
+                    self._consecutive_failures = 0
+                    continue
+                if len(batch) > 1:
+                    # Retry upload by upload so one bad request can't hold back the rest.
+                    results = [
+                        (upload, attempts, self._write(store_id, [upload], len(upload)))
+                        for upload, attempts in batch
+                    ]
+                else:
+                    results = [(first, attempts, error)]
+                written += sum(len(upload) for upload, _, failure in results if failure is None)
+                if not self._requeue_failed(store_id, [r for r in results if r[2] is not None]):
+                    break
+        return written
+
+    def _requeue_failed(self, store_id: str, failed: List[Tuple[List[DetectionCreate], int, str]]) -> bool:
+        """Dead-letter uploads out of attempts and requeue the rest; False if any were requeued."""
+        retry = []
+        with self._lock:
+            for upload, attempts, error in failed:
+                if attempts + 1 >= self.max_attempts:
+                    logger.error(
+                        "Dead-lettering upload of %d detections after %d failed attempts", len(upload), attempts + 1
+                    )
+                    self.dead_letters.append((store_id, upload, error))
+                    self._dead_lettered_uploads += 1
+                    self._dead_lettered_total += len(upload)
+                else:
+                    retry.append((store_id, upload, attempts + 1))
+            if not retry:
+                return True
+            self._items.extendleft(reversed(retry))
+            self._depth += sum(len(upload) for _, upload, _ in retry)
+            self._consecutive_failures += 1
+            backoff = self.retry_backoff * 2 ** (self._consecutive_failures - 1)
+            self._retry_at = time.monotonic() + min(backoff, self.max_retry_backoff)
+            return False
+
+    def _write(self, store_id: str, batch: List[List[DetectionCreate]], count: int) -> Optional[str]:
+        """Write ``batch`` in one transaction; the error on failure, else None."""
+        started = time.perf_counter()
+        db = self._session_factory(store_id)
+        try:
+            crud.bulk_create_uploads(db, batch, return_rows=False)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Ingest flush of %d detections failed", count)
+            with self._lock:
+                self._failed_flushes += 1
+            return f"{type(exc).__name__}: {exc}"
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._flushed_total += count
+            self._flush_count += 1
+            self._flush_seconds_total += elapsed
+            self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+            self._last_flush_seconds = elapsed
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                if not self._stopping:
+                    backoff = self._retry_at - time.monotonic()
+                    if backoff > 0:
+                        self._wakeup.wait(timeout=backoff)
+                    elif self._depth < self.batch_size:
+                        self._wakeup.wait(timeout=self.flush_interval)
+                stopping = self._stopping
+            self.flush(ignore_backoff=stopping)
+            if stopping:
+                return
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """Stop the worker after a final flush of everything still queued."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        # Catch anything enqueued while the worker was shutting down.
+        self.flush(ignore_backoff=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "depth": self._depth,
+                "max_size": self.max_size,
+                "batch_size": self.batch_size,
+                "flush_interval_seconds": self.flush_interval,
+                "enqueued_total": self._enqueued_total,
+                "flushed_total": self._flushed_total,
+                "rejected_total": self._rejected_total,
+                "flush_count": self._flush_count,
+                "failed_flushes": self._failed_flushes,
+                "dead_lettered_uploads": self._dead_lettered_uploads,
+                "dead_lettered_total": self._dead_lettered_total,
+                "retry_in_seconds": round(max(self._retry_at - time.monotonic(), 0.0), 3),
+                "last_flush_ms": (
+                    round(self._last_flush_seconds * 1000, 3)
+                    if self._last_flush_seconds is not None
+                    else None
+                ),
+                "avg_flush_ms": (
+                    round(self._flush_seconds_total / self._flush_count * 1000, 3)
+                    if self._flush_count
+                    else None
+                ),
+                "max_flush_ms": round(self._flush_seconds_max * 1000, 3),
+            }
@@ -1,26 +1,113 @@
 """FastAPI application exposing OmniShelf AI services."""
 from __future__ import annotations
 
+import json
+import math
 import sys
 import shutil
 import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, File, UploadFile
+from fastapi import (
+    Depends,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Path as PathParam,
+    Query,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from fastapi.routing import APIRoute
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from backend import crud, schemas
-from backend.database import get_db
-
-# Add parent directory to path to import product_mapping
+from backend import crud, metrics, pagination, schemas
+from backend.catalog import catalog_reload_due, get_catalog
+from backend.config import settings
+from backend.database import (
+    PRIMARY_READ_KEY,
+    async_engine,
+    engine,
+    get_db,
+    get_read_db,
+    pool_stats,
+    replicas,
+    stores,
+)
+from backend.events import matches, stock_events
+from backend.ingest_queue import IngestQueue, QueueFullError
+from backend.planogram import planogram_cache
+from backend.profiling import Profiler, ProfilingMiddleware
+from backend.search import FUZZY_MIN_SCORE, SEARCH_MIN_SCORE, get_search_index
+from backend.serialization import APIResponse, NegotiationMiddleware
+from backend.snapshots import SnapshotScheduler
+from backend.stock import build_stock_summary, determine_stock_level
+from backend.stores import UnknownStoreError, store_of
+from backend.velocity import velocity_cache
+from backend.versioning import data_version, etag_matches
+
+# Add parent directory to path to import the yolo helpers
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
-from product_mapping import get_grozi_code, get_display_name, get_price, get_category, PRODUCT_NAME_MAP
 from yolo.utils import load_model, run_inference, yolo_result_to_detections
 
-app = FastAPI(title="OmniShelf AI", version="1.0.0")
+# Write-behind ingestion (INGEST_MODE=queue); None means detections commit in-request.
+ingest_queue: Optional[IngestQueue] = None
+if settings.ingest_mode == "queue":
+    ingest_queue = IngestQueue(
+        stores.session,
+        max_size=settings.ingest_queue_max_size,
+        batch_size=settings.ingest_batch_size,
+        flush_interval=settings.ingest_flush_interval,
+        max_attempts=settings.ingest_max_attempts,
+        retry_backoff=settings.ingest_retry_backoff,
+    )
+
+# In-app stock snapshots (SNAPSHOT_SCHEDULER); otherwise run backend/snapshots.py from cron.
+snapshot_scheduler: Optional[SnapshotScheduler] = None
+if settings.snapshot_scheduler:
+    snapshot_scheduler = SnapshotScheduler(stores.session, stores.stores, settings.snapshot_interval_seconds)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if ingest_queue is not None:
+        ingest_queue.start()
+    if snapshot_scheduler is not None:
+        snapshot_scheduler.start()
+    yield
+    if snapshot_scheduler is not None:
+        snapshot_scheduler.stop()
+    if ingest_queue is not None:
+        # Flush whatever is still buffered before the process exits.
+        ingest_queue.stop()
+
+
+app = FastAPI(
+    title="OmniShelf AI",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=APIResponse,
+)
+
+if settings.db_async:
+    from backend import async_api
+
+    # Routes match in registration order, so the async read handlers shadow
+    # the sync versions of the same paths defined below.
+    app.include_router(async_api.router)
 
 # Initialize YOLO model
 MODEL_PATH = Path(__file__).resolve().parents[1] / "yolo" / "runs" / "detect" / "train" / "weights" / "best.pt"
@@ -36,96 +123,247 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Link"],
 )
-
-
-def determine_stock_level(count: int, expected: Optional[int] = None) -> str:
-    if count <= 0:
-        return "OUT"
-    if expected and expected > 0:
-        ratio = count / expected
-        if ratio >= 0.75:
-            return "HIGH"
-        if ratio >= 0.4:
-            return "MEDIUM"
-        return "LOW"
-    if count >= 15:
-        return "HIGH"
-    if count >= 6:
-        return "MEDIUM"
-    return "LOW"
+app.add_middleware(NegotiationMiddleware)
+if settings.response_compress_min_bytes:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.response_compress_min_bytes)
+
+# GET endpoints whose payload only changes when the data version is bumped.
+VERSIONED_PATHS = {"/stock/summary", "/stock", "/products", "/alerts"}
+
+# Every endpoint backed by get_db or get_read_db is also served per store under this prefix.
+STORE_PREFIX = "/stores/{store_id}"
+
+
+def _unscoped_path(path: str) -> str:
+    """``/stores/{id}/stock`` -> ``/stock``; other paths are returned as they are."""
+    if path.startswith("/stores/"):
+        parts = path.split("/", 3)
+        if len(parts) == 4:
+            return "/" + parts[3]
+    return path
+
+
+@app.exception_handler(UnknownStoreError)
+async def unknown_store(request: Request, exc: UnknownStoreError):
+    return APIResponse({"detail": str(exc)}, status_code=404)
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """Tag versioned reads with an ETag and answer If-None-Match hits with 304."""
+    if request.method != "GET" or _unscoped_path(request.url.path) not in VERSIONED_PATHS:
+        return await call_next(request)
+    if catalog_reload_due():
+        # A changed catalog file bumps the version; pick it up before a 304 can skip the handler.
+        await run_in_threadpool(get_catalog)
+    # Read the version before the handler runs: a write that lands mid-request
+    # leaves the client with an older tag, so it simply refetches next time.
+    etag = data_version.etag()
+    headers = {"ETag": etag, "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if replicas.replicas and replicas.may_trail(data_version.changed_at()):
+        # A replica may not hold the writes behind this version yet; its body,
+        # cached under the new tag, would stay stale until the next write.
+        request.scope[PRIMARY_READ_KEY] = True
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+if settings.request_metrics:
+
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        """Time each request per route template and attach its query count and time.
+
+        Registered last, so it wraps the other middleware and times the whole request.
+        """
+        timings, token = metrics.begin_request()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            metrics.end_request(token)
+            elapsed = time.perf_counter() - timings.started
+            route = request.scope.get("route")
+            metrics.request_metrics.observe_request(
+                request.method, getattr(route, "path", "<unmatched>"), status, elapsed, timings
+            )
+        if settings.server_timing:
+            response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+            response.headers["Timing-Allow-Origin"] = "*"
+        return response
+
+
+profiler = Profiler(
+    settings.profile_dir,
+    token=settings.profile_token,
+    sample_rate=settings.profile_sample_rate,
+    interval=settings.profile_interval_ms / 1000,
+    max_files=settings.profile_max_files,
+)
+if profiler.enabled:
+    # Outermost, so a profile covers every other middleware and the whole response body.
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
 
 
 @app.post("/detections/", response_model=List[schemas.DetectionRead])
 def create_detections(
-    detections: List[schemas.DetectionCreate], db: Session = Depends(get_db)
+    detections: List[schemas.DetectionCreate],
+    prefer: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
 ):
+    if ingest_queue is not None:
+        try:
+            depth = ingest_queue.enqueue(detections, store_of(db))
+        except QueueFullError as exc:
+            raise HTTPException(
+                status_code=429,
+                detail=str(exc),
+                headers={"Retry-After": str(max(1, math.ceil(ingest_queue.flush_interval)))},
+            )
+        return APIResponse({"queued": len(detections), "queue_depth": depth}, status_code=202)
+
+    # Cameras that don't need the rows echoed back send "Prefer: return=minimal",
+    # which skips RETURNING and lets Postgres ingest the batch with COPY.
+    if prefer and "return=minimal" in prefer.replace(" ", "").lower():
+        crud.bulk_create_detections(db, detections, return_rows=False)
+        return APIResponse(
+            {"inserted": len(detections)},
+            headers={"Preference-Applied": "return=minimal"},
+        )
     created = crud.bulk_create_detections(db, detections)
     return created
 
 
-@app.get("/stock/summary")
-def stock_summary(db: Session = Depends(get_db)):
+@app.get("/ingest/stats")
+def ingest_stats():
+    """Report write-behind queue depth and flush latency."""
+    return {
+        "mode": settings.ingest_mode,
+        "queue": ingest_queue.stats() if ingest_queue is not None else None,
+    }
+
+
+@app.get("/metrics/pool")
+def pool_metrics():
+    """Report connection pool occupancy, checkout wait time and overflow events."""
+    return {
+        "config": {
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_recycle": settings.db_pool_recycle,
+            "pool_timeout": settings.db_pool_timeout,
+            "statement_timeout_ms": settings.db_statement_timeout_ms,
+        },
+        "primary": pool_stats(engine),
+        "async": pool_stats(async_engine),
+        "stores": {
+            store_id: pool_stats(stores.shard(store_id).engine)
+            for store_id in stores.stores()
+            if stores.shard(store_id).engine is not engine
+        },
+        "replicas": replicas.stats(),
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Route latency, query and pool metrics in the Prometheus text format."""
+    pools = {"primary": pool_stats(engine), "async": pool_stats(async_engine)}
+    for store_id in stores.stores():
+        if stores.shard(store_id).engine is not engine:
+            pools[f"store:{store_id}"] = pool_stats(stores.shard(store_id).engine)
+    for replica in replicas.replicas:
+        pools[f"replica:{replica.name}"] = pool_stats(replica.engine)
+    return Response(metrics.request_metrics.render(pools), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/stores")
+def list_stores():
+    """Configured stores; each is served under ``/stores/{store_id}/...``."""
+    return {
+        "stores": [
+            {"store_id": store_id, "schema": stores.shard(store_id).schema} for store_id in stores.stores()
+        ]
+    }
+
+
+def _stock_summary_products(db: Session) -> List[Dict[str, Any]]:
     stock_entries = crud.get_stock_counts(db)
-    payload = []
-    for entry in stock_entries:
-        planogram = crud.get_planogram_entry(db, entry["product_name"])
-        expected = planogram.expected_stock if planogram else None
-        shelf_breakdown = entry.get("shelf_breakdown", {})
-        primary_shelf = None
-        if planogram:
-            primary_shelf = planogram.shelf_id
-        elif shelf_breakdown:
-            primary_shelf = max(shelf_breakdown, key=shelf_breakdown.get)
-        
-        # Enrich with metadata
-        grozi_code = entry["product_name"]
-        payload.append(
-            {
-                "product_name": grozi_code,
-                "display_name": get_display_name(grozi_code),
-                "category": get_category(grozi_code),
-                "price": get_price(grozi_code),
-                "total_count": entry["total_count"],
-                "last_seen": entry["last_seen"],
-                "shelf_breakdown": shelf_breakdown,
-                "stock_level": determine_stock_level(entry["total_count"], expected),
-                "shelf_id": primary_shelf,
-                "inventory_value": entry["total_count"] * get_price(grozi_code),
-            }
-        )
-    return {"products": payload}
+    planograms = planogram_cache.get(db)
+    return build_stock_summary(stock_entries, planograms)
+
+
+@app.get("/stock/summary")
+def stock_summary(db: Session = Depends(get_read_db)):
+    return APIResponse({"products": _stock_summary_products(db)})
 
 
 @app.get("/stock")
-def get_stock_alias(db: Session = Depends(get_db)):
+def get_stock_alias(db: Session = Depends(get_read_db)):
     """Alias for /stock/summary to match frontend expectations."""
-    summary = stock_summary(db)
-    return summary["products"]
+    return APIResponse(_stock_summary_products(db))
 
 
 @app.get("/products", response_model=List[schemas.ProductRead])
 def get_products():
     """Get all products with metadata."""
-    products = []
-    for grozi_code in PRODUCT_NAME_MAP.keys():
-        products.append({
-            "product_name": grozi_code,
-            "display_name": get_display_name(grozi_code),
-            "category": get_category(grozi_code),
-            "price": get_price(grozi_code)
-        })
-    return products
+    return APIResponse(get_catalog().records())
+
+
+@app.get("/products/search", response_model=List[schemas.ProductSearchHit])
+def search_products(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    """Typo-tolerant autocomplete over product display names."""
+    hits = get_search_index().search(q, limit=limit, min_score=SEARCH_MIN_SCORE)
+    return APIResponse(
+        [
+            {
+                "product_name": hit.product.product_name,
+                "display_name": hit.product.display_name,
+                "category": hit.product.category,
+                "price": hit.product.price,
+                "score": hit.score,
+            }
+            for hit in hits
+        ]
+    )
 
 
 @app.get("/alerts", response_model=List[schemas.AlertRead])
-def get_alerts(resolved: bool = False, db: Session = Depends(get_db)):
-    return crud.get_alerts(db, resolved=resolved)
+def get_alerts(
+    request: Request,
+    resolved: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[schemas.ListFormat] = None,
+    accept: Optional[str] = Header(default=None),
+    db: Session = Depends(get_read_db),
+):
+    """List alerts newest first, one keyset page at a time or streamed as NDJSON."""
+    try:
+        if pagination.wants_ndjson(format, accept):
+            stmt = crud.alerts_query(resolved, cursor, limit)
+            return pagination.ndjson_response(crud.stream_rows(db, stmt), schemas.AlertRead)
+        alerts, next_cursor = crud.get_alerts(
+            db, resolved=resolved, cursor=cursor, limit=limit or pagination.ALERTS_PAGE_SIZE
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return pagination.page_response(request, alerts, next_cursor, schemas.AlertRead)
 
 
 @app.post("/alerts", response_model=schemas.AlertRead)
 def create_alert(alert: schemas.AlertCreate, db: Session = Depends(get_db)):
-    return crud.create_alert(db, alert)
+    try:
+        return crud.create_alert(db, alert)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="An open alert of this type already exists for the product")
 
 
 @app.put("/alerts/{alert_id}/resolve", response_model=schemas.AlertRead)
@@ -136,8 +374,38 @@ def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
     return alert
 
 
+@app.get("/stock/history", response_model=List[schemas.StockSnapshotRead])
+def get_stock_history_raw(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    format: Optional[schemas.ListFormat] = None,
+    accept: Optional[str] = Header(default=None),
+    db: Session = Depends(get_read_db),
+):
+    """Get raw stock snapshots for the frontend history view, newest first.
+
+    Follow ``X-Next-Cursor`` (or the ``Link`` header) for older pages; with
+    ``format=ndjson`` every snapshot since ``since`` is streamed unless a
+    ``limit`` is given.
+    """
+    try:
+        if pagination.wants_ndjson(format, accept):
+            stmt = crud.snapshots_query(cursor, limit, since)
+            return pagination.ndjson_response(
+                crud.stream_rows(db, stmt), schemas.StockSnapshotRead
+            )
+        snapshots, next_cursor = crud.get_snapshots(
+            db, cursor=cursor, limit=limit or pagination.HISTORY_PAGE_SIZE, since=since
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return pagination.page_response(request, snapshots, next_cursor, schemas.StockSnapshotRead)
+
+
 @app.get("/stock/{product_name}")
-def get_stock(product_name: str, db: Session = Depends(get_db)):
+def get_stock(product_name: str, db: Session = Depends(get_read_db)):
     stock = crud.get_product_stock(db, product_name)
     if not stock:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -145,16 +413,8 @@ def get_stock(product_name: str, db: Session = Depends(get_db)):
     return {**stock, "stock_level": stock_level}
 
 
-@app.get("/stock/history", response_model=List[schemas.StockSnapshotRead])
-def get_stock_history_raw(db: Session = Depends(get_db)):
-    """Get raw stock snapshots for the frontend history view."""
-    from backend.models import StockSnapshot
-    # Return last 1000 snapshots to avoid overloading
-    return db.query(StockSnapshot).order_by(StockSnapshot.snapshot_time.desc()).limit(1000).all()
-
-
 @app.get("/shelf/{shelf_id}", response_model=schemas.ShelfSummary)
-def shelf_summary(shelf_id: str, db: Session = Depends(get_db)):
+def shelf_summary(shelf_id: str, db: Session = Depends(get_read_db)):
     summary = crud.get_shelf_summary(db, shelf_id)
     products = []
     for product in summary["products"]:
@@ -169,20 +429,56 @@ def shelf_summary(shelf_id: str, db: Session = Depends(get_db)):
     return schemas.ShelfSummary(shelf_id=shelf_id, products=products)
 
 
+@app.get("/shelf/{shelf_id}/scans", response_model=List[schemas.ShelfScanRead])
+def shelf_scans(
+    shelf_id: str,
+    limit: int = Query(50, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+):
+    """The shelf's most recent scans, newest first; the first one is its current state."""
+    return crud.get_shelf_scans(db, shelf_id, limit)
+
+
+@app.get("/scans/{scan_id}/detections", response_model=List[schemas.DetectionRead])
+def scan_detections(scan_id: int, db: Session = Depends(get_read_db)):
+    """Raw detections recorded in one scan, for auditing a shelf's counts."""
+    detections = crud.get_scan_detections(db, scan_id)
+    if detections is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return detections
+
+
+@app.put("/planogram")
+def upsert_planogram(entries: List[schemas.PlanogramCreate], db: Session = Depends(get_db)):
+    """Create or update planogram entries in bulk; products not listed are left unchanged."""
+    return {"upserted": crud.upsert_planogram(db, entries)}
+
+
 @app.post("/shopping-list", response_model=schemas.ShoppingListResponse)
 def shopping_list(
-    request: schemas.ShoppingListRequest, db: Session = Depends(get_db)
+    request: schemas.ShoppingListRequest, db: Session = Depends(get_read_db)
 ):
-    response_items = []
+    # Convert display names to grozi codes (reverse lookup) before hitting the DB,
+    # falling back to the closest fuzzy match for misspelled or partial names.
+    catalog = get_catalog()
+    grozi_codes = []
     for raw_item in request.items:
-        product_name = raw_item.strip()
-        if not product_name:
+        item = raw_item.strip()
+        if not item:
             continue
-        # Convert display name to grozi code if needed (for reverse lookup)
-        grozi_code = get_grozi_code(product_name)
+        code = catalog.resolve(item)
+        if code not in catalog:
+            match = get_search_index().best_match(item, FUZZY_MIN_SCORE)
+            if match:
+                code = match.product_name
+        grozi_codes.append(code)
+    planograms = planogram_cache.get(db)
+    stock_by_product = crud.get_stock_for_products(db, grozi_codes)
 
-        planogram = crud.get_planogram_entry(db, grozi_code)
-        stock = crud.get_product_stock(db, grozi_code)
+    response_items = []
+    for grozi_code in grozi_codes:
+        planogram = planograms.get(grozi_code)
+        stock = stock_by_product.get(grozi_code)
         count = stock["total_count"] if stock else 0
         shelf_id: Optional[str] = None
         if planogram:
@@ -203,34 +499,111 @@ def shopping_list(
 
 
 @app.get("/analytics/stock-history")
-def stock_history(days: int = 7, db: Session = Depends(get_db)):
-    """Get stock history for the last N days."""
-    from backend.models import StockSnapshot
-    from datetime import datetime, timedelta
-    from collections import defaultdict
-
-    cutoff_date = datetime.now() - timedelta(days=days)
-
-    snapshots = (
-        db.query(StockSnapshot)
-        .filter(StockSnapshot.snapshot_time >= cutoff_date)
-        .order_by(StockSnapshot.snapshot_time)
-        .all()
-    )
-
-    # Group by product and date
-    history = defaultdict(lambda: defaultdict(int))
-    for snapshot in snapshots:
-        date_key = snapshot.snapshot_time.strftime("%Y-%m-%d")
-        history[snapshot.product_name][date_key] = snapshot.count
+def stock_history(
+    days: int = 7,
+    resolution: schemas.HistoryResolution = "auto",
+    stat: schemas.HistoryStat = "last",
+    db: Session = Depends(get_read_db),
+):
+    """Get stock history for the last N days.
 
-    return {"history": dict(history)}
+    ``resolution=auto`` serves hourly buckets for windows of up to two days
+    and daily buckets beyond that; ``stat`` picks the per-bucket value.
+    """
+    return APIResponse({"history": crud.get_stock_history(db, days, resolution, stat)})
 
 
 @app.get("/analytics")
-def analytics_alias(days: int = 7, db: Session = Depends(get_db)):
+def analytics_alias(
+    days: int = 7,
+    resolution: schemas.HistoryResolution = "auto",
+    stat: schemas.HistoryStat = "last",
+    db: Session = Depends(get_read_db),
+):
     """Alias for /analytics/stock-history to match frontend expectations."""
-    return stock_history(days, db)
+    return stock_history(days, resolution, stat, db)
+
+
+@app.get("/analytics/velocity")
+def stock_velocity(
+    days: int = Query(30, ge=1),
+    resolution: schemas.HistoryResolution = "auto",
+    window: int = Query(7, ge=2, description="Trailing buckets behind the recent rate and trend"),
+    db: Session = Depends(get_read_db),
+):
+    """Per-product stock change, depletion rate, trend and projected stock-out over the last N days.
+
+    Products are ordered by ``change``, largest increase first; ``highlights``
+    names the biggest increase and decrease.
+    """
+    return APIResponse(velocity_cache.get(db, days, resolution, window))
+
+
+def _resume_point(since: Optional[int], last_event_id: Optional[str]) -> int:
+    """Sequence to resume after: explicit ``since`` wins over SSE ``Last-Event-ID``."""
+    if since is not None:
+        return since
+    if last_event_id and last_event_id.isdigit():
+        return int(last_event_id)
+    # New subscribers start from "now"; they load /stock/summary for the baseline.
+    return stock_events.last_seq
+
+
+@app.get("/stream/stock")
+async def stream_stock_sse(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    product_name: Optional[str] = None,
+    shelf_id: Optional[str] = None,
+    store_id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(default=None),
+):
+    """Server-Sent Events feed of stock and alert deltas.
+
+    Each event's ``id`` is its sequence number, so browsers resume
+    automatically via ``Last-Event-ID`` after a reconnect.
+    """
+    cursor = _resume_point(since, last_event_id)
+
+    async def event_source():
+        async for batch in stock_events.subscribe(cursor, settings.stream_heartbeat_seconds):
+            if await request.is_disconnected():
+                return
+            if not batch:
+                yield ": keep-alive\n\n"
+                continue
+            for item in batch:
+                if matches(item, product_name, shelf_id, store_id):
+                    yield f"id: {item['seq']}\nevent: {item['type']}\ndata: {json.dumps(item)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/stream/stock")
+async def stream_stock_ws(
+    websocket: WebSocket,
+    since: Optional[int] = Query(None, ge=0),
+    product_name: Optional[str] = None,
+    shelf_id: Optional[str] = None,
+    store_id: Optional[str] = None,
+):
+    """WebSocket feed of the same deltas as the SSE endpoint, one JSON message per event."""
+    await websocket.accept()
+    cursor = _resume_point(since, None)
+    try:
+        async for batch in stock_events.subscribe(cursor, settings.stream_heartbeat_seconds):
+            if not batch:
+                await websocket.send_json({"type": "heartbeat", "seq": stock_events.last_seq})
+                continue
+            for item in batch:
+                if matches(item, product_name, shelf_id, store_id):
+                    await websocket.send_json(item)
+    except WebSocketDisconnect:
+        pass
 
 
 @app.get("/health")
@@ -251,11 +624,34 @@ async def predict_image(file: UploadFile = File(...)):
     try:
         result = run_inference(tmp_path, yolo_model)
         detections = yolo_result_to_detections(result)
-        return {"detections": detections}
+        return APIResponse({"detections": detections})
     finally:
         if tmp_path.exists():
             tmp_path.unlink()
 
 
+def _store_id(store_id: str = PathParam(..., description="Store whose shard serves the request")) -> str:
+    return store_id
+
+
+def _add_store_routes() -> None:
+    """Mount every session-backed endpoint under ``STORE_PREFIX``, routed to that store's shard."""
+    for route in list(app.router.routes):
+        if isinstance(route, APIRoute) and any(
+            dependency.call in (get_db, get_read_db) for dependency in route.dependant.dependencies
+        ):
+            app.add_api_route(
+                STORE_PREFIX + route.path,
+                route.endpoint,
+                methods=list(route.methods),
+                response_model=route.response_model,
+                name=f"store_{route.name}",
+                dependencies=[Depends(_store_id)],
+            )
+
+
+_add_store_routes()
+
+
 if __name__ == "__main__":
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8002, reload=True)
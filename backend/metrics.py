@@ -0,0 +1,193 @@
+"""Per-request latency and database query instrumentation.
+
+The request middleware in ``backend/main.py`` opens a :class:`RequestTimings`
+for each request in a context variable. The engine hooks in
+``backend/database.py`` add every query's count and duration to it, and
+:class:`~backend.serialization.APIResponse` adds its render time. Sync
+handlers run in the threadpool with a copy of the request's context, so
+they record into the same object.
+
+When the response is ready the middleware folds the timings into
+per-route histograms, which ``/metrics`` exports in the Prometheus text
+format. With ``SERVER_TIMING=true`` each response also carries them in a
+``Server-Timing`` header (``db``, ``serialize``, ``app`` for the rest and
+``total``), so browser devtools show where a request's time went.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class RequestTimings:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    query_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def begin_request() -> Tuple[RequestTimings, Token]:
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token: Token) -> None:
+    _current.reset(token)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus exposes it."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> (per-bucket counts with a trailing +Inf slot, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][slot] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total[0]) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            base = _labels(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(zip(self.label_names, labels), le=le)} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {total!r}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: Any, **extra: str) -> str:
+    items = [*pairs, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in items) + "}"
+
+
+# (/metrics name, pool_stats key, type, help)
+_POOL_METRICS = (
+    ("db_pool_checked_out", "checked_out", "gauge", "Connections currently checked out of the pool."),
+    ("db_pool_overflow", "overflow", "gauge", "Overflow connections currently open beyond pool_size."),
+    ("db_pool_checkouts_total", "checkouts_total", "counter", "Connections checked out of the pool."),
+    ("db_pool_timeouts_total", "timeouts_total", "counter", "Checkouts that timed out waiting for a connection."),
+)
+
+
+class RequestMetrics:
+    """Route latency, per-request query count and query time, and overall query time."""
+
+    def __init__(self) -> None:
+        route_labels = ("method", "route")
+        self.latency = Histogram(
+            "http_request_duration_seconds",
+            "Time from request start to response headers.",
+            route_labels + ("status",),
+            LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            "http_request_db_queries", "Database queries issued per request.", route_labels, QUERY_COUNT_BUCKETS
+        )
+        self.query_time = Histogram(
+            "http_request_db_seconds", "Time spent in database queries per request.", route_labels, LATENCY_BUCKETS
+        )
+        self.serialize_time = Histogram(
+            "http_request_serialize_seconds",
+            "Time spent rendering the response body per request.",
+            route_labels,
+            LATENCY_BUCKETS,
+        )
+        self.all_queries = Histogram(
+            "db_query_duration_seconds",
+            "Duration of every database query, including background work.",
+            (),
+            LATENCY_BUCKETS,
+        )
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, timings: RequestTimings) -> None:
+        labels = (method, route)
+        self.latency.observe(labels + (str(status),), seconds)
+        self.queries.observe(labels, timings.queries)
+        self.query_time.observe(labels, timings.query_seconds)
+        self.serialize_time.observe(labels, timings.serialize_seconds)
+
+    def render(self, pools: Mapping[str, Optional[Dict[str, Any]]]) -> str:
+        lines: List[str] = []
+        for histogram in (self.latency, self.queries, self.query_time, self.serialize_time, self.all_queries):
+            lines.extend(histogram.render())
+        for name, key, kind, help_text in _POOL_METRICS:
+            samples = [(pool, stats[key]) for pool, stats in pools.items() if stats and key in stats]
+            if samples:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels([('pool', pool)])} {value}" for pool, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+def record_query(seconds: float) -> None:
+    """Count one finished query against the current request, if any, and overall."""
+    request_metrics.all_queries.observe((), seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.query_seconds += seconds
+
+
+@contextmanager
+def timed_serialization() -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize_seconds += time.perf_counter() - started
+
+
+def server_timing(timings: RequestTimings, total_seconds: float) -> str:
+    """``Server-Timing`` header value splitting the request into db, serialize and the rest."""
+    app_seconds = max(total_seconds - timings.query_seconds - timings.serialize_seconds, 0.0)
+    return ", ".join(
+        [
+            f'db;dur={timings.query_seconds * 1000:.2f};desc="{timings.queries} queries"',
+            f"serialize;dur={timings.serialize_seconds * 1000:.2f}",
+            f"app;dur={app_seconds * 1000:.2f}",
+            f"total;dur={total_seconds * 1000:.2f}",
+        ]
+    )
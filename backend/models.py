@@ -3,24 +3,90 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, Integer, String, Boolean, func
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Boolean, UniqueConstraint, false, func
 from sqlalchemy.orm import declarative_base
 
+from backend.stores import DEFAULT_STORE, current_store
+
 Base = declarative_base()
 
 
+def _store_column() -> Column:
+    # Stamped from the session's store on insert (see backend/stores.py).
+    return Column(String, nullable=False, default=current_store, server_default=DEFAULT_STORE)
+
+
 class ProductDetection(Base):
     __tablename__ = "product_detections"
+    __table_args__ = (
+        # Leading product_name serves per-product lookups; with shelf_id and
+        # timestamp, per-product audit queries are index-only scans.
+        Index("ix_product_detections_product_shelf", "product_name", "shelf_id", "timestamp"),
+        Index("ix_product_detections_shelf_product", "shelf_id", "product_name"),
+        Index("ix_product_detections_scan_id", "scan_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    product_name = Column(String, index=True, nullable=False)
+    product_name = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
     bbox_x1 = Column(Float, nullable=False)
     bbox_y1 = Column(Float, nullable=False)
     bbox_x2 = Column(Float, nullable=False)
     bbox_y2 = Column(Float, nullable=False)
-    shelf_id = Column(String, index=True, nullable=True)
+    shelf_id = Column(String, nullable=True)
     timestamp = Column(DateTime, default=func.now(), nullable=False)
+    # The shelf scan this detection was posted in; NULL for rows ingested
+    # before scans were recorded. Detections are kept for audit only.
+    scan_id = Column(Integer, nullable=True)
+    store_id = _store_column()
+
+
+# Shelf key used for detections that arrive without a shelf_id.
+UNASSIGNED_SHELF = ""
+
+
+class ShelfScan(Base):
+    """One capture of a shelf: the detections for it in a single upload."""
+
+    __tablename__ = "shelf_scans"
+    __table_args__ = (Index("ix_shelf_scans_shelf_captured", "shelf_id", "captured_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    shelf_id = Column(String, nullable=False)
+    captured_at = Column(DateTime, nullable=False)
+    detection_count = Column(Integer, nullable=False, default=0)
+
+
+class ShelfState(Base):
+    """Current product counts per shelf, i.e. the latest scan of each shelf.
+
+    Ingest replaces a shelf's rows whenever a newer scan arrives, so the table
+    holds one row per (product, shelf) ever seen together and summary queries
+    are bounded by shelves, not by detection history. Products missing from
+    the latest scan keep their row with ``count = 0``.
+    """
+
+    __tablename__ = "shelf_state"
+    __table_args__ = (
+        # The unique constraint doubles as the per-product index.
+        UniqueConstraint("product_name", "shelf_id", name="uq_shelf_state_product_shelf"),
+        Index(
+            "ix_shelf_state_shelf_product",
+            "shelf_id",
+            "product_name",
+            postgresql_include=["count", "last_seen"],
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_name = Column(String, nullable=False)
+    # Detections without a shelf form scans of UNASSIGNED_SHELF so the
+    # (product_name, shelf_id) pair can be used as an upsert conflict target.
+    shelf_id = Column(String, nullable=False, default=UNASSIGNED_SHELF)
+    count = Column(Integer, nullable=False, default=0)
+    last_seen = Column(DateTime, nullable=True)
+    scan_id = Column(Integer, nullable=False)
+    captured_at = Column(DateTime, nullable=False)
 
 
 class Planogram(Base):
@@ -30,24 +96,78 @@ class Planogram(Base):
     product_name = Column(String, unique=True, nullable=False)
     shelf_id = Column(String, nullable=False)
     expected_stock = Column(Integer, nullable=False, default=0)
+    store_id = _store_column()
 
 
 class StockSnapshot(Base):
     __tablename__ = "stock_snapshots"
+    # (snapshot_time, id) matches the keyset order of /stock/history; the
+    # unique index keeps concurrent snapshot writers to one row per bucket.
+    __table_args__ = (
+        Index("ix_stock_snapshots_time_id", "snapshot_time", "id"),
+        Index("uq_stock_snapshots_product_time", "product_name", "snapshot_time", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_name = Column(String, index=True, nullable=False)
     count = Column(Integer, nullable=False)
     shelf_id = Column(String, nullable=True)
-    snapshot_time = Column(DateTime, default=func.now(), nullable=False, index=True)
+    snapshot_time = Column(DateTime, default=func.now(), nullable=False)
+    store_id = _store_column()
+
+
+class StockRollup(Base):
+    """Per-product snapshot statistics for one hour or day bucket."""
+
+    __tablename__ = "stock_rollups"
+    __table_args__ = (
+        UniqueConstraint("resolution", "product_name", "bucket_start", name="uq_stock_rollups_bucket"),
+        Index("ix_stock_rollups_resolution_bucket", "resolution", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String, nullable=False)  # "hour", "day"
+    product_name = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    min_count = Column(Integer, nullable=False)
+    max_count = Column(Integer, nullable=False)
+    sum_count = Column(Integer, nullable=False)
+    samples = Column(Integer, nullable=False)
+    last_count = Column(Integer, nullable=False)
+    last_time = Column(DateTime, nullable=False)
 
 
 class Alert(Base):
     __tablename__ = "alerts"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_name = Column(String, index=True, nullable=False)
+    product_name = Column(String, nullable=False)
     alert_type = Column(String, nullable=False)  # "LOW_STOCK", "OUT_OF_STOCK"
     message = Column(String, nullable=False)
-    created_at = Column(DateTime, default=func.now(), nullable=False)
+    # UTC from the app, like the alert engine's rows, so both sort on one clock.
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     resolved = Column(Boolean, default=False, nullable=False)
+    store_id = _store_column()
+
+
+# Open alerts are a small, hot slice of the table, so they get partial indexes:
+# one in the /alerts keyset order and one for the alert engine's per-product
+# lookup, which is also UNIQUE so at most one alert per product and type is
+# open. Queries must filter with ``resolved == false()`` (a literal, not a
+# bound parameter) for the planner to match the index predicate.
+UNRESOLVED = Alert.resolved == false()
+Index(
+    "ix_alerts_unresolved_created",
+    Alert.created_at,
+    Alert.id,
+    postgresql_where=UNRESOLVED,
+    sqlite_where=UNRESOLVED,
+)
+Index(
+    "uq_alerts_unresolved_product",
+    Alert.product_name,
+    Alert.alert_type,
+    unique=True,
+    postgresql_where=UNRESOLVED,
+    sqlite_where=UNRESOLVED,
+)
@@ -0,0 +1,64 @@
+"""Response helpers for cursor-paginated and NDJSON-streamed listings.
+
+``/stock/history`` and ``/alerts`` return one keyset page as a JSON array,
+with the cursor for the following page in an ``X-Next-Cursor`` header and a
+``Link: <...>; rel="next"`` header, so existing clients that expect a plain
+list keep working. ``format=ndjson`` (or ``Accept: application/x-ndjson``)
+instead streams one JSON object per line straight from a server-side cursor,
+which keeps memory flat however many rows are exported.
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterable, Iterable, List, Optional, Type, Union
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from backend.serialization import APIResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Default and maximum page sizes for the JSON listings.
+HISTORY_PAGE_SIZE = 1000
+ALERTS_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 10_000
+
+
+def wants_ndjson(format: Optional[str], accept: Optional[str]) -> bool:
+    if format:
+        return format == "ndjson"
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+def page_response(
+    request: Request, items: List[Any], next_cursor: Optional[str], schema: Type[BaseModel]
+) -> APIResponse:
+    body = [schema.model_validate(item).model_dump() for item in items]
+    headers = {}
+    if next_cursor:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{next_url}>; rel="next"'
+    return APIResponse(body, headers=headers)
+
+
+def _ndjson_lines(rows: Iterable[Any], schema: Type[BaseModel]):
+    for row in rows:
+        yield schema.model_validate(row).model_dump_json() + "\n"
+
+
+async def _ndjson_lines_async(rows: AsyncIterable[Any], schema: Type[BaseModel]):
+    async for row in rows:
+        yield schema.model_validate(row).model_dump_json() + "\n"
+
+
+def ndjson_response(
+    rows: Union[Iterable[Any], AsyncIterable[Any]], schema: Type[BaseModel]
+) -> StreamingResponse:
+    """Stream ``rows`` as newline-delimited JSON, serializing one row at a time."""
+    if hasattr(rows, "__aiter__"):
+        lines = _ndjson_lines_async(rows, schema)
+    else:
+        lines = _ndjson_lines(rows, schema)
+    return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,361 @@
+"""Time partitioning and retention for ``product_detections``.
+
+Postgres uses native declarative range partitioning on ``timestamp``: the
+parent table is created with ``PARTITION BY RANGE`` and one child table per
+period (``product_detections_pYYYYMMDD``) is created ahead of time, so
+queries filtered on recent timestamps are pruned to recent partitions.
+Rows outside every pre-created period land in the DEFAULT partition
+(``product_detections_default``). Postgres refuses to create a period
+partition while DEFAULT holds rows of that period, so
+:func:`ensure_partitions` first detaches DEFAULT, creates the partition,
+moves the period's rows into it and attaches DEFAULT again.
+
+SQLite has no partitioning, so the same layout is emulated with one table
+per period: ``product_detections`` holds only the open period and closed
+periods are moved into ``product_detections_pYYYYMMDD`` tables when
+:func:`seal_closed_periods` runs. Sealed tables are not visible through the
+ORM model; readers of the audit trail (``shelf_state`` rebuilds, snapshot
+backfills, ``/scans/{id}/detections``) go through :func:`detections_source`,
+which adds them back.
+
+On both backends :func:`apply_retention` backfills the stock snapshots of
+partitions older than the retention window from their scans
+(:func:`backend.snapshots.backfill`, so each bucket holds the latest scan
+per shelf as of its end) and then drops the raw partition. DEFAULT rows of
+periods past the cutoff are backfilled the same way and then deleted.
+
+Run maintenance from cron or a scheduler::
+
+    python -m backend.partitions maintain
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import DateTime, bindparam, column, select, table, text, union_all
+from sqlalchemy.sql import FromClause
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.config import settings
+from backend.stores import DEFAULT_STORE
+
+TABLE = models.ProductDetection.__tablename__
+PARTITION_PREFIX = f"{TABLE}_p"
+DEFAULT_PARTITION = f"{TABLE}_default"
+# Periods are aligned to this epoch so every process derives the same boundaries.
+PERIOD_EPOCH = datetime(2000, 1, 1)
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: datetime
+    end: datetime
+
+
+def period_start(moment: datetime, interval_days: Optional[int] = None) -> datetime:
+    interval = timedelta(days=interval_days or settings.detection_partition_days)
+    return PERIOD_EPOCH + ((moment - PERIOD_EPOCH) // interval) * interval
+
+
+def partition_for(start: datetime, interval_days: Optional[int] = None) -> Partition:
+    interval = timedelta(days=interval_days or settings.detection_partition_days)
+    return Partition(f"{PARTITION_PREFIX}{start:%Y%m%d}", start, start + interval)
+
+
+def _partition_from_name(name: str, interval_days: Optional[int] = None) -> Optional[Partition]:
+    try:
+        start = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d")
+    except ValueError:
+        return None  # e.g. the Postgres DEFAULT partition
+    return partition_for(start, interval_days)
+
+
+def _in_period(sql: str):
+    """Bind ``:start``/``:end`` as DateTime so SQLite compares them in its storage format."""
+    return text(sql).bindparams(
+        bindparam("start", type_=DateTime), bindparam("end", type_=DateTime)
+    )
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def create_partitioned_table(db: Session) -> None:
+    """Create ``product_detections`` as a range-partitioned table on Postgres.
+
+    The partition key must be part of the primary key, so the parent uses
+    ``(id, timestamp)``; ids still come from a single sequence and stay unique.
+    A DEFAULT partition catches rows outside the pre-created periods. The
+    parent has the model's current columns; ``alembic upgrade head`` run
+    afterwards skips adding the ones it already has.
+    """
+    if _dialect(db) != "postgresql":
+        raise NotImplementedError("Native partitioning is only available on Postgres")
+    db.execute(
+        text(
+            f"""
+            CREATE TABLE IF NOT EXISTS {TABLE} (
+                id BIGSERIAL,
+                product_name VARCHAR NOT NULL,
+                confidence DOUBLE PRECISION NOT NULL,
+                bbox_x1 DOUBLE PRECISION NOT NULL,
+                bbox_y1 DOUBLE PRECISION NOT NULL,
+                bbox_x2 DOUBLE PRECISION NOT NULL,
+                bbox_y2 DOUBLE PRECISION NOT NULL,
+                shelf_id VARCHAR,
+                scan_id INTEGER,
+                store_id VARCHAR NOT NULL DEFAULT '{DEFAULT_STORE}',
+                timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+            """
+        )
+    )
+    # Indexes on the parent cascade to every partition.
+    for index in models.ProductDetection.__table__.indexes:
+        db.execute(CreateIndex(index, if_not_exists=True))
+    db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    db.commit()
+
+
+def is_partitioned(db: Session) -> bool:
+    if _dialect(db) != "postgresql":
+        return False
+    return bool(
+        db.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = :table"
+            ),
+            {"table": TABLE},
+        ).scalar()
+    )
+
+
+def _exists(db: Session, name: str) -> bool:
+    return db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def _default_has_rows(db: Session, start: datetime, end: datetime) -> bool:
+    return db.execute(
+        _in_period(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end LIMIT 1"),
+        {"start": start, "end": end},
+    ).first() is not None
+
+
+def ensure_partitions(db: Session, start: datetime, end: datetime) -> List[Partition]:
+    """Create Postgres partitions covering ``[start, end)``; no-op on SQLite.
+
+    A period whose rows already landed in the DEFAULT partition gets them
+    moved into its new partition, in the same transaction. SQLite period
+    tables are created lazily by :func:`seal_closed_periods`.
+    """
+    if _dialect(db) != "postgresql":
+        return []
+    has_default = _exists(db, DEFAULT_PARTITION)
+    columns = ", ".join(c.name for c in models.ProductDetection.__table__.columns)
+    created = []
+    current = period_start(start)
+    while current < end:
+        partition = partition_for(current)
+        current = partition.end
+        if _exists(db, partition.name):
+            continue
+        # DDL can't take bind parameters, so the bounds are rendered as literals.
+        create = text(
+            f"CREATE TABLE {partition.name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{partition.start:%Y-%m-%d %H:%M:%S}') "
+            f"TO ('{partition.end:%Y-%m-%d %H:%M:%S}')"
+        )
+        if has_default and _default_has_rows(db, partition.start, partition.end):
+            bounds = {"start": partition.start, "end": partition.end}
+            db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+            db.execute(create)
+            for statement in (
+                f"INSERT INTO {partition.name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} "
+                "WHERE timestamp >= :start AND timestamp < :end",
+                f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end",
+            ):
+                db.execute(_in_period(statement), bounds)
+            db.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+        else:
+            db.execute(create)
+        created.append(partition)
+    db.commit()
+    return created
+
+
+def list_partitions(db: Session) -> List[Partition]:
+    """Return period partitions (Postgres children or SQLite sealed tables), oldest first."""
+    if _dialect(db) == "postgresql":
+        names = db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "WHERE parent.relname = :table"
+            ),
+            {"table": TABLE},
+        ).scalars()
+    else:
+        names = db.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :pattern"),
+            {"pattern": f"{PARTITION_PREFIX}%"},
+        ).scalars()
+    partitions = [p for p in (_partition_from_name(name) for name in names) if p]
+    return sorted(partitions, key=lambda p: p.start)
+
+
+def detections_source(db: Session) -> FromClause:
+    """Every detection still kept, with the columns of ``product_detections``.
+
+    On Postgres partitions are part of the table. On SQLite the sealed period
+    tables are unioned onto the live one, so readers see closed periods too
+    until retention drops them.
+    """
+    live = models.ProductDetection.__table__
+    sealed = list_partitions(db) if _dialect(db) != "postgresql" else []
+    if not sealed:
+        return live
+    columns = [(c.name, c.type) for c in live.columns]
+    periods = [select(table(p.name, *(column(name, type_) for name, type_ in columns))) for p in sealed]
+    return union_all(select(live), *periods).subquery("all_detections")
+
+
+def seal_closed_periods(db: Session, now: Optional[datetime] = None) -> List[Partition]:
+    """Move rows of closed periods out of the live SQLite table into period tables."""
+    if _dialect(db) == "postgresql":
+        return []
+    open_start = period_start(now or datetime.utcnow())
+    oldest = db.execute(
+        text(f"SELECT MIN(timestamp) FROM {TABLE} WHERE timestamp < :open_start").bindparams(
+            bindparam("open_start", type_=DateTime)
+        ),
+        {"open_start": open_start},
+    ).scalar()
+    if oldest is None:
+        return []
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+
+    sealed = []
+    current = period_start(oldest)
+    while current < open_start:
+        partition = partition_for(current)
+        bounds = {"start": partition.start, "end": partition.end}
+        has_rows = db.execute(
+            _in_period(
+                f"SELECT 1 FROM {TABLE} WHERE timestamp >= :start AND timestamp < :end LIMIT 1"
+            ),
+            bounds,
+        ).first()
+        if has_rows:
+            db.execute(
+                text(f"CREATE TABLE IF NOT EXISTS {partition.name} AS SELECT * FROM {TABLE} WHERE 0")
+            )
+            for statement in (
+                f"INSERT INTO {partition.name} SELECT * FROM {TABLE} "
+                "WHERE timestamp >= :start AND timestamp < :end",
+                f"DELETE FROM {TABLE} WHERE timestamp >= :start AND timestamp < :end",
+            ):
+                db.execute(_in_period(statement), bounds)
+            sealed.append(partition)
+        current = partition.end
+    db.commit()
+    return sealed
+
+
+def apply_retention(
+    db: Session, now: Optional[datetime] = None, retention_days: Optional[int] = None
+) -> List[Partition]:
+    """Snapshot partitions that ended before the retention cutoff and drop them.
+
+    The period's snapshot buckets are backfilled from its scans first, so the
+    history keeps the stock as of each bucket rather than a count of every
+    detection; buckets already snapshotted are left alone. On Postgres,
+    DEFAULT partition rows of those periods are backfilled and deleted too,
+    and reported as one ``product_detections_default`` entry.
+    """
+    from backend import snapshots
+
+    if retention_days is None:
+        retention_days = settings.detection_retention_days
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=retention_days)
+    dropped = []
+    for partition in list_partitions(db):
+        if partition.end > cutoff:
+            continue
+        snapshots.backfill(db, partition.start, partition.end, now=now)
+        db.execute(text(f"DROP TABLE {partition.name}"))
+        db.commit()
+        dropped.append(partition)
+
+    expired_before = period_start(cutoff)
+    if _dialect(db) == "postgresql" and _exists(db, DEFAULT_PARTITION):
+        oldest = db.execute(text(f"SELECT MIN(timestamp) FROM {DEFAULT_PARTITION}")).scalar()
+        if oldest is not None and oldest < expired_before:
+            expired = Partition(DEFAULT_PARTITION, period_start(oldest), expired_before)
+            snapshots.backfill(db, expired.start, expired.end, now=now)
+            db.execute(
+                text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :end").bindparams(
+                    bindparam("end", type_=DateTime)
+                ),
+                {"end": expired.end},
+            )
+            db.commit()
+            dropped.append(expired)
+    return dropped
+
+
+def run_maintenance(db: Session, now: Optional[datetime] = None, days_ahead: int = 7) -> dict:
+    """Pre-create upcoming partitions, seal closed SQLite periods and apply retention."""
+    now = now or datetime.utcnow()
+    created = []
+    if is_partitioned(db):
+        created = ensure_partitions(db, now, now + timedelta(days=days_ahead))
+    sealed = seal_closed_periods(db, now)
+    dropped = apply_retention(db, now)
+    return {
+        "created": [p.name for p in created],
+        "sealed": [p.name for p in sealed],
+        "rolled_up_and_dropped": [p.name for p in dropped],
+    }
+
+
+def main() -> None:
+    from backend.database import stores
+
+    parser = argparse.ArgumentParser(description="Manage product_detections partitions")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Store shard to run against (STORE_SHARDS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="Create the partitioned parent table (Postgres, empty database)")
+    maintain = sub.add_parser("maintain", help="Create upcoming partitions, seal periods, apply retention")
+    maintain.add_argument("--days-ahead", type=int, default=7)
+    sub.add_parser("list", help="List period partitions")
+    args = parser.parse_args()
+
+    db = stores.session(args.store)
+    try:
+        if args.command == "create":
+            create_partitioned_table(db)
+            ensure_partitions(db, datetime.utcnow(), datetime.utcnow() + timedelta(days=7))
+            print(f"✅ Created partitioned table {TABLE}")
+        elif args.command == "maintain":
+            print(run_maintenance(db, days_ahead=args.days_ahead))
+        else:
+            for partition in list_partitions(db):
+                print(f"{partition.name}\t{partition.start:%Y-%m-%d %H:%M}\t{partition.end:%Y-%m-%d %H:%M}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
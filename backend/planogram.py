@@ -0,0 +1,140 @@
+"""Process-local cache of the planogram.
+
+The planogram changes rarely (a merchandiser edit, a bulk ``PUT /planogram``)
+but every ``/stock/summary`` and ``/shopping-list`` needs it, so those read an
+immutable in-memory snapshot instead of querying the table on each request.
+Each store has its own snapshot.
+
+A write invalidates the snapshot once its transaction commits (never on
+rollback): ORM changes to :class:`models.Planogram` are picked up from the
+session, and Core statements call :func:`mark_planogram_changed`. The next
+read reloads the whole table in one query. Writes made by other processes
+are picked up after at most ``PLANOGRAM_CACHE_TTL`` seconds; 0 disables the
+cache. A snapshot read through a replica session may predate the last
+committed write, so it is kept for at most ``DB_REPLICA_MAX_LAG_SECONDS``.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.config import settings
+from backend.database import REPLICA_KEY
+from backend.stores import store_of
+
+_CHANGED_KEY = "planogram_changed"
+
+
+@dataclass(frozen=True)
+class PlanogramEntry:
+    product_name: str
+    shelf_id: str
+    expected_stock: int
+
+
+def _query():
+    planogram = models.Planogram
+    return select(planogram.product_name, planogram.shelf_id, planogram.expected_stock)
+
+
+def _snapshot(rows: Iterable) -> Mapping[str, PlanogramEntry]:
+    return MappingProxyType({row.product_name: PlanogramEntry(*row) for row in rows})
+
+
+class PlanogramCache:
+    """Per-store planogram snapshots, reloaded after a committed write or ``ttl`` seconds."""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # store_id -> (entries, expires_at)
+        self._entries: Dict[str, Tuple[Mapping[str, PlanogramEntry], float]] = {}
+        # Bumped by every invalidation, so a load that raced a write is not kept.
+        self._generation = 0
+
+    def invalidate(self, store_id: Optional[str] = None) -> None:
+        """Drop one store's snapshot, or every store's when ``store_id`` is None."""
+        with self._lock:
+            self._generation += 1
+            if store_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(store_id, None)
+
+    def _fresh(self, store_id: str) -> Optional[Mapping[str, PlanogramEntry]]:
+        cached = self._entries.get(store_id)
+        if cached is not None and time.monotonic() < cached[1]:
+            return cached[0]
+        return None
+
+    def _store(self, db, store_id: str, entries: Mapping[str, PlanogramEntry], generation: int) -> None:
+        ttl = self.ttl
+        if db.info.get(REPLICA_KEY) and settings.db_replica_max_lag_seconds:
+            ttl = min(ttl, settings.db_replica_max_lag_seconds)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[store_id] = (entries, time.monotonic() + ttl)
+
+    def get(self, db: Session) -> Mapping[str, PlanogramEntry]:
+        """The session's store's planogram entries keyed by product name.
+
+        A session with uncommitted planogram writes reads its own view instead.
+        """
+        if db.info.get(_CHANGED_KEY):
+            return _snapshot(db.execute(_query()))
+        store_id = store_of(db)
+        entries = self._fresh(store_id)
+        if entries is not None:
+            return entries
+        generation = self._generation
+        entries = _snapshot(db.execute(_query()))
+        self._store(db, store_id, entries, generation)
+        return entries
+
+    async def get_async(self, db: AsyncSession) -> Mapping[str, PlanogramEntry]:
+        store_id = store_of(db)
+        entries = self._fresh(store_id)
+        if entries is not None:
+            return entries
+        generation = self._generation
+        entries = _snapshot(await db.execute(_query()))
+        self._store(db, store_id, entries, generation)
+        return entries
+
+
+planogram_cache = PlanogramCache(settings.planogram_cache_ttl)
+
+
+def mark_planogram_changed(db: Session) -> None:
+    """Flag ``db`` so the planogram cache is invalidated when its transaction commits."""
+    db.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "before_flush")
+def _track_orm_writes(session: Session, flush_context, instances) -> None:
+    if any(
+        isinstance(obj, models.Planogram)
+        for obj in itertools.chain(session.new, session.dirty, session.deleted)
+    ):
+        mark_planogram_changed(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED_KEY, False):
+        planogram_cache.invalidate(store_of(session))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop(_CHANGED_KEY, None)
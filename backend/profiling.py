@@ -0,0 +1,185 @@
+"""Opt-in sampling profiler for live requests.
+
+:class:`ProfilingMiddleware` profiles a request when it carries
+``X-Profile: <PROFILE_TOKEN>`` or is picked at random with probability
+``PROFILE_SAMPLE_RATE``. While the request runs, a background thread reads
+every thread's Python stack with ``sys._current_frames()`` each
+``PROFILE_INTERVAL_MS``; that covers the event loop and the threadpool
+worker a sync handler runs on, without tracing hooks slowing the handler
+itself. Threads idling in a selector, queue or condition wait are skipped.
+
+Each profile is written to ``PROFILE_DIR`` in the collapsed-stack format
+(``frame;frame;frame count`` per line) read by ``flamegraph.pl``,
+speedscope and inferno, and token-requested responses name the file in an
+``X-Profile-File`` header. Only one request is profiled at a time, and the
+sampler sees the whole process, so concurrent requests show up in the same
+profile.
+
+The middleware is only installed when a token or a sample rate is
+configured, so a disabled profiler costs nothing per request.
+"""
+from __future__ import annotations
+
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = "x-profile"
+
+# (file name, function) of frames a thread sits in while it has nothing to do.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _is_idle(frame: FrameType) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+class StackSampler(threading.Thread):
+    """Counts the collapsed Python stack of every busy thread once per ``interval`` seconds."""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class Profiler:
+    """Decides which requests to profile and writes their profiles to ``directory``."""
+
+    def __init__(
+        self,
+        directory: str,
+        token: str = "",
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        max_files: int = 200,
+    ) -> None:
+        self.directory = Path(directory)
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_files = max_files
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def authorized(self, header: Optional[str]) -> bool:
+        if not self.token or header is None:
+            return False
+        return hmac.compare_digest(header.encode(), self.token.encode())
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> Optional[StackSampler]:
+        """A running sampler, or None while another request is being profiled."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        return sampler
+
+    def path_for(self, method: str, route: str) -> Path:
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S.%f")
+        return self.directory / f"{stamp}-{method}-{slug}-{uuid.uuid4().hex[:8]}.folded"
+
+    def finish(self, sampler: StackSampler, path: Path) -> None:
+        """Stop ``sampler``, write its profile to ``path`` and prune the oldest beyond ``max_files``."""
+        try:
+            sampler.stop()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path.write_text(sampler.collapsed())
+            if self.max_files > 0:
+                for old in sorted(self.directory.glob("*.folded"))[: -self.max_files]:
+                    old.unlink(missing_ok=True)
+        finally:
+            self._busy.release()
+
+
+class ProfilingMiddleware:
+    """Profile token-requested and randomly sampled HTTP requests, response body included."""
+
+    def __init__(self, app: ASGIApp, profiler: Profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self.profiler.authorized(Headers(scope=scope).get(PROFILE_HEADER))
+        sampler = self.profiler.start() if requested or self.profiler.sampled() else None
+        if sampler is None:
+            await self.app(scope, receive, send)
+            return
+
+        path: Optional[Path] = None
+
+        def profile_path() -> Path:
+            # Named once routing has run, so the file carries the route template.
+            nonlocal path
+            if path is None:
+                route = getattr(scope.get("route"), "path", "<unmatched>")
+                path = self.profiler.path_for(scope["method"], route)
+            return path
+
+        async def send_with_profile(message: Message) -> None:
+            if requested and message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Profile-File", profile_path().name)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            self.profiler.finish(sampler, profile_path())
@@ -0,0 +1,265 @@
+"""Hourly and daily rollups of ``stock_snapshots`` for the analytics endpoints.
+
+Each ``StockRollup`` row holds min/max/sum/sample-count and the latest count
+for one product in one hour or day bucket. Snapshots written through
+:func:`record_snapshots` update both resolutions incrementally with a single
+upsert per batch; snapshots written in bulk by SQL (partition retention,
+backfills) are folded in with :func:`rebuild_rollups`, which recomputes a
+time range with one ``INSERT ... SELECT`` per resolution.
+
+``/analytics/stock-history`` reads these tables instead of raw snapshots, so
+a 90-day window costs at most 90 rows per product regardless of how often
+snapshots were taken. Recompute everything with::
+
+    python -m backend.rollups rebuild
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, Select, case, cast, delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.crud import dialect_insert
+
+RESOLUTIONS = ("hour", "day")
+STATS = ("last", "min", "max", "avg")
+# Requests spanning at most this many days are served hourly under resolution=auto.
+AUTO_HOURLY_MAX_DAYS = 2
+
+_KEY_FORMATS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d"}
+# SQLite stores DateTime as text; bucket keys must match SQLAlchemy's storage format
+# so range filters on bucket_start compare correctly.
+_SQLITE_BUCKET_FORMATS = {"hour": "%Y-%m-%d %H:00:00.000000", "day": "%Y-%m-%d 00:00:00.000000"}
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def choose_resolution(days: int, requested: str = "auto") -> str:
+    """Pick the coarsest rollup that still satisfies the requested granularity."""
+    if requested in RESOLUTIONS:
+        return requested
+    if requested != "auto":
+        raise ValueError(f"resolution must be one of auto, {', '.join(RESOLUTIONS)}")
+    return "hour" if days <= AUTO_HOURLY_MAX_DAYS else "day"
+
+
+def _apply_to_rollups(db: Session, snapshots: List[Dict[str, Any]]) -> None:
+    buckets: Dict[Tuple[str, str, datetime], Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for resolution in RESOLUTIONS:
+            bucket = bucket_start(snapshot["snapshot_time"], resolution)
+            key = (resolution, snapshot["product_name"], bucket)
+            count = snapshot["count"]
+            entry = buckets.get(key)
+            if entry is None:
+                buckets[key] = {
+                    "resolution": resolution,
+                    "product_name": key[1],
+                    "bucket_start": key[2],
+                    "min_count": count,
+                    "max_count": count,
+                    "sum_count": count,
+                    "samples": 1,
+                    "last_count": count,
+                    "last_time": snapshot["snapshot_time"],
+                }
+                continue
+            entry["min_count"] = min(entry["min_count"], count)
+            entry["max_count"] = max(entry["max_count"], count)
+            entry["sum_count"] += count
+            entry["samples"] += 1
+            if snapshot["snapshot_time"] >= entry["last_time"]:
+                entry["last_count"] = count
+                entry["last_time"] = snapshot["snapshot_time"]
+    if not buckets:
+        return
+
+    table = models.StockRollup.__table__
+    stmt = dialect_insert(db)(table)
+    excluded = stmt.excluded
+    newer = excluded.last_time >= table.c.last_time
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.resolution, table.c.product_name, table.c.bucket_start],
+        set_={
+            "min_count": case(
+                (excluded.min_count < table.c.min_count, excluded.min_count),
+                else_=table.c.min_count,
+            ),
+            "max_count": case(
+                (excluded.max_count > table.c.max_count, excluded.max_count),
+                else_=table.c.max_count,
+            ),
+            "sum_count": table.c.sum_count + excluded.sum_count,
+            "samples": table.c.samples + excluded.samples,
+            "last_count": case((newer, excluded.last_count), else_=table.c.last_count),
+            "last_time": case((newer, excluded.last_time), else_=table.c.last_time),
+        },
+    )
+    db.execute(stmt, list(buckets.values()))
+
+
+def record_snapshots(db: Session, snapshots: Iterable[Dict[str, Any]]) -> int:
+    """Insert snapshot rows and fold them into the hourly and daily rollups."""
+    rows = [
+        {
+            "product_name": snapshot["product_name"],
+            "count": snapshot["count"],
+            "shelf_id": snapshot.get("shelf_id"),
+            "snapshot_time": snapshot.get("snapshot_time") or datetime.utcnow(),
+        }
+        for snapshot in snapshots
+    ]
+    if not rows:
+        return 0
+    db.execute(insert(models.StockSnapshot), rows)
+    _apply_to_rollups(db, rows)
+    db.commit()
+    return len(rows)
+
+
+def _bucket_expression(db: Session, resolution: str):
+    column = models.StockSnapshot.snapshot_time
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(resolution, column)
+    return func.strftime(_SQLITE_BUCKET_FORMATS[resolution], column)
+
+
+def rebuild_rollups(
+    db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> int:
+    """Recompute rollups for every bucket overlapping ``[start, end)`` from raw snapshots.
+
+    With no bounds the rollup tables are rebuilt from scratch. Returns the
+    number of rollup rows written.
+    """
+    snapshot = models.StockSnapshot
+    rollup = models.StockRollup
+    written = 0
+    for resolution in RESOLUTIONS:
+        lower = bucket_start(start, resolution) if start else None
+        upper = end
+        if end and bucket_start(end, resolution) != end:
+            upper = bucket_start(end, resolution) + (
+                timedelta(hours=1) if resolution == "hour" else timedelta(days=1)
+            )
+
+        stale = delete(rollup).where(rollup.resolution == resolution)
+        window = []
+        if lower:
+            stale = stale.where(rollup.bucket_start >= lower)
+            window.append(snapshot.snapshot_time >= lower)
+        if upper:
+            stale = stale.where(rollup.bucket_start < upper)
+            window.append(snapshot.snapshot_time < upper)
+        db.execute(stale)
+
+        bucket = _bucket_expression(db, resolution).label("bucket")
+        ranked = (
+            select(
+                snapshot.product_name,
+                bucket,
+                snapshot.count,
+                snapshot.snapshot_time,
+                func.row_number()
+                .over(
+                    partition_by=(snapshot.product_name, bucket),
+                    order_by=(snapshot.snapshot_time.desc(), snapshot.id.desc()),
+                )
+                .label("recency"),
+            )
+            .where(*window)
+            .subquery()
+        )
+        source = select(
+            literal(resolution),
+            ranked.c.product_name,
+            ranked.c.bucket,
+            func.min(ranked.c.count),
+            func.max(ranked.c.count),
+            func.sum(ranked.c.count),
+            func.count(),
+            func.max(case((ranked.c.recency == 1, ranked.c.count))),
+            func.max(ranked.c.snapshot_time),
+        ).group_by(ranked.c.product_name, ranked.c.bucket)
+        written += db.execute(
+            insert(rollup).from_select(
+                [
+                    "resolution",
+                    "product_name",
+                    "bucket_start",
+                    "min_count",
+                    "max_count",
+                    "sum_count",
+                    "samples",
+                    "last_count",
+                    "last_time",
+                ],
+                source,
+            )
+        ).rowcount
+    db.commit()
+    return written
+
+
+def history_query(cutoff: datetime, resolution: str, stat: str = "last") -> Select:
+    if stat not in STATS:
+        raise ValueError(f"stat must be one of {', '.join(STATS)}")
+    rollup = models.StockRollup
+    value = {
+        "last": rollup.last_count,
+        "min": rollup.min_count,
+        "max": rollup.max_count,
+        "avg": cast(rollup.sum_count, Float) / rollup.samples,
+    }[stat]
+    return (
+        select(rollup.product_name, rollup.bucket_start, value)
+        .where(
+            rollup.resolution == resolution,
+            rollup.bucket_start >= bucket_start(cutoff, resolution),
+        )
+        .order_by(rollup.product_name, rollup.bucket_start)
+    )
+
+
+def group_history(
+    rows: Iterable[Tuple[str, datetime, float]], resolution: str
+) -> Dict[str, Dict[str, float]]:
+    key_format = _KEY_FORMATS[resolution]
+    history: Dict[str, Dict[str, float]] = {}
+    for product_name, bucket, value in rows:
+        if isinstance(value, float):
+            value = round(value, 2)
+        history.setdefault(product_name, {})[bucket.strftime(key_format)] = value
+    return history
+
+
+def main() -> None:
+    from backend.database import stores
+    from backend.stores import DEFAULT_STORE
+
+    parser = argparse.ArgumentParser(description="Maintain stock snapshot rollups")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Store shard to run against (STORE_SHARDS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Recompute rollups from stock_snapshots")
+    rebuild.add_argument("--start", type=datetime.fromisoformat)
+    rebuild.add_argument("--end", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    db = stores.session(args.store)
+    try:
+        written = rebuild_rollups(db, args.start, args.end)
+        print(f"✅ Wrote {written} rollup rows")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
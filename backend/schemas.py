@@ -1,10 +1,10 @@
 """Pydantic schemas for FastAPI request/response bodies."""
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 
 
 class DetectionBase(BaseModel):
@@ -19,11 +19,27 @@ class DetectionBase(BaseModel):
 
 
 class DetectionCreate(DetectionBase):
-    pass
+    @field_validator("timestamp")
+    @classmethod
+    def naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """Store offsets (e.g. JS ``toISOString()``'s ``Z``) as the naive UTC the tables hold."""
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
 
 
 class DetectionRead(DetectionBase):
     id: int
+    scan_id: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ShelfScanRead(BaseModel):
+    scan_id: int = Field(validation_alias="id")
+    shelf_id: str
+    captured_at: datetime
+    detection_count: int
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -96,6 +112,17 @@ class ProductRead(BaseModel):
     price: float
 
 
+class ProductSearchHit(ProductRead):
+    score: float
+
+
+# Query parameter types for /analytics/stock-history rollup selection.
+HistoryResolution = Literal["auto", "hour", "day"]
+HistoryStat = Literal["last", "min", "max", "avg"]
+# Response format for paginated listings (/stock/history, /alerts).
+ListFormat = Literal["json", "ndjson"]
+
+
 class StockSnapshotRead(BaseModel):
     id: int
     product_name: str
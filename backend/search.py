@@ -0,0 +1,134 @@
+"""Typo-tolerant trigram search over the product catalog.
+
+Display names are normalized (case-folded, punctuation stripped) and split
+into padded word trigrams the way ``pg_trgm`` does, so ``"nutela"`` still
+shares most trigrams with ``"Nutella Hazelnut Spread"``. The inverted index
+stores one NumPy posting array per trigram; a query concatenates the
+postings of its trigrams and counts shared trigrams per product with a
+single ``bincount``, so lookups stay well under a millisecond for catalogs
+of tens of thousands of SKUs.
+
+Each hit is scored as the mean of query coverage (shared / query trigrams,
+which favours autocomplete of partial names) and the Dice coefficient
+(which prefers the closest overall name).
+"""
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from backend.catalog import Catalog, Product, get_catalog
+
+# Minimum score for /products/search results, and for /shopping-list to
+# accept a fuzzy match in place of an exact name.
+SEARCH_MIN_SCORE = 0.2
+FUZZY_MIN_SCORE = 0.4
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_WORD.sub("", text.casefold()).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    grams: Set[str] = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _min_shared(query_size: int, min_score: float) -> int:
+    for shared in range(1, query_size + 1):
+        best_case = (shared / query_size + 2 * shared / (query_size + shared)) / 2
+        if best_case >= min_score:
+            return shared
+    return query_size + 1
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    product: Product
+    score: float
+
+
+class SearchIndex:
+    """Immutable trigram index over one :class:`Catalog` snapshot."""
+
+    def __init__(self, catalog: Catalog) -> None:
+        self.catalog = catalog
+        self._products: List[Product] = list(catalog)
+        self._exact: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+        sizes = np.zeros(len(self._products), dtype=np.float32)
+        for position, product in enumerate(self._products):
+            self._exact.setdefault(normalize(product.display_name), position)
+            grams = trigrams(product.display_name)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self._postings: Dict[str, np.ndarray] = {
+            gram: np.asarray(positions, dtype=np.intp) for gram, positions in postings.items()
+        }
+        self._sizes = sizes
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.0) -> List[SearchHit]:
+        query_grams = trigrams(query)
+        if not query_grams or not self._products:
+            return []
+        arrays = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        if not arrays:
+            return []
+        shared = np.bincount(np.concatenate(arrays), minlength=len(self._products))
+        # Products sharing fewer trigrams than this can't reach min_score even
+        # with a perfect Dice term, so they are dropped before scoring.
+        candidates = np.flatnonzero(shared >= _min_shared(len(query_grams), min_score))
+        common = shared[candidates].astype(np.float32)
+        coverage = common / len(query_grams)
+        dice = 2 * common / (len(query_grams) + self._sizes[candidates])
+        scores = (coverage + dice) / 2
+
+        exact = self._exact.get(normalize(query))
+        if exact is not None:
+            scores[candidates == exact] = 1.0
+
+        keep = scores >= min_score
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return [
+            SearchHit(self._products[candidates[i]], round(float(scores[i]), 4)) for i in order
+        ]
+
+    def best_match(self, query: str, min_score: float = FUZZY_MIN_SCORE) -> Optional[Product]:
+        hits = self.search(query, limit=1, min_score=min_score)
+        return hits[0].product if hits else None
+
+
+_lock = threading.Lock()
+_cached: Tuple[Optional[Catalog], Optional[SearchIndex]] = (None, None)
+
+
+def get_search_index() -> SearchIndex:
+    """Index for the current catalog, rebuilt once after each catalog reload."""
+    global _cached
+    catalog = get_catalog()
+    cached_catalog, index = _cached
+    if cached_catalog is catalog and index is not None:
+        return index
+    with _lock:
+        cached_catalog, index = _cached
+        if cached_catalog is not catalog or index is None:
+            index = SearchIndex(catalog)
+            _cached = (catalog, index)
+        return index
@@ -0,0 +1,109 @@
+"""Response encoding: orjson by default, MessagePack when the client asks for it.
+
+:class:`APIResponse` is the application's default response class. It picks
+its encoding from the request's ``Accept`` header, which
+:class:`NegotiationMiddleware` records in a context variable, so handlers
+don't need the request to return a negotiated response. Hot endpoints return
+``APIResponse(payload)`` directly, which also skips FastAPI's
+``jsonable_encoder`` pass over the payload; orjson serializes datetimes,
+dataclasses and NumPy values natively.
+
+Large bodies are gzip-compressed by Starlette's ``GZipMiddleware`` once they
+exceed ``RESPONSE_COMPRESS_MIN_BYTES`` (see ``backend.main``).
+"""
+from __future__ import annotations
+
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, Optional
+
+import msgpack
+import orjson
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.metrics import timed_serialization
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+_accept: ContextVar[Optional[str]] = ContextVar("accept", default=None)
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Return MessagePack if ``accept`` names it (and JSON isn't preferred first), else JSON."""
+    if not accept:
+        return JSON_MEDIA_TYPE
+    for part in accept.split(","):
+        media_type = part.split(";", 1)[0].strip().lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            return MSGPACK_MEDIA_TYPE
+        if media_type == JSON_MEDIA_TYPE:
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def _default(value: Any) -> Any:
+    """Fallback for types neither encoder handles natively."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()  # msgpack only; orjson handles these itself
+    if hasattr(value, "tolist"):
+        return value.tolist()  # NumPy arrays and scalars under msgpack
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+class APIResponse(Response):
+    """Response rendered with orjson, or MessagePack when negotiated."""
+
+    media_type = JSON_MEDIA_TYPE
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        background: Any = None,
+    ) -> None:
+        if media_type is None:
+            media_type = negotiate(_accept.get())
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        with timed_serialization():
+            if self.media_type == MSGPACK_MEDIA_TYPE:
+                return dumps_msgpack(content)
+            return dumps_json(content)
+
+
+class NegotiationMiddleware:
+    """Record the request's ``Accept`` header for :class:`APIResponse`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _accept.set(Headers(scope=scope).get("accept"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _accept.reset(token)
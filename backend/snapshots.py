@@ -0,0 +1,280 @@
+"""Periodic stock snapshots derived from ``shelf_state`` and the shelf scans.
+
+Time is split into fixed buckets of ``SNAPSHOT_INTERVAL_SECONDS`` (hourly by
+default). A snapshot is one ``stock_snapshots`` row per product per bucket:
+the product's total count over all shelves, its first stocked shelf, and
+the bucket start as ``snapshot_time``.
+
+* :func:`take_snapshot` records the current bucket from ``shelf_state``.
+* :func:`backfill` records a range of past buckets from ``shelf_scans`` and
+  the detections kept for audit. Each bucket gets the stock as of its end,
+  which is each shelf's latest scan captured before then. Detections dropped
+  by partition retention can't be backfilled.
+
+Both are a single ``INSERT ... SELECT`` per call (per 100 buckets for
+backfills). Products that already have a snapshot in a bucket are skipped,
+and a unique index on ``(product_name, snapshot_time)`` turns a concurrent
+writer's insert into a no-op, so re-running a tick, overlapping backfills or
+the schedulers of several API workers never duplicate rows. The
+hourly and daily rollups of the written buckets are then recomputed.
+
+Take snapshots from cron::
+
+    python -m backend.snapshots tick
+    python -m backend.snapshots backfill --start 2026-10-01 --end 2026-10-08
+
+or set ``SNAPSHOT_SCHEDULER=true`` to have the API process take them for every
+store at each bucket boundary.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy import DateTime, and_, case, exists, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import FromClause, Subquery
+
+from backend import crud, models, partitions, rollups
+from backend.config import settings
+from backend.stores import store_of
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+# Buckets per backfill statement; SQLite caps compound SELECTs at 500 terms.
+BACKFILL_CHUNK = 100
+
+
+def bucket_floor(moment: datetime, interval: int) -> datetime:
+    """Start of the ``interval``-second bucket containing ``moment``."""
+    seconds = int((moment - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % interval)
+
+
+def _insert_snapshots(db: Session, per_shelf: Subquery) -> int:
+    """Fold (bucket, product_name, shelf_id, count) rows into one snapshot per product and bucket."""
+    snapshot = models.StockSnapshot
+    stocked_shelf = case(
+        (and_(per_shelf.c.count > 0, per_shelf.c.shelf_id != models.UNASSIGNED_SHELF), per_shelf.c.shelf_id)
+    )
+    source = (
+        select(
+            per_shelf.c.product_name,
+            func.sum(per_shelf.c.count),
+            func.min(stocked_shelf),
+            per_shelf.c.bucket,
+            literal(store_of(db)),
+        )
+        .where(
+            ~exists().where(
+                snapshot.product_name == per_shelf.c.product_name,
+                snapshot.snapshot_time == per_shelf.c.bucket,
+            )
+        )
+        .group_by(per_shelf.c.bucket, per_shelf.c.product_name)
+    )
+    stmt = crud.dialect_insert(db)(snapshot).from_select(
+        ["product_name", "count", "shelf_id", "snapshot_time", "store_id"], source
+    )
+    # The NOT EXISTS above skips settled buckets; a writer racing in another
+    # process (one scheduler per API worker) is caught by the unique index.
+    stmt = stmt.on_conflict_do_nothing(index_elements=[snapshot.product_name, snapshot.snapshot_time])
+    return db.execute(stmt).rowcount
+
+
+def _finish(db: Session, written: int, start: datetime, end: datetime) -> int:
+    if written:
+        # Commits the snapshots together with their rollups.
+        rollups.rebuild_rollups(db, start, end)
+    else:
+        db.commit()
+    return written
+
+
+def take_snapshot(db: Session, now: Optional[datetime] = None, interval: Optional[int] = None) -> int:
+    """Snapshot current stock into the bucket containing ``now``; returns rows written."""
+    interval = interval or settings.snapshot_interval_seconds
+    bucket = bucket_floor(now or datetime.utcnow(), interval)
+    state = models.ShelfState
+    per_shelf = select(
+        literal(bucket, DateTime).label("bucket"),
+        state.product_name,
+        state.shelf_id,
+        state.count,
+    ).subquery()
+    written = _insert_snapshots(db, per_shelf)
+    return _finish(db, written, bucket, bucket + timedelta(seconds=interval))
+
+
+def _buckets(starts: List[datetime], interval: int, now: datetime) -> Subquery:
+    rows = [
+        select(
+            literal(start, DateTime).label("bucket"),
+            literal(min(start + timedelta(seconds=interval), now), DateTime).label("as_of"),
+        )
+        for start in starts
+    ]
+    return (rows[0] if len(rows) == 1 else union_all(*rows)).subquery("buckets")
+
+
+def _historical_stock(buckets: Subquery, detections: FromClause) -> Subquery:
+    """Per-shelf stock at the end of each bucket, the way ``crud.shelf_state_source`` derives it now."""
+    detection = detections.c
+    scan = models.ShelfScan
+    ranked = (
+        select(
+            buckets.c.bucket,
+            buckets.c.as_of,
+            scan.id.label("scan_id"),
+            scan.shelf_id,
+            func.row_number()
+            .over(
+                partition_by=(buckets.c.bucket, scan.shelf_id),
+                order_by=(scan.captured_at.desc(), scan.id.desc()),
+            )
+            .label("recency"),
+        )
+        .join_from(buckets, scan, scan.captured_at < buckets.c.as_of)
+        .subquery()
+    )
+    latest = select(ranked.c.bucket, ranked.c.as_of, ranked.c.scan_id, ranked.c.shelf_id).where(
+        ranked.c.recency == 1
+    ).subquery()
+    # Products a shelf has held, so ones missing from its latest scan count as zero.
+    seen = (
+        select(scan.shelf_id, detection.product_name, func.min(scan.captured_at).label("first_seen"))
+        .join(scan, scan.id == detection.scan_id)
+        .group_by(scan.shelf_id, detection.product_name)
+        .subquery()
+    )
+    counted = (
+        select(detection.scan_id, detection.product_name, func.count().label("count"))
+        .where(detection.scan_id.in_(select(latest.c.scan_id)))
+        .group_by(detection.scan_id, detection.product_name)
+        .subquery()
+    )
+    return (
+        select(
+            latest.c.bucket,
+            seen.c.product_name,
+            latest.c.shelf_id,
+            func.coalesce(counted.c.count, 0).label("count"),
+        )
+        .join_from(latest, seen, and_(seen.c.shelf_id == latest.c.shelf_id, seen.c.first_seen < latest.c.as_of))
+        .outerjoin(
+            counted,
+            and_(counted.c.scan_id == latest.c.scan_id, counted.c.product_name == seen.c.product_name),
+        )
+        .subquery()
+    )
+
+
+def backfill(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    now: Optional[datetime] = None,
+    interval: Optional[int] = None,
+) -> int:
+    """Snapshot every bucket overlapping ``[start, end)`` from scan history; returns rows written."""
+    interval = interval or settings.snapshot_interval_seconds
+    now = now or datetime.utcnow()
+    end = min(end, now)
+    starts: List[datetime] = []
+    bucket = bucket_floor(start, interval)
+    while bucket < end:
+        starts.append(bucket)
+        bucket += timedelta(seconds=interval)
+    if not starts:
+        return 0
+
+    detections = partitions.detections_source(db)
+    written = 0
+    for offset in range(0, len(starts), BACKFILL_CHUNK):
+        chunk = starts[offset : offset + BACKFILL_CHUNK]
+        written += _insert_snapshots(db, _historical_stock(_buckets(chunk, interval, now), detections))
+    return _finish(db, written, starts[0], starts[-1] + timedelta(seconds=interval))
+
+
+class SnapshotScheduler:
+    """Background thread taking a snapshot of every store at each bucket boundary."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[str], Session],
+        store_ids: Callable[[], Iterable[str]],
+        interval: int = 3600,
+    ) -> None:
+        self._session_factory = session_factory
+        self._store_ids = store_ids
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        written = 0
+        for store_id in self._store_ids():
+            db = self._session_factory(store_id)
+            try:
+                written += take_snapshot(db, now, self.interval)
+            except Exception:
+                logger.exception("Stock snapshot for store %s failed", store_id)
+                db.rollback()
+            finally:
+                db.close()
+        return written
+
+    def _run(self) -> None:
+        # Fill the current bucket straight away; it is a no-op if already taken.
+        self.tick()
+        while True:
+            now = datetime.utcnow()
+            next_bucket = bucket_floor(now, self.interval) + timedelta(seconds=self.interval)
+            if self._stop.wait((next_bucket - now).total_seconds()):
+                return
+            self.tick()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stock-snapshots", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main() -> None:
+    from backend.database import stores
+    from backend.stores import DEFAULT_STORE
+
+    parser = argparse.ArgumentParser(description="Record stock snapshots")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Store shard to run against (STORE_SHARDS)")
+    parser.add_argument("--interval", type=int, default=settings.snapshot_interval_seconds, help="Bucket width in seconds")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("tick", help="Snapshot current stock into the current bucket")
+    fill = sub.add_parser("backfill", help="Snapshot past buckets from shelf scan history")
+    fill.add_argument("--start", type=datetime.fromisoformat, required=True)
+    fill.add_argument("--end", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    db = stores.session(args.store)
+    try:
+        if args.command == "tick":
+            written = take_snapshot(db, interval=args.interval)
+        else:
+            written = backfill(db, args.start, args.end or datetime.utcnow(), interval=args.interval)
+        print(f"✅ Wrote {written} snapshot rows")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Stock level classification and summary enrichment.
+
+Shared by the sync handlers in ``backend.main`` and the async read handlers
+in ``backend.async_api`` so both database paths produce identical payloads.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from backend.catalog import DEFAULT_CATEGORY, get_catalog
+
+
+def determine_stock_level(count: int, expected: Optional[int] = None) -> str:
+    if count <= 0:
+        return "OUT"
+    if expected and expected > 0:
+        ratio = count / expected
+        if ratio >= 0.75:
+            return "HIGH"
+        if ratio >= 0.4:
+            return "MEDIUM"
+        return "LOW"
+    if count >= 15:
+        return "HIGH"
+    if count >= 6:
+        return "MEDIUM"
+    return "LOW"
+
+
+def build_stock_summary(
+    stock_entries: List[dict], planograms: Dict[str, Any]
+) -> List[dict]:
+    """Enrich aggregated stock rows with planogram expectations and catalog metadata."""
+    catalog = get_catalog()
+    payload = []
+    for entry in stock_entries:
+        planogram = planograms.get(entry["product_name"])
+        expected = planogram.expected_stock if planogram else None
+        shelf_breakdown = entry.get("shelf_breakdown", {})
+        primary_shelf = None
+        if planogram:
+            primary_shelf = planogram.shelf_id
+        elif shelf_breakdown:
+            primary_shelf = max(shelf_breakdown, key=shelf_breakdown.get)
+
+        # Enrich with metadata
+        grozi_code = entry["product_name"]
+        product = catalog.get(grozi_code)
+        price = product.price if product else 0.0
+        payload.append(
+            {
+                "product_name": grozi_code,
+                "display_name": product.display_name if product else grozi_code,
+                "category": product.category if product else DEFAULT_CATEGORY,
+                "price": price,
+                "total_count": entry["total_count"],
+                "last_seen": entry["last_seen"],
+                "shelf_breakdown": shelf_breakdown,
+                "stock_level": determine_stock_level(entry["total_count"], expected),
+                "shelf_id": primary_shelf,
+                "inventory_value": entry["total_count"] * price,
+            }
+        )
+    return payload
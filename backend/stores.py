@@ -0,0 +1,36 @@
+"""Store identity for multi-store deployments.
+
+Every store's data lives in its own namespace: a separate database, or a
+separate Postgres schema in a shared one (see ``StoreRouter`` in
+``backend/database.py``). Within a namespace all rows belong to one store,
+so queries need no store filter. The ``store_id`` column on detections,
+snapshots, planogram entries and alerts records which store a row belongs
+to, so rows stay attributable when shards are exported, merged or moved.
+
+Sessions opened for a store carry its id in ``Session.info`` and their engine
+carries it as the ``store_id`` execution option. :func:`current_store` reads
+the latter as a column default, so every INSERT is stamped without callers
+passing the store around.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+DEFAULT_STORE = "default"
+STORE_KEY = "store_id"
+
+
+class UnknownStoreError(LookupError):
+    """Raised when a request names a store that no shard is configured for."""
+
+
+def store_of(db: Session) -> str:
+    """The store a session reads and writes; single-store sessions belong to ``DEFAULT_STORE``."""
+    return db.info.get(STORE_KEY, DEFAULT_STORE)
+
+
+def current_store(context: Any) -> str:
+    """Column default: the ``store_id`` execution option of the executing engine."""
+    return context.execution_options.get(STORE_KEY, DEFAULT_STORE)
@@ -0,0 +1,216 @@
+"""Stock velocity and projected stock-out times for every product.
+
+``/analytics/velocity`` loads the per-bucket ``last`` count of every product
+from the snapshot rollups in one query and parses it into a dense
+products x buckets NumPy matrix (NaN where a product has no snapshot in a
+bucket). Everything after that is vectorized across products:
+
+* ``change`` / ``change_percent``: latest count against the first in the window;
+* ``rate_per_day``: least-squares slope over the whole window;
+* ``recent_rate_per_day``: slope over the last ``window`` buckets, which sets
+  ``trend`` (up / down / stable);
+* ``days_until_stockout`` / ``stockout_at``: the latest count run down at the
+  recent rate from the time it was observed, for products that are depleting.
+
+Results are cached per store, query and snapshot version, the newest
+``stock_snapshots`` id, so they are recomputed only after new snapshots land
+or the window moves into a new bucket.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, String, cast, extract, func, select
+from sqlalchemy.orm import Session
+
+from backend import models, rollups
+from backend.stores import store_of
+
+_BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+# |recent rate| in units/day below which a product counts as stable.
+STABLE_RATE = 0.1
+
+
+def _epoch(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(extract("epoch", column), Integer)
+    return cast(func.strftime("%s", column), Integer)
+
+
+def _joined(db: Session, expression):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.string_agg(expression, " ")
+    return func.group_concat(expression, " ")
+
+
+def snapshot_version(db: Session) -> int:
+    """Newest snapshot id; snapshots are append-only, so any new one changes it."""
+    return db.execute(select(func.max(models.StockSnapshot.id))).scalar() or 0
+
+
+def load_series(db: Session, start: datetime, resolution: str) -> Tuple[np.ndarray, np.ndarray, int, np.ndarray]:
+    """Product names, a products x buckets count matrix, its first bucket and each product's latest snapshot.
+
+    Both times are epoch seconds. Each product's buckets come back as one
+    ``"bucket count last_time ..."`` string, so the database returns one row
+    per product rather than one per bucket and NumPy parses every value in a
+    single call.
+    """
+    rollup = models.StockRollup
+    bucket = rollups.bucket_start(start, resolution)
+    triple = (
+        cast(_epoch(db, rollup.bucket_start), String)
+        + " "
+        + cast(rollup.last_count, String)
+        + " "
+        + cast(_epoch(db, rollup.last_time), String)
+    )
+    rows = db.execute(
+        select(rollup.product_name, _joined(db, triple))
+        .where(rollup.resolution == resolution, rollup.bucket_start >= bucket)
+        .group_by(rollup.product_name)
+        .order_by(rollup.product_name)
+    ).all()
+    origin = int((bucket - datetime(1970, 1, 1)).total_seconds())
+    if not rows:
+        return np.array([], dtype=object), np.empty((0, 0)), origin, np.array([], dtype=np.int64)
+
+    names = np.array([name for name, _ in rows], dtype=object)
+    lengths = [(triples.count(" ") + 1) // 3 for _, triples in rows]
+    values = np.array(" ".join(triples for _, triples in rows).split(), dtype=np.int64).reshape(-1, 3)
+    product = np.repeat(np.arange(len(rows)), lengths)
+    column = (values[:, 0] - origin) // _BUCKET_SECONDS[resolution]
+    series = np.full((len(rows), int(column.max()) + 1), np.nan)
+    series[product, column] = values[:, 1]
+    observed = np.zeros(len(rows), dtype=np.int64)
+    np.maximum.at(observed, product, values[:, 2])
+    return names, series, origin, observed
+
+
+def _slope(series: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Per-row least-squares slope of ``series`` against ``days``, ignoring NaN; NaN under two points."""
+    present = ~np.isnan(series)
+    n = present.sum(axis=1)
+    x = np.where(present, days, 0.0)
+    y = np.where(present, series, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = x.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(present, days - x_mean[:, None], 0.0)
+        slope = (dx * (y - y_mean[:, None])).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def _edge(present: np.ndarray, last: bool) -> np.ndarray:
+    """Column of each row's first (or last) present value."""
+    if last:
+        return present.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+    return np.argmax(present, axis=1)
+
+
+def compute_velocity(
+    names: np.ndarray, series: np.ndarray, origin: int, resolution: str, window: int, observed: np.ndarray
+) -> List[Dict[str, Any]]:
+    """Velocity rows for every product, fastest growing first.
+
+    ``observed`` is the epoch second of each product's latest count, where its
+    stock-out projection starts.
+    """
+    if not len(names):
+        return []
+    bucket_days = _BUCKET_SECONDS[resolution] / 86400
+    days = np.arange(series.shape[1]) * bucket_days
+    present = ~np.isnan(series)
+    rows = np.arange(len(names))
+    first_col, last_col = _edge(present, last=False), _edge(present, last=True)
+    first, current = series[rows, first_col], series[rows, last_col]
+
+    change = current - first
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change_percent = np.where(first > 0, change / first * 100, np.nan)
+    rate = _slope(series, days)
+    recent = _slope(series[:, -window:], days[-window:])
+    trend = np.where(recent > STABLE_RATE, "up", np.where(recent < -STABLE_RATE, "down", "stable"))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        until = np.where(current <= 0, 0.0, np.where(recent < 0, current / -recent, np.nan))
+    stockout = observed + until * 86400
+
+    def number(value: float, digits: int = 2) -> Optional[float]:
+        return None if np.isnan(value) else round(float(value), digits)
+
+    order = np.lexsort((names, -change))
+    epoch = datetime(1970, 1, 1)
+    return [
+        {
+            "product_name": names[i],
+            "current_count": int(current[i]),
+            "change": int(change[i]),
+            "change_percent": number(change_percent[i], 1),
+            "rate_per_day": number(rate[i]),
+            "recent_rate_per_day": number(recent[i]),
+            "trend": str(trend[i]),
+            "days_until_stockout": number(until[i]),
+            "stockout_at": None if np.isnan(until[i]) else epoch + timedelta(seconds=float(stockout[i])),
+        }
+        for i in order
+    ]
+
+
+def _highlights(products: List[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+    rising = products[0] if products and products[0]["change"] > 0 else None
+    falling = products[-1] if products and products[-1]["change"] < 0 else None
+    return {"biggest_increase": rising, "biggest_decrease": falling}
+
+
+class VelocityCache:
+    """Computed velocity payloads keyed by store and query, valid while the snapshot version holds."""
+
+    def __init__(self, max_entries: int = 32) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get(
+        self,
+        db: Session,
+        days: int = 30,
+        resolution: str = "auto",
+        window: int = 7,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        resolution = rollups.choose_resolution(days, resolution)
+        start = rollups.bucket_start((now or datetime.utcnow()) - timedelta(days=days), resolution)
+        key = (store_of(db), resolution, start, window)
+        version = snapshot_version(db)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        names, series, origin, observed = load_series(db, start, resolution)
+        products = compute_velocity(names, series, origin, resolution, window, observed)
+        payload = {
+            "resolution": resolution,
+            "since": start,
+            "window": window,
+            "products": products,
+            "highlights": _highlights(products),
+        }
+        with self._lock:
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+
+velocity_cache = VelocityCache()
@@ -0,0 +1,106 @@
+"""Data version used for ETag / conditional GET on the stock and catalog endpoints.
+
+Every write that can change ``/stock/summary``, ``/stock``, ``/products`` or
+``/alerts`` calls :func:`mark_changed` on its session; the version is bumped
+once the transaction commits (never on rollback). The endpoints expose the
+version as an ETag and answer a matching ``If-None-Match`` with 304 before
+opening a database connection.
+
+By default the version is a process-local counter prefixed with a per-boot
+token, which is exact for a single worker. When several workers or processes
+write to the same database set ``DATA_VERSION_FILE`` to a path on a shared
+filesystem: the version is then the file's nanosecond mtime, bumped with
+``os.utime`` and read with ``os.stat``, so every process sees every write.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+
+_CHANGED_KEY = "data_version_changed"
+
+
+class DataVersion:
+    """Monotonically increasing version of the data behind cached GET responses."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._changed_at = 0.0
+        self._boot = uuid.uuid4().hex[:8]
+
+    def current(self) -> int:
+        if self.path is None:
+            return self._counter
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self.bump()
+
+    def bump(self) -> int:
+        with self._lock:
+            if self.path is None:
+                self._counter += 1
+                self._changed_at = time.time()
+                return self._counter
+            try:
+                previous = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                open(self.path, "a").close()
+                previous = 0
+            # Coarse filesystem clocks can repeat a timestamp; never go backwards.
+            version = max(time.time_ns(), previous + 1)
+            os.utime(self.path, ns=(version, version))
+            return os.stat(self.path).st_mtime_ns
+
+    def changed_at(self) -> float:
+        """Wall-clock time of the last bump in epoch seconds; 0 if never bumped."""
+        if self.path is None:
+            return self._changed_at
+        return self.current() / 1e9
+
+    def etag(self) -> str:
+        if self.path is None:
+            return f'W/"{self._boot}-{self._counter}"'
+        return f'W/"{self.current()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    # Weak comparison: W/"x" and "x" name the same representation.
+    return "*" in candidates or bool(
+        {tag.removeprefix("W/") for tag in candidates} & {etag.removeprefix("W/")}
+    )
+
+
+data_version = DataVersion(settings.data_version_file)
+
+
+def mark_changed(db: Session) -> None:
+    """Flag ``db`` so the data version is bumped when its transaction commits."""
+    db.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED_KEY, False):
+        data_version.bump()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_on_rollback(session: Session, previous_transaction) -> None:
+    # Only an outermost rollback discards the pending bump; a savepoint
+    # rollback leaves earlier writes in the enclosing transaction.
+    if not session.in_transaction():
+        session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,154 @@
+"""Benchmark detection ingest throughput for increasing batch sizes.
+
+Compares the legacy ORM path (add_all + refresh per row) with the bulk
+ingest engine in ``crud.bulk_create_detections`` in both ``RETURNING`` and
+``return=minimal`` (COPY on Postgres) modes, and reports the throughput cost
+of evaluating stock alerts at ingest time, both for the first batch into an
+empty store (every product opens an alert) and for a rescan of a stocked one.
+
+Usage:
+    python benchmarks/bench_ingest.py
+    python benchmarks/bench_ingest.py --database-url postgresql://localhost/omnishelf_bench
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend import crud, models
+from backend.schemas import DetectionCreate
+
+DEFAULT_BATCH_SIZES = [10, 100, 1_000, 10_000, 50_000]
+
+
+def make_batch(size: int, products: int = 120, shelves: int = 15) -> List[DetectionCreate]:
+    now = datetime.utcnow()
+    return [
+        DetectionCreate(
+            product_name=f"grozi_{random.randrange(products)}",
+            confidence=random.uniform(0.5, 1.0),
+            bbox_x1=random.uniform(0, 400),
+            bbox_y1=random.uniform(0, 400),
+            bbox_x2=random.uniform(400, 800),
+            bbox_y2=random.uniform(400, 800),
+            shelf_id=f"S{random.randrange(shelves)}",
+            timestamp=now,
+        )
+        for _ in range(size)
+    ]
+
+
+def legacy_orm_ingest(db: Session, batch: List[DetectionCreate]) -> None:
+    """The pre-bulk implementation: ORM objects, commit, then one refresh per row."""
+    objs = [models.ProductDetection(**item.model_dump()) for item in batch]
+    db.add_all(objs)
+    db.commit()
+    for obj in objs:
+        db.refresh(obj)
+
+
+STRATEGIES: Dict[str, Callable[[Session, List[DetectionCreate]], object]] = {
+    "legacy_orm": legacy_orm_ingest,
+    "bulk_returning": lambda db, batch: crud.bulk_create_detections(
+        db, batch, evaluate_alerts=False
+    ),
+    "bulk_minimal": lambda db, batch: crud.bulk_create_detections(
+        db, batch, return_rows=False, evaluate_alerts=False
+    ),
+    # Same as bulk_minimal plus the incremental alert engine (backend/alerts.py).
+    "bulk_minimal_alerts": lambda db, batch: crud.bulk_create_detections(
+        db, batch, return_rows=False, evaluate_alerts=True
+    ),
+}
+
+
+def _best_time(
+    SessionBench: sessionmaker,
+    engine,
+    strategy: Callable[[Session, List[DetectionCreate]], object],
+    batch: List[DetectionCreate],
+    repeat: int,
+    prime: Optional[List[DetectionCreate]] = None,
+) -> float:
+    """Fastest of ``repeat`` runs on a fresh schema, first ingesting ``prime`` untimed."""
+    timings = []
+    for _ in range(repeat):
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        with SessionBench() as db:
+            if prime is not None:
+                crud.bulk_create_detections(db, prime, return_rows=False, evaluate_alerts=True)
+            started = time.perf_counter()
+            strategy(db, batch)
+            timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(database_url: str, batch_sizes: List[int], repeat: int) -> List[Dict[str, object]]:
+    if database_url.startswith("sqlite") and ":memory:" in database_url:
+        engine = create_engine(
+            database_url, connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+    else:
+        engine = create_engine(database_url)
+    SessionBench = sessionmaker(bind=engine, autoflush=False)
+
+    results = []
+    for size in batch_sizes:
+        batch, rescan = make_batch(size), make_batch(size)
+        # The rescan runs land on a store already stocked (and alerted) by ``batch``.
+        runs = [(name, strategy, None) for name, strategy in STRATEGIES.items()] + [
+            (f"{name}@rescan", STRATEGIES[name], batch) for name in ("bulk_minimal", "bulk_minimal_alerts")
+        ]
+        for name, strategy, prime in runs:
+            best = _best_time(SessionBench, engine, strategy, rescan if prime else batch, repeat, prime)
+            results.append(
+                {
+                    "strategy": name,
+                    "batch_size": size,
+                    "seconds": round(best, 6),
+                    "rows_per_sec": round(size / best, 1),
+                }
+            )
+            print(f"{name:>26} | batch {size:>6} | {size / best:>12,.0f} rows/s | {best * 1000:>9.1f} ms")
+        for suffix, label in (("", "alert engine cost"), ("@rescan", "alert engine cost@rescan")):
+            baseline, with_alerts = (
+                next(r for r in results if r["batch_size"] == size and r["strategy"] == name + suffix)
+                for name in ("bulk_minimal", "bulk_minimal_alerts")
+            )
+            overhead = 1 - with_alerts["rows_per_sec"] / baseline["rows_per_sec"]
+            print(f"{label:>26} | batch {size:>6} | {overhead:>12.1%} throughput")
+    models.Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite+pysqlite:///:memory:")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per point; the best is reported")
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.database_url, args.batch_sizes, args.repeat)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Synthetic load test of the FastAPI backend, reported per endpoint.
+
+Seeds a store with ``synthetic_data.py``, then drives ``backend.main.app``
+in-process through ``httpx.ASGITransport`` with ``--concurrency`` concurrent
+clients. Each scenario runs on its own, after a short warm-up:
+
+* ``POST /detections/``: a ``--detection-batch`` scan of a random shelf;
+* ``GET /stock/summary``;
+* ``POST /shopping-list``: ten random products;
+* ``GET /analytics/stock-history?days=7``;
+* ``POST /predict``: a synthetic shelf photo. It needs YOLO weights; without
+  them the app answers 503 and the scenario is reported as skipped.
+
+For every scenario the JSON report records throughput, p50/p95/p99/max
+latency and error count, with the git commit and settings, so runs can be
+compared across commits. ``--compare`` prints the change against an earlier
+report.
+
+Usage:
+    python benchmarks/bench_load.py --json load.json
+    python benchmarks/bench_load.py --requests 2000 --concurrency 100 --compare baseline.json
+    python benchmarks/bench_load.py --database-url postgresql://localhost/omnishelf_bench --skip-seed
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import main as backend_main
+from backend.database import get_db, get_read_db
+
+from synthetic_data import SyntheticConfig, add_arguments, config_from, product_names, seed
+
+Request = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def shelf_photo() -> Optional[bytes]:
+    """A JPEG of random shelf-sized noise, or None without OpenCV."""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return None
+    pixels = np.random.default_rng(0).integers(0, 255, (640, 640, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode(".jpg", pixels)
+    return encoded.tobytes() if ok else None
+
+
+def scenarios(config: SyntheticConfig, detection_batch: int) -> Dict[str, Request]:
+    names = product_names(config)
+    photo = shelf_photo()
+
+    def detections(client: httpx.AsyncClient, rng: random.Random):
+        shelf = f"S{rng.randrange(config.shelves)}"
+        stamp = datetime.utcnow().isoformat()
+        payload = [
+            {
+                "product_name": rng.choice(names),
+                "confidence": 0.9,
+                "bbox_x1": 0,
+                "bbox_y1": 0,
+                "bbox_x2": 1,
+                "bbox_y2": 1,
+                "shelf_id": shelf,
+                "timestamp": stamp,
+            }
+            for _ in range(detection_batch)
+        ]
+        return client.post("/detections/", json=payload, headers={"Prefer": "return=minimal"})
+
+    def predict(client: httpx.AsyncClient, rng: random.Random):
+        return client.post("/predict", files={"file": ("shelf.jpg", photo, "image/jpeg")})
+
+    requests: Dict[str, Request] = {
+        "POST /detections/": detections,
+        "GET /stock/summary": lambda client, rng: client.get("/stock/summary"),
+        "POST /shopping-list": lambda client, rng: client.post(
+            "/shopping-list", json={"items": rng.sample(names, min(10, len(names)))}
+        ),
+        "GET /analytics/stock-history": lambda client, rng: client.get(
+            "/analytics/stock-history", params={"days": 7}
+        ),
+    }
+    if photo is not None:
+        requests["POST /predict"] = predict
+    return requests
+
+
+async def drive(request: Request, requests: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    transport = httpx.ASGITransport(app=backend_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await request(client, rng)
+                    if response.status_code >= 400:
+                        errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                except Exception as exc:  # a failed request is a result, not a crash
+                    errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+async def run(args: argparse.Namespace, config: SyntheticConfig) -> Dict[str, Any]:
+    engine = create_engine(args.database_url, pool_size=args.pool_size, max_overflow=0)
+    sessions = sessionmaker(bind=engine, autoflush=False)
+
+    def override_get_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = backend_main.app
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    results: Dict[str, Any] = {}
+    try:
+        for name, request in scenarios(config, args.detection_batch).items():
+            if name == "POST /predict" and backend_main.yolo_model is None:
+                results[name] = {"skipped": "YOLO model not available (pass --yolo-weights)"}
+                print(f"{name:<30} skipped: no YOLO model")
+                continue
+            await drive(request, min(args.requests, args.warmup), args.concurrency, config.seed)
+            results[name] = await drive(request, args.requests, args.concurrency, config.seed)
+            result = results[name]
+            print(
+                f"{name:<30} {result['throughput_rps']:>8,.1f} req/s | p50 {result['p50_ms']:>8.2f} ms"
+                f" | p95 {result['p95_ms']:>8.2f} ms | p99 {result['p99_ms']:>8.2f} ms"
+                + (f" | errors {result['errors']}" if result["errors"] else "")
+            )
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())
+    print(f"\nChange against {baseline_path} (commit {baseline.get('commit')}):")
+    for name, result in results.items():
+        before = baseline.get("endpoints", {}).get(name)
+        if "skipped" in result or not before or "skipped" in before:
+            continue
+        deltas = [
+            f"{metric} {(result[metric] - before[metric]) / before[metric] * 100:+.1f}%"
+            for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+            if before[metric]
+        ]
+        print(f"{name:<30} " + " | ".join(deltas))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already at --database-url")
+    add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--detection-batch", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--yolo-weights", type=Path, help="Weights for /predict; defaults to the app's model")
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Earlier --json report to compare against")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        # timeout lets concurrent SQLite writers wait for the lock instead of failing.
+        args.database_url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'load.db'}?timeout=60"
+    config = config_from(args)
+    if not args.skip_seed:
+        print(f"Seeded: {json.dumps(seed(args.database_url, config))}")
+    if args.yolo_weights:
+        from yolo.utils import load_model
+
+        backend_main.yolo_model = load_model(args.yolo_weights)
+
+    results = asyncio.run(run(args, config))
+    report = {
+        "commit": git_commit(),
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "database": args.database_url.split("://", 1)[0],
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "detection_batch": args.detection_batch,
+        "data": vars(config),
+        "endpoints": results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Compare sync (threadpool) and async engine modes for the read endpoints.
+
+Seeds a database with synthetic detections, snapshots and alerts, then fires
+concurrent requests at ``/stock/summary``, ``/alerts``, ``/shelf/{shelf_id}``
+and ``/analytics/stock-history`` through both the sync handlers in
+``backend.main`` and the async router in ``backend.async_api``.
+
+Usage:
+    python benchmarks/bench_read_modes.py
+    python benchmarks/bench_read_modes.py --database-url postgresql://localhost/omnishelf_bench --concurrency 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import async_api, crud, models, rollups
+from backend.database import get_async_db, get_db, to_async_url
+from backend.main import app as sync_app
+from backend.schemas import DetectionCreate
+
+PATHS = ["/stock/summary", "/alerts", "/shelf/S1", "/analytics/stock-history?days=7"]
+
+
+def seed(database_url: str, products: int, shelves: int, detections: int) -> None:
+    engine = create_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with sessionmaker(bind=engine)() as db:
+        batch = [
+            DetectionCreate(
+                product_name=f"grozi_{random.randrange(products)}",
+                confidence=0.9,
+                bbox_x1=0,
+                bbox_y1=0,
+                bbox_x2=1,
+                bbox_y2=1,
+                shelf_id=f"S{random.randrange(shelves)}",
+                timestamp=now,
+            )
+            for _ in range(detections)
+        ]
+        crud.bulk_create_detections(db, batch, return_rows=False)
+        rollups.record_snapshots(
+            db,
+            (
+                {
+                    "product_name": f"grozi_{product}",
+                    "count": random.randrange(40),
+                    "snapshot_time": now - timedelta(days=day),
+                }
+                for product in range(products)
+                for day in range(7)
+            ),
+        )
+        db.add_all(
+            models.Alert(product_name=f"grozi_{product}", alert_type="LOW_STOCK", message="Low stock")
+            for product in range(0, products, 5)
+        )
+        db.commit()
+    engine.dispose()
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(index: int) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(PATHS[index % len(PATHS)])
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    # Size the sync pool above the 40-thread default so checkout waits in
+    # worker threads can't starve the session teardown of threads.
+    sync_engine = create_engine(args.database_url, pool_size=args.pool_size, max_overflow=0)
+    SyncSession = sessionmaker(bind=sync_engine, autoflush=False)
+
+    def override_get_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async_engine = create_async_engine(
+        to_async_url(args.database_url), pool_size=args.pool_size, max_overflow=0
+    )
+    AsyncSessionBench = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionBench() as db:
+            yield db
+
+    sync_app.dependency_overrides[get_db] = override_get_db
+    async_app = FastAPI()
+    async_app.include_router(async_api.router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+
+    results = {}
+    for mode, app in (("sync", sync_app), ("async", async_app)):
+        await drive(app, min(args.requests, 50), args.concurrency)  # warm-up
+        results[mode] = await drive(app, args.requests, args.concurrency)
+        print(f"{mode:>5} | {json.dumps(results[mode])}")
+
+    sync_app.dependency_overrides.clear()
+    await async_engine.dispose()
+    sync_engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--shelves", type=int, default=20)
+    parser.add_argument("--detections", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=1_000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        args.database_url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+    seed(args.database_url, args.products, args.shelves, args.detections)
+    results = asyncio.run(run(args))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark trigram product search on a large synthetic catalog.
+
+Builds a catalog of synthetic SKU names (brand + descriptor + product + size),
+indexes it with ``backend.search.SearchIndex`` and times autocomplete and
+misspelled queries, reporting index build time and per-query latency
+percentiles.
+
+Usage:
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --products 100000 --queries 5000 --json search.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from backend.catalog import Catalog, Product
+from backend.search import FUZZY_MIN_SCORE, SearchIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "tor", "su", "bel", "na", "qui", "dor", "fi", "zan", "pe",
+             "lu", "mar", "ko", "ri", "sa", "then", "gro", "vi", "ba", "cel"]
+DESCRIPTORS = ["Classic", "Organic", "Original", "Light", "Extra", "Spicy", "Honey", "Sea Salt",
+               "Whole Grain", "Sugar Free", "Family Size", "Chocolate", "Vanilla", "Smoked",
+               "Roasted", "Unsweetened", "Garlic", "Lemon", "Barbecue", "Low Fat"]
+PRODUCTS = ["Corn Flakes", "Tomato Ketchup", "Spaghetti", "Yogurt", "Cream Cheese", "Hazelnut Spread",
+            "Potato Chips", "Orange Juice", "Granola", "Peanut Butter", "Tortilla Chips", "Cola",
+            "Oat Milk", "Penne", "Mayonnaise", "Green Tea", "Dark Chocolate", "Rice Crackers",
+            "Sparkling Water", "Frozen Peas", "Basmati Rice", "Olive Oil", "Dish Soap", "Paper Towels",
+            "Cat Food", "Ground Coffee", "Almonds", "Salsa", "Pancake Mix", "Maple Syrup",
+            "Baby Wipes", "Shampoo", "Toothpaste", "Canned Tuna", "Black Beans", "Oatmeal"]
+SIZES = ["100g", "250g", "500g", "1kg", "330ml", "1L", "2L", "6 pack", "12 oz", "18 oz"]
+
+
+def make_brands(count: int) -> List[str]:
+    return [
+        "".join(random.choice(SYLLABLES) for _ in range(random.randint(2, 3))).capitalize()
+        for _ in range(count)
+    ]
+
+
+BRANDS = make_brands(1_500)
+
+
+def make_catalog(size: int) -> Catalog:
+    """SKUs named like real shelf labels: brand, optional descriptor, product, pack size."""
+    products = []
+    for i in range(size):
+        words = [random.choice(BRANDS)]
+        if random.random() < 0.5:
+            words.append(random.choice(DESCRIPTORS))
+        words += [random.choice(PRODUCTS), random.choice(SIZES)]
+        products.append(Product(f"sku_{i}", " ".join(words), "Synthetic", round(random.uniform(1, 20), 2)))
+    return Catalog(products)
+
+
+def misspell(text: str) -> str:
+    """Drop, swap or duplicate one character, like a hurried shopper would."""
+    if len(text) < 4:
+        return text
+    i = random.randrange(1, len(text) - 2)
+    edit = random.choice(("drop", "swap", "double"))
+    if edit == "drop":
+        return text[:i] + text[i + 1 :]
+    if edit == "swap":
+        return text[:i] + text[i + 1] + text[i] + text[i + 2 :]
+    return text[:i] + text[i] + text[i:]
+
+
+def make_queries(count: int) -> Dict[str, List[str]]:
+    return {
+        "autocomplete": [random.choice(PRODUCTS).lower()[: random.randint(3, 8)] for _ in range(count)],
+        "misspelled": [misspell(f"{random.choice(BRANDS)} {random.choice(PRODUCTS)}") for _ in range(count)],
+    }
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(products: int, queries: int, limit: int) -> Dict[str, object]:
+    catalog = make_catalog(products)
+    started = time.perf_counter()
+    index = SearchIndex(catalog)
+    build_seconds = time.perf_counter() - started
+    print(f"Indexed {len(index):,} products in {build_seconds * 1000:.1f} ms")
+
+    results: Dict[str, object] = {"products": products, "build_ms": round(build_seconds * 1000, 2)}
+    for kind, batch in make_queries(queries).items():
+        timings = []
+        for query in batch:
+            started = time.perf_counter()
+            index.search(query, limit=limit, min_score=FUZZY_MIN_SCORE)
+            timings.append((time.perf_counter() - started) * 1000)
+        stats = {
+            "queries": len(timings),
+            "mean_ms": round(statistics.mean(timings), 4),
+            "p50_ms": round(percentile(timings, 50), 4),
+            "p95_ms": round(percentile(timings, 95), 4),
+            "p99_ms": round(percentile(timings, 99), 4),
+        }
+        results[kind] = stats
+        print(f"{kind:>13} | p50 {stats['p50_ms']:.3f} ms | p95 {stats['p95_ms']:.3f} ms | p99 {stats['p99_ms']:.3f} ms")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.products, args.queries, args.limit)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
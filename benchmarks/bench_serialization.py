@@ -0,0 +1,136 @@
+"""Micro-benchmark response encoding for the large endpoint payloads.
+
+Builds synthetic payloads shaped like ``/stock/summary``, ``/stock/history``,
+``/analytics/stock-history`` and ``/predict`` and compares FastAPI's default
+path (``jsonable_encoder`` + ``json.dumps``) with the orjson and MessagePack
+encoders in ``backend.serialization``, reporting encode time plus raw and
+gzip-compressed size.
+
+Usage:
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --products 10000 --snapshots 50000 --json serialization.json
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.serialization import dumps_json, dumps_msgpack
+from backend.stock import build_stock_summary
+
+
+def stdlib_encode(payload: Any) -> bytes:
+    """What FastAPI does for handlers without a response_model."""
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {
+    "jsonable_encoder+json": stdlib_encode,
+    "orjson": dumps_json,
+    "msgpack": dumps_msgpack,
+}
+
+
+def make_payloads(products: int, snapshots: int, days: int, detections: int) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    entries = [
+        {
+            "product_name": f"grozi_{i}",
+            "total_count": random.randrange(40),
+            "last_seen": now - timedelta(minutes=random.randrange(600)),
+            "shelf_breakdown": {f"S{s}": random.randrange(20) for s in range(random.randint(1, 3))},
+        }
+        for i in range(products)
+    ]
+    history_rows = [
+        {
+            "id": i,
+            "product_name": f"grozi_{i % products}",
+            "count": random.randrange(40),
+            "shelf_id": f"S{i % 15}",
+            "snapshot_time": now - timedelta(minutes=i),
+        }
+        for i in range(snapshots)
+    ]
+    analytics = {
+        f"grozi_{i}": {
+            (now - timedelta(days=d)).strftime("%Y-%m-%d"): random.randrange(40) for d in range(days)
+        }
+        for i in range(products)
+    }
+    # Same shape as yolo.utils.yolo_result_to_detections output.
+    predictions = [
+        {
+            "product_name": f"grozi_{i % 120}",
+            "confidence": random.uniform(0.5, 1.0),
+            "bbox": [random.uniform(0, 800) for _ in range(4)],
+        }
+        for i in range(detections)
+    ]
+    return {
+        "/stock/summary": {"products": build_stock_summary(entries, {})},
+        "/stock/history": history_rows,
+        "/analytics/stock-history": {"history": analytics},
+        "/predict": {"detections": predictions},
+    }
+
+
+def run(payloads: Dict[str, Any], repeat: int) -> List[Dict[str, object]]:
+    results = []
+    for endpoint, payload in payloads.items():
+        for name, encode in ENCODERS.items():
+            body = encode(payload)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                encode(payload)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            compressed = len(gzip.compress(body, compresslevel=6))
+            results.append(
+                {
+                    "endpoint": endpoint,
+                    "encoder": name,
+                    "encode_ms": round(best * 1000, 3),
+                    "bytes": len(body),
+                    "gzip_bytes": compressed,
+                }
+            )
+            print(
+                f"{endpoint:>26} | {name:>21} | {best * 1000:>9.2f} ms | "
+                f"{len(body):>11,} B | {compressed:>10,} B gzip"
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--snapshots", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--detections", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per point; the best is reported")
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.products, args.snapshots, args.days, args.detections)
+    results = run(payloads, args.repeat)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
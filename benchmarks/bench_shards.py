@@ -0,0 +1,131 @@
+"""Benchmark detection ingest throughput per store shard.
+
+Runs the same number of concurrent writer processes (one per simulated shelf
+camera) twice: first with every camera posting to a single store shard, then with
+the cameras spread over ``--shards`` stores, each in its own database, routed
+through ``backend.database.StoreRouter``. Each writer commits batches with
+``crud.bulk_create_detections`` (``return=minimal``, alert engine on), so
+the numbers include scan bookkeeping and alert evaluation.
+
+SQLite serialises writers per database file, so splitting stores across
+files shows the horizontal scaling directly. For Postgres pass one URL per
+shard; put them on separate servers to measure more than lock contention.
+
+Usage:
+    python benchmarks/bench_shards.py
+    python benchmarks/bench_shards.py --shards 8 --writers-per-shard 2 --json shards.json
+    python benchmarks/bench_shards.py --database-urls postgresql://db1/bench postgresql://db2/bench
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models
+from backend.database import StoreRouter
+
+from bench_ingest import make_batch
+
+
+def build_router(shards: Dict[str, str], scratch: Path) -> StoreRouter:
+    # The default store gets its own scratch database so no shard shares it.
+    default_engine = create_engine(f"sqlite:///{scratch / 'default.db'}")
+    return StoreRouter(sessionmaker(bind=default_engine, autoflush=False), shards)
+
+
+def writer(shards: Dict[str, str], scratch: Path, store_id: str, camera: int, batches: int, batch_size: int):
+    """One camera process posting ``batches`` uploads of its own shelf to ``store_id``."""
+    router = build_router(shards, scratch)
+    payload = make_batch(batch_size, shelves=1)
+    for item in payload:
+        item.shelf_id = f"cam{camera}"
+    started = time.time()
+    for _ in range(batches):
+        with router.session(store_id) as db:
+            crud.bulk_create_detections(db, payload, return_rows=False)
+    return store_id, batches * batch_size, started, time.time()
+
+
+def run(urls: List[str], stores: int, writers: int, batches: int, batch_size: int, scratch: Path) -> Dict:
+    shards = {f"store{i}": urls[i] for i in range(stores)}
+    router = build_router(shards, scratch)
+    for store_id in shards:
+        engine = router.shard(store_id).engine
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        engine.dispose()
+
+    # Processes rather than threads, as separate API workers would be.
+    with ProcessPoolExecutor(max_workers=writers) as pool:
+        results = list(
+            pool.map(
+                writer,
+                *zip(
+                    *[
+                        (shards, scratch, f"store{i % stores}", i, batches, batch_size)
+                        for i in range(writers)
+                    ]
+                ),
+            )
+        )
+    def rate(selected: List[tuple]) -> float:
+        elapsed = max(end for *_, end in selected) - min(start for _, _, start, _ in selected)
+        return round(sum(count for _, count, _, _ in selected) / elapsed, 1)
+
+    return {
+        "stores": stores,
+        "writers": writers,
+        "rows_per_sec": rate(results),
+        "per_store_rows_per_sec": {
+            store_id: rate([result for result in results if result[0] == store_id]) for store_id in shards
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-urls", nargs="+", help="One URL per shard; defaults to temporary SQLite files")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--writers-per-shard", type=int, default=2)
+    parser.add_argument("--batches", type=int, default=50, help="Batches posted by each writer")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    scratch = Path(tempfile.mkdtemp())
+    urls = args.database_urls or [
+        f"sqlite:///{scratch / f'store{i}.db'}?timeout=60" for i in range(args.shards)
+    ]
+    shards = min(args.shards, len(urls))
+    writers = shards * args.writers_per_shard
+
+    results = []
+    for stores in (1, shards):
+        result = run(urls, stores, writers, args.batches, args.batch_size, scratch)
+        results.append(result)
+        per_store = ", ".join(f"{rate:,.0f}" for rate in result["per_store_rows_per_sec"].values())
+        print(
+            f"{stores:>2} shard(s) | {writers} writers | {result['rows_per_sec']:>10,.0f} rows/s "
+            f"| per shard: {per_store}"
+        )
+    print(f"scale-out: {results[-1]['rows_per_sec'] / results[0]['rows_per_sec']:.2f}x over one shard")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark ``/analytics/velocity`` on a large synthetic snapshot history.
+
+Seeds daily rollups for ``--products`` products over ``--days`` days (10k x 90
+by default) and times the velocity pipeline in stages: the single series
+query, the vectorized NumPy computation, a cold ``VelocityCache.get`` and a
+cached one. A per-product pure-Python loop computing the same rates is
+timed as the baseline the vectorized path replaces.
+
+Usage:
+    python benchmarks/bench_velocity.py
+    python benchmarks/bench_velocity.py --products 20000 --days 180 --json velocity.json
+    python benchmarks/bench_velocity.py --database-url postgresql://localhost/omnishelf_bench
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, rollups, velocity
+
+
+def seed(database_url: str, products: int, days: int, now: datetime) -> None:
+    engine = create_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(7)
+    start = rollups.bucket_start(now - timedelta(days=days - 1), "day")
+    # Each product depletes or restocks linearly with noise from a random level.
+    levels = rng.integers(20, 200, products)[:, None]
+    rates = rng.normal(-1.0, 2.0, products)[:, None]
+    counts = np.clip(levels + rates * np.arange(days) + rng.normal(0, 2, (products, days)), 0, None).astype(int)
+    names = [f"grozi_{product:05d}" for product in range(products)]
+    with sessionmaker(bind=engine)() as db:
+        # Day by day, in the order the snapshot service writes them.
+        for day in range(days):
+            bucket = start + timedelta(days=day)
+            db.execute(
+                insert(models.StockRollup),
+                [
+                    {
+                        "resolution": "day",
+                        "product_name": name,
+                        "bucket_start": bucket,
+                        "min_count": count,
+                        "max_count": count,
+                        "sum_count": count,
+                        "samples": 1,
+                        "last_count": count,
+                        "last_time": bucket,
+                    }
+                    for name, count in zip(names, counts[:, day].tolist())
+                ],
+            )
+        db.add(models.StockSnapshot(product_name="grozi_00000", count=0, snapshot_time=now))
+        db.commit()
+    engine.dispose()
+
+
+def python_rates(names: np.ndarray, series: np.ndarray) -> List[float]:
+    """Per-product least-squares slope in plain Python, the shape of a row-at-a-time implementation."""
+    slopes = []
+    for row in series.tolist():
+        points = [(x, y) for x, y in enumerate(row) if y == y]
+        n = len(points)
+        x_mean = sum(x for x, _ in points) / n
+        y_mean = sum(y for _, y in points) / n
+        denominator = sum((x - x_mean) ** 2 for x, _ in points)
+        slopes.append(sum((x - x_mean) * (y - y_mean) for x, y in points) / denominator if denominator else 0.0)
+    return slopes
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--window", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best is reported")
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'velocity.db'}"
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    seed(url, args.products, args.days, now)
+    print(f"Seeded {args.products:,} products x {args.days} days in {time.perf_counter() - started:.1f}s")
+
+    engine = create_engine(url)
+    db = sessionmaker(bind=engine)()
+    start = rollups.bucket_start(now - timedelta(days=args.days), "day")
+    names, series, origin, observed = velocity.load_series(db, start, "day")
+    cache = velocity.VelocityCache()
+
+    def cold() -> None:
+        cache.invalidate()
+        cache.get(db, args.days, "day", args.window, now)
+
+    results: Dict[str, float] = {
+        "load_series_ms": timed(lambda: velocity.load_series(db, start, "day"), args.repeat),
+        "compute_numpy_ms": timed(
+            lambda: velocity.compute_velocity(names, series, origin, "day", args.window, observed), args.repeat
+        ),
+        "rates_python_loop_ms": timed(lambda: python_rates(names, series), args.repeat),
+        "rates_numpy_ms": timed(lambda: velocity._slope(series, np.arange(series.shape[1], dtype=float)), args.repeat),
+        "cold_request_ms": timed(cold, args.repeat),
+    }
+    cache.get(db, args.days, "day", args.window, now)
+    results["cached_request_ms"] = timed(lambda: cache.get(db, args.days, "day", args.window, now), args.repeat)
+    db.close()
+    engine.dispose()
+
+    for name, value in results.items():
+        print(f"{name:<22} {value:>10,.1f}")
+    print(f"rates speedup: {results['rates_python_loop_ms'] / results['rates_numpy_ms']:.0f}x over a Python loop")
+
+    if args.json:
+        report = {"products": args.products, "days": args.days, "window": args.window, **results}
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""EXPLAIN and time every hot query in ``backend.crud`` on a synthetic dataset.
+
+Migrates a database to the latest Alembic revision, fills it with synthetic
+scans and detections (10M by default), snapshots, alerts, planogram entries
+and the derived shelf state and rollup tables, then for each query builder used by the
+API prints the plan (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on
+Postgres), the indexes it uses and its latency. Full table scans and sorts
+the index doesn't serve are flagged as advice.
+
+With ``--compare`` the queries are also run with revision 0002's composite
+and partial indexes swapped back for the single-column indexes the models
+used to declare, so their effect is reported side by side. Only the indexes
+are swapped; the tables of later revisions stay as they are.
+
+Usage:
+    python benchmarks/index_advisor.py --detections 1000000
+    python benchmarks/index_advisor.py --compare --json advisor.json
+    python benchmarks/index_advisor.py --database-url postgresql://localhost/omnishelf_bench --analyze
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import Index, MetaData, Select, Table, create_engine, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from backend import alerts, crud, models, rollups
+
+CHUNK_ROWS = 1_000_000
+SCAN_SIZE = 50  # detections per synthetic shelf scan
+SPAN = timedelta(days=30)
+
+# Set-based generators, one INSERT ... SELECT per chunk of rows. ``:lo``/``:hi``
+# bound the row numbers of the chunk; timestamps spread evenly over SPAN.
+SEED_SQL = {
+    "sqlite": {
+        "sequence": "WITH RECURSIVE seq(n) AS (SELECT :lo UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < :hi) ",
+        "from": " FROM seq",
+        "random_int": "(abs(random()) % {})",
+        "moment": "datetime(:start + n * :step, 'unixepoch')",
+    },
+    "postgresql": {
+        "sequence": "",
+        "from": " FROM generate_series(:lo, :hi - 1) AS n",
+        "random_int": "floor(random() * {})::int",
+        "moment": "to_timestamp(:start + n * :step) AT TIME ZONE 'UTC'",
+    },
+}
+
+
+def alembic_config(connection: Connection) -> Config:
+    config = Config(str(ROOT_DIR / "alembic.ini"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def migrate(engine: Engine, revision: str) -> None:
+    # A plain connection (not engine.begin()) lets Alembic manage the
+    # transaction itself and step out of it for CONCURRENTLY index builds.
+    with engine.connect() as connection:
+        config = alembic_config(connection)
+        command.upgrade(config, revision)
+        connection.commit()
+
+
+def swap_indexes(engine: Engine, legacy: bool) -> None:
+    """Swap revision 0002's indexes for the single-column ones it replaced, or back.
+
+    Uses the revision's own index lists, skipping tables a later revision
+    removed, so the comparison doesn't have to downgrade past the data.
+    """
+    script = ScriptDirectory.from_config(Config(str(ROOT_DIR / "alembic.ini")))
+    revision = script.get_revision("0002").module
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        tables: Dict[str, Table] = {}
+
+        def table(name: str) -> Table:
+            if name not in tables:
+                tables[name] = Table(name, MetaData(), autoload_with=conn)
+            return tables[name]
+
+        new = [
+            Index(name, *(table(t).c[c] for c in columns), **kwargs)
+            for name, t, columns, kwargs in revision.NEW_INDEXES
+            if t in existing
+        ]
+        old = [
+            Index(name, *(table(t).c[c] for c in columns))
+            for name, t, columns in revision.OLD_INDEXES
+            if t in existing
+        ]
+        drop, create = (new, old) if legacy else (old, new)
+        for index in drop:
+            index.drop(conn, checkfirst=True)
+        for index in create:
+            index.create(conn, checkfirst=True)
+
+
+def _insert_select(conn: Connection, table: str, columns: str, values: str, rows: int) -> None:
+    dialect = SEED_SQL[conn.dialect.name]
+    sql = text(
+        f"INSERT INTO {table} ({columns}) {dialect['sequence']}SELECT {values}{dialect['from']}"
+    )
+    start = (datetime.utcnow() - SPAN).timestamp()
+    step = SPAN.total_seconds() / max(rows, 1)
+    for lo in range(0, rows, CHUNK_ROWS):
+        hi = min(lo + CHUNK_ROWS, rows)
+        conn.execute(sql, {"lo": lo, "hi": hi, "start": start, "step": step})
+        print(f"  {table}: {hi:,}/{rows:,}", end="\r", flush=True)
+    print()
+
+
+def seed(engine: Engine, detections: int, products: int, shelves: int) -> None:
+    rand = SEED_SQL[engine.dialect.name]["random_int"].format
+    moment = SEED_SQL[engine.dialect.name]["moment"]
+    product = f"'grozi_' || {rand(products)}"
+    shelf = f"'S' || {rand(shelves)}"
+    with engine.begin() as conn:
+        for table in (
+            "alerts",
+            "stock_rollups",
+            "stock_snapshots",
+            "planogram",
+            "shelf_state",
+            "shelf_scans",
+            "product_detections",
+        ):
+            conn.execute(text(f"DELETE FROM {table}"))
+        # Scans visit the shelves round-robin; detection n belongs to scan
+        # n / SCAN_SIZE + 1 and sits on that scan's shelf.
+        scans = max(-(-detections // SCAN_SIZE), 1)
+        _insert_select(
+            conn,
+            "shelf_scans",
+            "id, shelf_id, captured_at, detection_count",
+            f"n + 1, 'S' || (n % {shelves}), {moment}, {SCAN_SIZE}",
+            scans,
+        )
+        _insert_select(
+            conn,
+            "product_detections",
+            "product_name, confidence, bbox_x1, bbox_y1, bbox_x2, bbox_y2, shelf_id, scan_id, timestamp",
+            f"{product}, 0.9, 0, 0, 1, 1, 'S' || ((n / {SCAN_SIZE}) % {shelves}), n / {SCAN_SIZE} + 1, {moment}",
+            detections,
+        )
+        _insert_select(
+            conn,
+            "stock_snapshots",
+            "product_name, count, shelf_id, snapshot_time",
+            f"{product}, {rand(40)}, {shelf}, {moment}",
+            max(detections // 10, 1),
+        )
+        _insert_select(
+            conn,
+            "alerts",
+            "product_name, alert_type, message, created_at, resolved",
+            # Roughly 5% of alerts are still open, as in a store that works its queue.
+            f"{product}, CASE WHEN n % 2 = 0 THEN 'LOW_STOCK' ELSE 'OUT_OF_STOCK' END, 'synthetic', "
+            f"{moment}, {rand(20)} <> 0",
+            max(products * 50, 1),
+        )
+        conn.execute(
+            models.Planogram.__table__.insert(),
+            [
+                {"product_name": f"grozi_{i}", "shelf_id": f"S{i % shelves}", "expected_stock": 10}
+                for i in range(products)
+            ],
+        )
+    with Session(engine) as db:
+        crud.rebuild_shelf_state(db)
+        rollups.rebuild_rollups(db)
+    analyze(engine)
+
+
+def analyze(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def build_queries(engine: Engine, products: int, shelves: int) -> Dict[str, Select]:
+    """The statements behind each API read path, built by the same functions the API uses."""
+    sample = sorted(f"grozi_{i}" for i in random.sample(range(products), min(50, products)))
+    with engine.connect() as conn:
+        middle = conn.execute(
+            crud.alerts_query(False, None, 1).offset(max(products // 4, 1))
+        ).first() or conn.execute(crud.alerts_query(False, None, 1)).first()
+        snapshot = conn.execute(crud.snapshots_query(None, 1).offset(5_000)).first()
+    now = datetime.utcnow()
+    queries: Dict[str, Select] = {
+        "stock_counts (/stock/summary)": crud._stock_rows_query(),
+        "stock_for_products (/shopping-list)": crud._stock_rows_query(sample),
+        "shelf_summary (/shelf/{id})": crud._shelf_summary_query(f"S{shelves // 2}"),
+        "planogram_entries": select(models.Planogram).where(models.Planogram.product_name.in_(sample)),
+        "shelf_state_rebuild": crud.shelf_state_source(),
+        "shelf_scans (/shelf/{id}/scans)": select(models.ShelfScan)
+        .where(models.ShelfScan.shelf_id == f"S{shelves // 2}")
+        .order_by(models.ShelfScan.captured_at.desc(), models.ShelfScan.id.desc())
+        .limit(50),
+        "scan_detections (/scans/{id}/detections)": select(models.ProductDetection)
+        .where(models.ProductDetection.scan_id == 1)
+        .order_by(models.ProductDetection.id),
+        "alerts_page (/alerts)": crud.alerts_query(False, None, 501),
+        "alerts_next_page (/alerts?cursor=)": crud.alerts_query(
+            False, crud.encode_cursor(middle.created_at, middle.id) if middle else None, 501
+        ),
+        "resolved_alerts_page": crud.alerts_query(True, None, 501),
+        "engine_open_alerts (alert engine)": alerts.open_alerts_query(sample),
+        "snapshots_page (/stock/history)": crud.snapshots_query(None, 1001),
+        "snapshots_since (/stock/history?since=)": crud.snapshots_query(
+            None, 1001, now - timedelta(days=1)
+        ),
+        "history_hourly (/analytics/stock-history)": rollups.history_query(now - timedelta(days=2), "hour"),
+        "history_daily (/analytics/stock-history)": rollups.history_query(now - timedelta(days=30), "day"),
+    }
+    if snapshot is not None:
+        queries["snapshots_next_page (/stock/history?cursor=)"] = crud.snapshots_query(
+            crud.encode_cursor(snapshot.snapshot_time, snapshot.id), 1001
+        )
+    return queries
+
+
+def _literal_sql(engine: Engine, stmt: Select) -> str:
+    # Literal values, as psycopg2 sends them, so the planner can match partial indexes.
+    return str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def explain(engine: Engine, stmt: Select, analyze_plan: bool = False) -> List[str]:
+    sql = _literal_sql(engine, stmt)
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+        prefix = "EXPLAIN (ANALYZE, BUFFERS)" if analyze_plan else "EXPLAIN"
+        return [row[0] for row in conn.exec_driver_sql(f"{prefix} {sql}")]
+
+
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+_PG_INDEX = re.compile(r"Index(?: Only)? Scan(?: Backward)? using (\w+)")
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?! USING)")
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def advise(plan: List[str]) -> Dict[str, List[str]]:
+    text_plan = "\n".join(plan)
+    indexes = sorted(set(_SQLITE_INDEX.findall(text_plan) + _PG_INDEX.findall(text_plan)))
+    advice = []
+    for line in plan:
+        line = line.strip().lstrip("->").strip()
+        scan = _SQLITE_SCAN.match(line) or _PG_SEQ_SCAN.search(line)
+        # Scans of subqueries (anon_1, CTEs) are over already-reduced rows.
+        if scan and "INDEX" not in line and scan.group(1) in models.Base.metadata.tables:
+            advice.append(f"full scan of {scan.group(1)}")
+        if "USE TEMP B-TREE" in line or line.startswith("Sort "):
+            advice.append("sort not served by an index")
+    return {"indexes": indexes, "advice": advice}
+
+
+def time_query(engine: Engine, stmt: Select, repeat: int) -> Dict[str, float]:
+    timings = []
+    with engine.connect() as conn:
+        rows = len(conn.execute(stmt).all())  # warm the cache once
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(stmt).all()
+            timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "rows": rows,
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def run(engine: Engine, queries: Dict[str, Select], repeat: int, analyze_plan: bool) -> Dict[str, Dict]:
+    results = {}
+    for name, stmt in queries.items():
+        plan = explain(engine, stmt, analyze_plan)
+        report = {**time_query(engine, stmt, repeat), **advise(plan), "plan": plan}
+        results[name] = report
+        flags = "; ".join(report["advice"]) or "ok"
+        print(
+            f"{name:<46} | {report['median_ms']:>9.2f} ms | {report['rows']:>7,} rows | "
+            f"{', '.join(report['indexes']) or '-'} | {flags}"
+        )
+        if analyze_plan or report["advice"]:
+            for line in plan:
+                print(f"{'':<6}{line}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--detections", type=int, default=10_000_000)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--shelves", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse data already in --database-url")
+    parser.add_argument("--compare", action="store_true", help="Also measure with the pre-0002 indexes")
+    parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE on Postgres")
+    parser.add_argument("--json", type=Path, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/index_advisor.db"
+    engine = create_engine(database_url, future=True)
+    migrate(engine, "head")
+    if not args.skip_seed:
+        started = time.perf_counter()
+        print(f"Seeding {args.detections:,} detections into {engine.url.render_as_string()}")
+        seed(engine, args.detections, args.products, args.shelves)
+        print(f"Seeded in {time.perf_counter() - started:.1f} s")
+    with engine.connect() as conn:
+        print(f"{conn.execute(select(func.count()).select_from(models.ProductDetection)).scalar():,} detections")
+
+    queries = build_queries(engine, args.products, args.shelves)
+    results: Dict[str, object] = {"database": engine.dialect.name, "detections": args.detections}
+    runs: List[tuple] = []
+    if args.compare:
+        print("\n== before 0002 (single-column indexes) ==")
+        swap_indexes(engine, legacy=True)
+        analyze(engine)
+        runs.append(("0001", run(engine, queries, args.repeat, args.analyze)))
+        swap_indexes(engine, legacy=False)
+        analyze(engine)
+    print("\n== head ==")
+    runs.append(("head", run(engine, queries, args.repeat, args.analyze)))
+    results.update(runs)
+
+    if args.compare:
+        before, after = runs[0][1], runs[1][1]
+        print(f"\n{'query':<46} | {'0001':>10} | {'head':>10} | speedup")
+        for name in queries:
+            old, new = before[name]["median_ms"], after[name]["median_ms"]
+            print(f"{name:<46} | {old:>7.2f} ms | {new:>7.2f} ms | {old / max(new, 1e-6):>6.1f}x")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
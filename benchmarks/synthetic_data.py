@@ -0,0 +1,161 @@
+"""Generate a synthetic store for load tests and benchmarks.
+
+Seeds a database through the same write paths production uses:
+
+* a planogram entry per product (``crud.upsert_planogram``);
+* ``--detections`` detections uploaded as shelf scans of ``--scan-size``
+  (``crud.bulk_create_uploads``), so ``shelf_state``, scans and stock alerts
+  are populated as ingest would leave them;
+* ``--snapshot-days`` days of stock snapshots, ``--snapshots-per-day`` per
+  product per day, with their hourly and daily rollups
+  (``rollups.record_snapshots``).
+
+Generation is seeded (``--seed``), so two runs with the same arguments
+produce the same store and benchmark results stay comparable across commits.
+
+Usage:
+    python benchmarks/synthetic_data.py --database-url sqlite:///bench.db
+    python benchmarks/synthetic_data.py --database-url postgresql://localhost/omnishelf_bench \\
+        --products 5000 --shelves 200 --detections 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, rollups
+from backend.schemas import DetectionCreate, PlanogramCreate
+
+
+@dataclass
+class SyntheticConfig:
+    products: int = 500
+    shelves: int = 20
+    detections: int = 50_000
+    scan_size: int = 100
+    snapshot_days: int = 7
+    snapshots_per_day: int = 24
+    seed: int = 42
+
+
+def product_names(config: SyntheticConfig) -> List[str]:
+    return [f"grozi_{product}" for product in range(config.products)]
+
+
+def _shelf_of(product: int, config: SyntheticConfig) -> str:
+    return f"S{product % config.shelves}"
+
+
+def _uploads(config: SyntheticConfig, rng: random.Random, now: datetime) -> Iterator[List[DetectionCreate]]:
+    """Scans of one shelf each, oldest first, holding products planned for that shelf."""
+    by_shelf: Dict[str, List[str]] = {}
+    for product, name in enumerate(product_names(config)):
+        by_shelf.setdefault(_shelf_of(product, config), []).append(name)
+    shelves = sorted(by_shelf)
+    scans = -(-config.detections // config.scan_size)
+    for scan in range(scans):
+        shelf_id = rng.choice(shelves)
+        captured_at = now - timedelta(seconds=scans - scan)
+        size = min(config.scan_size, config.detections - scan * config.scan_size)
+        yield [
+            DetectionCreate(
+                product_name=rng.choice(by_shelf[shelf_id]),
+                confidence=rng.uniform(0.5, 1.0),
+                bbox_x1=rng.uniform(0, 400),
+                bbox_y1=rng.uniform(0, 400),
+                bbox_x2=rng.uniform(400, 800),
+                bbox_y2=rng.uniform(400, 800),
+                shelf_id=shelf_id,
+                timestamp=captured_at,
+            )
+            for _ in range(size)
+        ]
+
+
+def _snapshots(config: SyntheticConfig, rng: random.Random, now: datetime) -> Iterator[Dict]:
+    step = timedelta(days=1) / config.snapshots_per_day
+    samples = config.snapshot_days * config.snapshots_per_day
+    for name in product_names(config):
+        level = rng.randrange(5, 60)
+        for sample in range(samples):
+            # Sell down, restock when empty.
+            level = level - rng.randrange(0, 3) if level > 2 else rng.randrange(20, 60)
+            yield {
+                "product_name": name,
+                "count": level,
+                "shelf_id": None,
+                "snapshot_time": now - (samples - sample) * step,
+            }
+
+
+def seed(database_url: str, config: SyntheticConfig, batch_uploads: int = 20) -> Dict[str, float]:
+    """Drop and recreate the schema at ``database_url`` and fill it; returns row counts and timing."""
+    rng = random.Random(config.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    engine = create_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with sessionmaker(bind=engine, autoflush=False)() as db:
+        crud.upsert_planogram(
+            db,
+            [
+                PlanogramCreate(
+                    product_name=name, shelf_id=_shelf_of(product, config), expected_stock=rng.randrange(5, 40)
+                )
+                for product, name in enumerate(product_names(config))
+            ],
+        )
+        pending: List[List[DetectionCreate]] = []
+        for upload in _uploads(config, rng, now):
+            pending.append(upload)
+            if len(pending) == batch_uploads:
+                crud.bulk_create_uploads(db, pending, return_rows=False)
+                pending = []
+        if pending:
+            crud.bulk_create_uploads(db, pending, return_rows=False)
+        if config.snapshot_days and config.snapshots_per_day:
+            rollups.record_snapshots(db, _snapshots(config, rng, now))
+        counts = {
+            "detections": db.query(models.ProductDetection).count(),
+            "scans": db.query(models.ShelfScan).count(),
+            "snapshots": db.query(models.StockSnapshot).count(),
+            "open_alerts": db.query(models.Alert).filter(models.Alert.resolved.is_(False)).count(),
+        }
+    engine.dispose()
+    return {**counts, "seconds": round(time.perf_counter() - started, 1)}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = SyntheticConfig()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=value)
+
+
+def config_from(args: argparse.Namespace) -> SyntheticConfig:
+    return SyntheticConfig(**{field: getattr(args, field) for field in asdict(SyntheticConfig())})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="Database to (re)create; existing tables are dropped")
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(seed(args.database_url, config_from(args))))
+
+
+if __name__ == "__main__":
+    main()
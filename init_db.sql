@@ -8,17 +8,43 @@ CREATE TABLE IF NOT EXISTS product_detections (
     bbox_x2 DOUBLE PRECISION NOT NULL,
     bbox_y2 DOUBLE PRECISION NOT NULL,
     shelf_id VARCHAR(255),
+    scan_id INTEGER,
+    store_id VARCHAR(255) NOT NULL DEFAULT 'default',
     timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_product_name ON product_detections (product_name);
-CREATE INDEX IF NOT EXISTS idx_shelf_id ON product_detections (shelf_id);
+CREATE INDEX IF NOT EXISTS ix_product_detections_product_shelf ON product_detections (product_name, shelf_id, timestamp);
+CREATE INDEX IF NOT EXISTS ix_product_detections_shelf_product ON product_detections (shelf_id, product_name);
+CREATE INDEX IF NOT EXISTS ix_product_detections_scan_id ON product_detections (scan_id);
+
+CREATE TABLE IF NOT EXISTS shelf_scans (
+    id SERIAL PRIMARY KEY,
+    shelf_id VARCHAR(255) NOT NULL,
+    captured_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    detection_count INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_shelf_scans_shelf_captured ON shelf_scans (shelf_id, captured_at);
+
+CREATE TABLE IF NOT EXISTS shelf_state (
+    id SERIAL PRIMARY KEY,
+    product_name VARCHAR(255) NOT NULL,
+    shelf_id VARCHAR(255) NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    last_seen TIMESTAMP WITHOUT TIME ZONE,
+    scan_id INTEGER NOT NULL,
+    captured_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    CONSTRAINT uq_shelf_state_product_shelf UNIQUE (product_name, shelf_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_shelf_state_shelf_product ON shelf_state (shelf_id, product_name) INCLUDE (count, last_seen);
 
 CREATE TABLE IF NOT EXISTS planogram (
     id SERIAL PRIMARY KEY,
     product_name VARCHAR(255) UNIQUE NOT NULL,
     shelf_id VARCHAR(255) NOT NULL,
-    expected_stock INTEGER NOT NULL DEFAULT 0
+    expected_stock INTEGER NOT NULL DEFAULT 0,
+    store_id VARCHAR(255) NOT NULL DEFAULT 'default'
 );
 
 CREATE TABLE IF NOT EXISTS stock_snapshots (
@@ -26,20 +52,39 @@ CREATE TABLE IF NOT EXISTS stock_snapshots (
     product_name VARCHAR(255) NOT NULL,
     count INTEGER NOT NULL,
     shelf_id VARCHAR(255),
-    snapshot_time TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+    snapshot_time TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    store_id VARCHAR(255) NOT NULL DEFAULT 'default'
 );
 
 CREATE INDEX IF NOT EXISTS idx_snapshot_product ON stock_snapshots (product_name);
-CREATE INDEX IF NOT EXISTS idx_snapshot_time ON stock_snapshots (snapshot_time);
+CREATE INDEX IF NOT EXISTS ix_stock_snapshots_time_id ON stock_snapshots (snapshot_time, id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_stock_snapshots_product_time ON stock_snapshots (product_name, snapshot_time);
+
+CREATE TABLE IF NOT EXISTS stock_rollups (
+    id SERIAL PRIMARY KEY,
+    resolution VARCHAR(10) NOT NULL,
+    product_name VARCHAR(255) NOT NULL,
+    bucket_start TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    min_count INTEGER NOT NULL,
+    max_count INTEGER NOT NULL,
+    sum_count INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    last_count INTEGER NOT NULL,
+    last_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    CONSTRAINT uq_stock_rollups_bucket UNIQUE (resolution, product_name, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS ix_stock_rollups_resolution_bucket ON stock_rollups (resolution, bucket_start);
 
 CREATE TABLE IF NOT EXISTS alerts (
     id SERIAL PRIMARY KEY,
     product_name VARCHAR(255) NOT NULL,
     alert_type VARCHAR(50) NOT NULL,
     message TEXT NOT NULL,
-    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
-    resolved BOOLEAN DEFAULT FALSE
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'utc'),
+    resolved BOOLEAN DEFAULT FALSE,
+    store_id VARCHAR(255) NOT NULL DEFAULT 'default'
 );
 
-CREATE INDEX IF NOT EXISTS idx_alert_product ON alerts (product_name);
-CREATE INDEX IF NOT EXISTS idx_alert_resolved ON alerts (resolved);
+CREATE INDEX IF NOT EXISTS ix_alerts_unresolved_created ON alerts (created_at, id) WHERE resolved = false;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_alerts_unresolved_product ON alerts (product_name, alert_type) WHERE resolved = false;
@@ -0,0 +1,96 @@
+"""Alembic environment for OmniShelf AI.
+
+The target URL is ``DATABASE_URL`` from ``backend.config`` unless a caller
+(e.g. ``benchmarks/index_advisor.py`` or the tests) passes an open
+connection in ``config.attributes["connection"]`` or sets
+``sqlalchemy.url`` on the config.
+
+Store shards (``STORE_SHARDS``) are migrated one at a time with
+``alembic -x store=<store_id> upgrade head``. A shard with a ``schema``
+gets the schema created if needed, its ``search_path`` pinned to it and
+its own ``alembic_version`` table inside it.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from alembic import context
+from sqlalchemy import create_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend import models
+from backend.config import settings
+from backend.stores import DEFAULT_STORE
+
+config = context.config
+target_metadata = models.Base.metadata
+
+
+def _store_target() -> Dict[str, Any]:
+    store_id = context.get_x_argument(as_dictionary=True).get("store")
+    if store_id is None:
+        return {}
+    if store_id not in settings.store_shards:
+        if store_id == DEFAULT_STORE:
+            return {}
+        raise SystemExit(f"Unknown store {store_id!r}; add it to STORE_SHARDS")
+    target = settings.store_shards[store_id]
+    return {"url": target} if isinstance(target, str) else target
+
+
+STORE = _store_target()
+SCHEMA: Optional[str] = STORE.get("schema")
+
+
+def _database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or STORE.get("url") or settings.database_url
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+        version_table_schema=SCHEMA,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite can't ALTER most things in place; batch mode recreates tables.
+        render_as_batch=connection.dialect.name == "sqlite",
+        version_table_schema=SCHEMA,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    connect_args = {"options": f"-c search_path={SCHEMA}"} if SCHEMA else {}
+    engine = create_engine(_database_url(), future=True, connect_args=connect_args)
+    try:
+        with engine.connect() as connection:
+            if SCHEMA:
+                connection.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS "{SCHEMA}"')
+                connection.commit()
+            _run(connection)
+    finally:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,125 @@
+"""Baseline schema.
+
+Creates the tables as they stood before migrations were introduced. Tables
+that already exist (databases set up by ``init_db.sql``, ``init_postgres.py``
+or ``Base.metadata.create_all``) are left alone, so existing deployments can
+simply run ``alembic upgrade head``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create(name: str, *columns, indexes=(), **kw) -> None:
+    if sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns, **kw)
+    for index_name, index_columns in indexes:
+        op.create_index(index_name, name, index_columns)
+
+
+def upgrade() -> None:
+    _create(
+        "product_detections",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("confidence", sa.Float, nullable=False),
+        sa.Column("bbox_x1", sa.Float, nullable=False),
+        sa.Column("bbox_y1", sa.Float, nullable=False),
+        sa.Column("bbox_x2", sa.Float, nullable=False),
+        sa.Column("bbox_y2", sa.Float, nullable=False),
+        sa.Column("shelf_id", sa.String, nullable=True),
+        sa.Column("timestamp", sa.DateTime, server_default=sa.func.now(), nullable=False),
+        indexes=[
+            ("ix_product_detections_id", ["id"]),
+            ("ix_product_detections_product_name", ["product_name"]),
+            ("ix_product_detections_shelf_id", ["shelf_id"]),
+        ],
+    )
+    _create(
+        "stock_aggregate",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("shelf_id", sa.String, nullable=False, server_default=""),
+        sa.Column("count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("last_seen", sa.DateTime, nullable=True),
+        sa.UniqueConstraint("product_name", "shelf_id", name="uq_stock_aggregate_product_shelf"),
+        indexes=[
+            ("ix_stock_aggregate_id", ["id"]),
+            ("ix_stock_aggregate_product_name", ["product_name"]),
+        ],
+    )
+    _create(
+        "planogram",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False, unique=True),
+        sa.Column("shelf_id", sa.String, nullable=False),
+        sa.Column("expected_stock", sa.Integer, nullable=False, server_default="0"),
+        indexes=[("ix_planogram_id", ["id"])],
+    )
+    _create(
+        "stock_snapshots",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("shelf_id", sa.String, nullable=True),
+        sa.Column("snapshot_time", sa.DateTime, server_default=sa.func.now(), nullable=False),
+        indexes=[
+            ("ix_stock_snapshots_id", ["id"]),
+            ("ix_stock_snapshots_product_name", ["product_name"]),
+            ("ix_stock_snapshots_snapshot_time", ["snapshot_time"]),
+        ],
+    )
+    _create(
+        "stock_rollups",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("resolution", sa.String, nullable=False),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("bucket_start", sa.DateTime, nullable=False),
+        sa.Column("min_count", sa.Integer, nullable=False),
+        sa.Column("max_count", sa.Integer, nullable=False),
+        sa.Column("sum_count", sa.Integer, nullable=False),
+        sa.Column("samples", sa.Integer, nullable=False),
+        sa.Column("last_count", sa.Integer, nullable=False),
+        sa.Column("last_time", sa.DateTime, nullable=False),
+        sa.UniqueConstraint("resolution", "product_name", "bucket_start", name="uq_stock_rollups_bucket"),
+        indexes=[
+            ("ix_stock_rollups_id", ["id"]),
+            ("ix_stock_rollups_resolution_bucket", ["resolution", "bucket_start"]),
+        ],
+    )
+    _create(
+        "alerts",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("alert_type", sa.String, nullable=False),
+        sa.Column("message", sa.String, nullable=False),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now(), nullable=False),
+        sa.Column("resolved", sa.Boolean, nullable=False, server_default=sa.false()),
+        indexes=[
+            ("ix_alerts_id", ["id"]),
+            ("ix_alerts_product_name", ["product_name"]),
+        ],
+    )
+
+
+def downgrade() -> None:
+    for name in (
+        "alerts",
+        "stock_rollups",
+        "stock_snapshots",
+        "planogram",
+        "stock_aggregate",
+        "product_detections",
+    ):
+        op.drop_table(name, if_exists=True)
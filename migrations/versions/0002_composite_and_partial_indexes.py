@@ -0,0 +1,117 @@
+"""Composite and partial indexes for the hot read paths.
+
+* ``product_detections (product_name, shelf_id, timestamp)`` makes the
+  stock aggregate rebuild an index-only scan, and ``(shelf_id,
+  product_name)`` serves per-shelf lookups. Together they replace the
+  single-column product_name and shelf_id indexes.
+* ``stock_aggregate (shelf_id, product_name) INCLUDE (count, last_seen)``
+  answers ``/stock/shelf/{id}`` from the index. The single-column
+  product_name index is dropped because the (product_name, shelf_id) unique
+  constraint already covers it.
+* ``stock_snapshots (snapshot_time, id)`` matches the ``/stock/history``
+  keyset order and replaces the snapshot_time index.
+* Partial indexes on ``alerts WHERE resolved = false``: one in the
+  ``/alerts`` order ``(created_at, id)`` and one on
+  ``(product_name, alert_type)`` for the alert engine. They replace the
+  product_name index and the low-selectivity ``resolved`` index from
+  ``init_db.sql``.
+
+On Postgres the indexes are built ``CONCURRENTLY`` outside the migration
+transaction, so ingest keeps writing while they build. Partitioned parents
+don't support that and get a plain build that cascades to each partition.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Must match what ``models.Alert.resolved == false()`` renders on each dialect.
+PG_UNRESOLVED = sa.text("resolved = false")
+SQLITE_UNRESOLVED = sa.text("resolved = 0")
+
+# (name, table, columns, extra create_index kwargs)
+NEW_INDEXES = [
+    ("ix_product_detections_product_shelf", "product_detections", ["product_name", "shelf_id", "timestamp"], {}),
+    ("ix_product_detections_shelf_product", "product_detections", ["shelf_id", "product_name"], {}),
+    (
+        "ix_stock_aggregate_shelf_product",
+        "stock_aggregate",
+        ["shelf_id", "product_name"],
+        {"postgresql_include": ["count", "last_seen"]},
+    ),
+    ("ix_stock_snapshots_time_id", "stock_snapshots", ["snapshot_time", "id"], {}),
+    (
+        "ix_alerts_unresolved_created",
+        "alerts",
+        ["created_at", "id"],
+        {"postgresql_where": PG_UNRESOLVED, "sqlite_where": SQLITE_UNRESOLVED},
+    ),
+    (
+        "ix_alerts_unresolved_product",
+        "alerts",
+        ["product_name", "alert_type"],
+        {"postgresql_where": PG_UNRESOLVED, "sqlite_where": SQLITE_UNRESOLVED},
+    ),
+]
+
+# Indexes superseded by the ones above, under both the names SQLAlchemy's
+# ``index=True`` generated and the names used by ``init_db.sql``.
+OLD_INDEXES = [
+    ("ix_product_detections_product_name", "product_detections", ["product_name"]),
+    ("ix_product_detections_shelf_id", "product_detections", ["shelf_id"]),
+    ("ix_stock_aggregate_product_name", "stock_aggregate", ["product_name"]),
+    ("ix_stock_snapshots_snapshot_time", "stock_snapshots", ["snapshot_time"]),
+    ("ix_alerts_product_name", "alerts", ["product_name"]),
+]
+LEGACY_SQL_INDEXES = [
+    ("idx_product_name", "product_detections"),
+    ("idx_shelf_id", "product_detections"),
+    ("idx_stock_aggregate_product", "stock_aggregate"),
+    ("idx_snapshot_time", "stock_snapshots"),
+    ("idx_alert_product", "alerts"),
+    ("idx_alert_resolved", "alerts"),
+]
+
+
+def _concurrently(table: str) -> dict:
+    """Build without blocking writes on Postgres, except on partitioned parents
+    (see ``backend/partitions.py``), which don't support CONCURRENTLY."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or op.get_context().as_sql:
+        return {"postgresql_concurrently": True} if bind.dialect.name == "postgresql" else {}
+    partitioned = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table"
+        ),
+        {"table": table},
+    ).scalar()
+    return {} if partitioned else {"postgresql_concurrently": True}
+
+
+def upgrade() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in NEW_INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, **kwargs, **_concurrently(table))
+        for name, table, _columns in OLD_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, **_concurrently(table))
+        for name, table in LEGACY_SQL_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, **_concurrently(table))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in OLD_INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, **_concurrently(table))
+        for name, table, _columns, _kwargs in NEW_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, **_concurrently(table))
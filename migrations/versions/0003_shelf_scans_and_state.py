@@ -0,0 +1,154 @@
+"""Shelf scans and current shelf state replace the cumulative stock aggregate.
+
+* ``shelf_scans`` records each capture of a shelf, and
+  ``product_detections.scan_id`` links the raw detections to it.
+* ``shelf_state`` holds each shelf's latest counts.
+
+Existing ``stock_aggregate`` totals carry over as one synthetic scan per
+shelf, so stock reads don't change until each shelf is next scanned. The
+aggregate table is then dropped. Detections ingested before this revision
+keep ``scan_id`` NULL. Tables that already exist (databases built at the
+current schema by ``init_db.sql``, ``init_postgres.py`` or
+``Base.metadata.create_all``) are left alone.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _concurrently(table: str) -> dict:
+    """CONCURRENTLY on Postgres, except for partitioned parents, which don't support it."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return {}
+    if op.get_context().as_sql:
+        return {"postgresql_concurrently": True}
+    partitioned = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table"
+        ),
+        {"table": table},
+    ).scalar()
+    return {} if partitioned else {"postgresql_concurrently": True}
+
+
+def _add_missing_column(table: str, column: sa.Column) -> None:
+    """Add ``column`` unless ``table`` already has it, as a parent made by ``partitions create`` does."""
+    if not op.get_context().as_sql:
+        if column.name in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}:
+            return
+    op.add_column(table, column)
+
+
+def _create(name: str, *columns, indexes=(), **kw) -> bool:
+    """Create table ``name`` and its ``indexes`` unless it exists; returns whether it did."""
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(name):
+        return False
+    op.create_table(name, *columns, **kw)
+    for index_name, index_columns, index_kw in indexes:
+        op.create_index(index_name, name, index_columns, **index_kw)
+    return True
+
+
+def upgrade() -> None:
+    _create(
+        "shelf_scans",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("shelf_id", sa.String, nullable=False),
+        sa.Column("captured_at", sa.DateTime, nullable=False),
+        sa.Column("detection_count", sa.Integer, nullable=False),
+        indexes=[
+            ("ix_shelf_scans_id", ["id"], {}),
+            ("ix_shelf_scans_shelf_captured", ["shelf_id", "captured_at"], {}),
+        ],
+    )
+    created_state = _create(
+        "shelf_state",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("shelf_id", sa.String, nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("last_seen", sa.DateTime, nullable=True),
+        sa.Column("scan_id", sa.Integer, nullable=False),
+        sa.Column("captured_at", sa.DateTime, nullable=False),
+        sa.UniqueConstraint("product_name", "shelf_id", name="uq_shelf_state_product_shelf"),
+        indexes=[
+            ("ix_shelf_state_id", ["id"], {}),
+            (
+                "ix_shelf_state_shelf_product",
+                ["shelf_id", "product_name"],
+                {"postgresql_include": ["count", "last_seen"]},
+            ),
+        ],
+    )
+    _add_missing_column("product_detections", sa.Column("scan_id", sa.Integer, nullable=True))
+
+    if op.get_context().as_sql or sa.inspect(op.get_bind()).has_table("stock_aggregate"):
+        # A shelf_state that predates this revision is already the current state.
+        if created_state:
+            op.execute(
+                "INSERT INTO shelf_scans (shelf_id, captured_at, detection_count) "
+                "SELECT shelf_id, COALESCE(MAX(last_seen), CURRENT_TIMESTAMP), SUM(count) "
+                "FROM stock_aggregate GROUP BY shelf_id"
+            )
+            op.execute(
+                "INSERT INTO shelf_state (product_name, shelf_id, count, last_seen, scan_id, captured_at) "
+                "SELECT a.product_name, a.shelf_id, a.count, a.last_seen, s.id, s.captured_at "
+                "FROM stock_aggregate a JOIN shelf_scans s ON s.shelf_id = a.shelf_id"
+            )
+        op.drop_table("stock_aggregate")
+
+    # Building over the whole detections table; keep ingest writing meanwhile.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_product_detections_scan_id",
+            "product_detections",
+            ["scan_id"],
+            if_not_exists=True,
+            **_concurrently("product_detections"),
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_product_detections_scan_id",
+            table_name="product_detections",
+            if_exists=True,
+            **_concurrently("product_detections"),
+        )
+    op.create_table(
+        "stock_aggregate",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_name", sa.String, nullable=False),
+        sa.Column("shelf_id", sa.String, nullable=False, server_default=""),
+        sa.Column("count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("last_seen", sa.DateTime, nullable=True),
+        sa.UniqueConstraint("product_name", "shelf_id", name="uq_stock_aggregate_product_shelf"),
+    )
+    op.create_index("ix_stock_aggregate_id", "stock_aggregate", ["id"])
+    op.create_index(
+        "ix_stock_aggregate_shelf_product",
+        "stock_aggregate",
+        ["shelf_id", "product_name"],
+        postgresql_include=["count", "last_seen"],
+    )
+    op.execute(
+        "INSERT INTO stock_aggregate (product_name, shelf_id, count, last_seen) "
+        "SELECT product_name, shelf_id, count, last_seen FROM shelf_state"
+    )
+    with op.batch_alter_table("product_detections") as batch:
+        batch.drop_column("scan_id")
+    op.drop_table("shelf_state")
+    op.drop_table("shelf_scans")
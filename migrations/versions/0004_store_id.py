@@ -0,0 +1,43 @@
+"""store_id on detections, snapshots, planogram entries and alerts.
+
+Existing rows belong to the ``default`` store. Each store's data lives in
+its own database or schema (``STORE_SHARDS``), so the column only labels
+rows; no index or constraint includes it. On Postgres 11+ adding a column
+with a constant default doesn't rewrite the table.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLES = ("product_detections", "stock_snapshots", "planogram", "alerts")
+
+
+def _add_missing_column(table: str, column: sa.Column) -> None:
+    """Add ``column`` unless ``table`` already has it, as a parent made by ``partitions create`` does."""
+    if not op.get_context().as_sql:
+        if column.name in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}:
+            return
+    op.add_column(table, column)
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        _add_missing_column(
+            table, sa.Column("store_id", sa.String, nullable=False, server_default="default")
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("store_id")
@@ -0,0 +1,74 @@
+"""At most one open alert per product and type.
+
+The alert engine checks for an open alert before inserting one, so two
+concurrent ingests (or queue flushes in different workers) could both open
+the same ``LOW_STOCK`` / ``OUT_OF_STOCK`` alert. The partial index on
+unresolved ``(product_name, alert_type)`` becomes UNIQUE and the engine
+inserts with ``ON CONFLICT DO NOTHING``.
+
+Duplicates already open are resolved first, keeping the oldest. The unique
+index is built before the plain one is dropped, ``CONCURRENTLY`` on
+Postgres, so the engine's lookup is never left without an index.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# Must match what ``models.Alert.resolved == false()`` renders on each dialect.
+PG_UNRESOLVED = sa.text("resolved = false")
+SQLITE_UNRESOLVED = sa.text("resolved = 0")
+PARTIAL = {"postgresql_where": PG_UNRESOLVED, "sqlite_where": SQLITE_UNRESOLVED}
+
+
+def _concurrently() -> dict:
+    return {"postgresql_concurrently": True} if op.get_bind().dialect.name == "postgresql" else {}
+
+
+def upgrade() -> None:
+    alerts = sa.table(
+        "alerts", sa.column("id"), sa.column("product_name"), sa.column("alert_type"), sa.column("resolved")
+    )
+    oldest = (
+        sa.select(sa.func.min(alerts.c.id))
+        .where(alerts.c.resolved == sa.false())
+        .group_by(alerts.c.product_name, alerts.c.alert_type)
+    )
+    op.execute(
+        alerts.update()
+        .where(alerts.c.resolved == sa.false(), alerts.c.id.not_in(oldest))
+        .values(resolved=True)
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_alerts_unresolved_product",
+            "alerts",
+            ["product_name", "alert_type"],
+            unique=True,
+            if_not_exists=True,
+            **PARTIAL,
+            **_concurrently(),
+        )
+        op.drop_index("ix_alerts_unresolved_product", table_name="alerts", if_exists=True, **_concurrently())
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_alerts_unresolved_product",
+            "alerts",
+            ["product_name", "alert_type"],
+            if_not_exists=True,
+            **PARTIAL,
+            **_concurrently(),
+        )
+        op.drop_index("uq_alerts_unresolved_product", table_name="alerts", if_exists=True, **_concurrently())
@@ -0,0 +1,53 @@
+"""At most one stock snapshot per product and bucket.
+
+Snapshot writers skip buckets a product already has, but with
+``SNAPSHOT_SCHEDULER`` on every API worker ticks, and overlapping ticks
+could each insert the same bucket, doubling the rollup ``samples`` and
+``sum_count``. A unique index on ``(product_name, snapshot_time)`` backs
+the writers' ``ON CONFLICT DO NOTHING``.
+
+Duplicates already written are deleted first, keeping the oldest row; run
+``python -m backend.rollups rebuild`` afterwards to recompute rollups built
+from them. The index is built ``CONCURRENTLY`` on Postgres.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def _concurrently() -> dict:
+    return {"postgresql_concurrently": True} if op.get_bind().dialect.name == "postgresql" else {}
+
+
+def upgrade() -> None:
+    snapshots = sa.table("stock_snapshots", sa.column("id"), sa.column("product_name"), sa.column("snapshot_time"))
+    oldest = sa.select(sa.func.min(snapshots.c.id)).group_by(
+        snapshots.c.product_name, snapshots.c.snapshot_time
+    )
+    op.execute(snapshots.delete().where(snapshots.c.id.not_in(oldest)))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_stock_snapshots_product_time",
+            "stock_snapshots",
+            ["product_name", "snapshot_time"],
+            unique=True,
+            if_not_exists=True,
+            **_concurrently(),
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "uq_stock_snapshots_product_time", table_name="stock_snapshots", if_exists=True, **_concurrently()
+        )
@@ -1,4 +1,8 @@
-"""Mapping from Grozi-120 product codes to readable names and prices."""
+"""Mapping from Grozi-120 product codes to readable names and prices.
+
+The backend reads the catalog from ``product_catalog.csv`` via
+``backend.catalog``; these dictionaries remain as the fallback seed data.
+"""
 
 # This is a mapping of Grozi-120 dataset product IDs to common grocery items
 # The Grozi-120 dataset contains real packaged products from grocery stores
@@ -45,11 +49,12 @@ def get_display_name(grozi_code: str) -> str:
     """Get the display name for a grozi product code."""
     return PRODUCT_NAME_MAP.get(grozi_code, grozi_code)
 
+# Reverse mapping (lowercased display name -> grozi code), built once at import
+_REVERSE_NAME_MAP = {v.lower(): k for k, v in PRODUCT_NAME_MAP.items()}
+
 def get_grozi_code(display_name: str) -> str:
     """Get the grozi code for a display name (reverse lookup)."""
-    # Create reverse mapping
-    reverse_map = {v.lower(): k for k, v in PRODUCT_NAME_MAP.items()}
-    return reverse_map.get(display_name.lower(), display_name)
+    return _REVERSE_NAME_MAP.get(display_name.lower(), display_name)
 
 def get_price(grozi_code: str) -> float:
     """Get the price for a grozi product code."""
@@ -0,0 +1,24 @@
+"""Rebuild the shelf_state table from shelf scans and raw product detections."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from backend.crud import rebuild_shelf_state
+from backend.database import SessionLocal, engine
+from backend.models import Base
+
+# Create tables (including shelf_state on older databases)
+Base.metadata.create_all(bind=engine)
+
+db = SessionLocal()
+
+try:
+    print("Rebuilding shelf_state from shelf_scans and product_detections...")
+    rows = rebuild_shelf_state(db)
+    print(f"✅ Wrote {rows} shelf state rows")
+finally:
+    db.close()
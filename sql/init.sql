@@ -7,15 +7,41 @@ CREATE TABLE IF NOT EXISTS product_detections (
     bbox_x2 DOUBLE PRECISION NOT NULL,
     bbox_y2 DOUBLE PRECISION NOT NULL,
     shelf_id VARCHAR(255),
+    scan_id INTEGER,
+    store_id VARCHAR(255) NOT NULL DEFAULT 'default',
     timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_product_name ON product_detections (product_name);
-CREATE INDEX IF NOT EXISTS idx_shelf_id ON product_detections (shelf_id);
+CREATE INDEX IF NOT EXISTS ix_product_detections_product_shelf ON product_detections (product_name, shelf_id, timestamp);
+CREATE INDEX IF NOT EXISTS ix_product_detections_shelf_product ON product_detections (shelf_id, product_name);
+CREATE INDEX IF NOT EXISTS ix_product_detections_scan_id ON product_detections (scan_id);
+
+CREATE TABLE IF NOT EXISTS shelf_scans (
+    id SERIAL PRIMARY KEY,
+    shelf_id VARCHAR(255) NOT NULL,
+    captured_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    detection_count INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_shelf_scans_shelf_captured ON shelf_scans (shelf_id, captured_at);
+
+CREATE TABLE IF NOT EXISTS shelf_state (
+    id SERIAL PRIMARY KEY,
+    product_name VARCHAR(255) NOT NULL,
+    shelf_id VARCHAR(255) NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    last_seen TIMESTAMP WITHOUT TIME ZONE,
+    scan_id INTEGER NOT NULL,
+    captured_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    CONSTRAINT uq_shelf_state_product_shelf UNIQUE (product_name, shelf_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_shelf_state_shelf_product ON shelf_state (shelf_id, product_name) INCLUDE (count, last_seen);
 
 CREATE TABLE IF NOT EXISTS planogram (
     id SERIAL PRIMARY KEY,
     product_name VARCHAR(255) UNIQUE NOT NULL,
     shelf_id VARCHAR(255) NOT NULL,
-    expected_stock INTEGER NOT NULL DEFAULT 0
+    expected_stock INTEGER NOT NULL DEFAULT 0,
+    store_id VARCHAR(255) NOT NULL DEFAULT 'default'
 );
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from datetime import datetime
+import json
+import os
+import time
+from datetime import datetime, timedelta
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -16,8 +19,10 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from backend import models
-from backend.database import get_db
+from backend.database import get_db, get_read_db
 from backend.main import app
+from backend.planogram import planogram_cache
+from backend.velocity import velocity_cache
 
 SQLALCHEMY_DATABASE_URL = "sqlite+pysqlite:///:memory:"
 engine = create_engine(
@@ -41,12 +46,15 @@ def setup_database():
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     yield db
     db.close()
     transaction.rollback()
     connection.close()
     models.Base.metadata.drop_all(bind=engine)
     app.dependency_overrides.clear()
+    planogram_cache.invalidate()
+    velocity_cache.invalidate()
 
 
 @pytest.fixture()
@@ -102,3 +110,1185 @@ def test_shopping_list_flow(client, setup_database):
     assert milk_item["count"] == 1
     bread_item = next(item for item in items if item["product_name"] == "Bread")
     assert bread_item["stock_level"] == "OUT"
+
+
+def test_stock_is_latest_scan_per_shelf(client, setup_database):
+    client.post(
+        "/detections/",
+        json=[_sample_detection("Cereal", "S1"), _sample_detection("Cereal", "S1"), _sample_detection("Cereal", "S2")],
+    )
+    # A new scan of S1 replaces its count instead of adding to it.
+    client.post("/detections/", json=[_sample_detection("Cereal", "S1")])
+    # S2 now only shows Oats, so Cereal there drops to zero.
+    client.post("/detections/", json=[_sample_detection("Oats", "S2")])
+
+    products = {p["product_name"]: p for p in client.get("/stock/summary").json()["products"]}
+    assert products["Cereal"]["total_count"] == 1
+    assert products["Cereal"]["shelf_breakdown"] == {"S1": 1, "S2": 0}
+    assert products["Oats"]["total_count"] == 1
+    assert client.get("/stock/Cereal").json()["shelf_ids"] == ["S1"]
+
+    # A late upload of an older scan is kept for audit but doesn't change stock.
+    late = {**_sample_detection("Cereal", "S1"), "timestamp": (datetime.utcnow() - timedelta(hours=1)).isoformat()}
+    client.post("/detections/", json=[late] * 5)
+    assert client.get("/stock/Cereal").json()["total_count"] == 1
+
+    scans = client.get("/shelf/S1/scans").json()
+    assert [scan["detection_count"] for scan in scans] == [1, 2, 5]
+    audit = client.get(f"/scans/{scans[-1]['scan_id']}/detections").json()
+    assert len(audit) == 5 and {d["scan_id"] for d in audit} == {scans[-1]["scan_id"]}
+    assert client.get("/scans/999999/detections").status_code == 404
+    assert setup_database.query(models.ShelfState).count() == 3
+
+
+def test_rebuild_shelf_state_matches_ingest(client, setup_database):
+    from backend import crud
+
+    db = setup_database
+    client.post("/detections/", json=[_sample_detection("Milk", "A1"), _sample_detection("Milk", None)])
+    client.post("/detections/", json=[_sample_detection("Eggs", "A1"), _sample_detection("Eggs", "A1")])
+
+    def state():
+        return sorted(
+            (row.product_name, row.shelf_id, row.count, row.scan_id)
+            for row in db.query(models.ShelfState)
+        )
+
+    incremental = state()
+    db.query(models.ShelfState).delete()
+    db.commit()
+
+    assert crud.rebuild_shelf_state(db) == 3
+    assert state() == incremental
+    stock = crud.get_product_stock(db, "Milk")
+    assert stock["total_count"] == 1
+    assert stock["shelf_breakdown"] == {"A1": 0}
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
+
+
+def _seed_products(db, client, count: int, start: int = 0):
+    indices = range(start, start + count)
+    for idx in indices:
+        db.add(models.Planogram(product_name=f"SKU{idx}", shelf_id=f"S{idx % 7}", expected_stock=4))
+    db.commit()
+    client.post("/detections/", json=[_sample_detection(f"SKU{idx}", f"S{idx % 7}") for idx in indices])
+
+
+def test_shopping_list_query_count_is_constant(client, setup_database):
+    _seed_products(setup_database, client, 50)
+    client.post("/shopping-list", json={"items": []})  # load the planogram cache
+
+    with _QueryCounter() as small:
+        client.post("/shopping-list", json={"items": ["SKU0", "SKU1"]})
+    with _QueryCounter() as large:
+        response = client.post("/shopping-list", json={"items": [f"SKU{idx}" for idx in range(50)]})
+
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 50
+    assert large.count == small.count <= 1
+
+
+def test_stock_summary_query_count_is_constant(client, setup_database):
+    _seed_products(setup_database, client, 5)
+    with _QueryCounter() as small:
+        client.get("/stock/summary")
+
+    _seed_products(setup_database, client, 195, start=5)
+    with _QueryCounter() as large:
+        response = client.get("/stock/summary")
+
+    assert len(response.json()["products"]) == 200
+    assert large.count == small.count <= 2
+
+
+def test_put_planogram_upserts_in_bulk_and_refreshes_cache(client, setup_database):
+    client.post("/detections/", json=[_sample_detection(f"SKU{idx}", "S1") for idx in range(3)])
+    entries = [{"product_name": f"SKU{idx}", "shelf_id": "A1", "expected_stock": 2} for idx in range(3)]
+    response = client.put("/planogram", json=entries + [{"product_name": "SKU0", "shelf_id": "B1", "expected_stock": 5}])
+    assert response.json() == {"upserted": 3}
+
+    products = {p["product_name"]: p for p in client.get("/stock/summary").json()["products"]}
+    assert (products["SKU0"]["shelf_id"], products["SKU0"]["stock_level"]) == ("B1", "LOW")
+    assert (products["SKU1"]["shelf_id"], products["SKU1"]["stock_level"]) == ("A1", "MEDIUM")
+
+    # Served from the cache until the next planogram write commits.
+    with _QueryCounter() as cached:
+        client.get("/stock/summary")
+    assert cached.count == 1
+    client.put("/planogram", json=[{"product_name": "SKU1", "shelf_id": "C1", "expected_stock": 1}])
+    items = client.post("/shopping-list", json={"items": ["SKU1"]}).json()["items"]
+    assert (items[0]["shelf_id"], items[0]["stock_level"]) == ("C1", "HIGH")
+    assert setup_database.query(models.Planogram).count() == 3
+
+
+def test_store_routes_read_and_write_their_own_shard(tmp_path, monkeypatch):
+    from backend import database, main
+    from backend.database import StoreRouter
+    from backend.events import stock_events
+
+    default_engine = create_engine(f"sqlite:///{tmp_path / 'default.db'}")
+    router = StoreRouter(
+        sessionmaker(bind=default_engine, autoflush=False), {"north": f"sqlite:///{tmp_path / 'north.db'}"}
+    )
+    north_engine = router.shard("north").engine
+    for shard_engine in (default_engine, north_engine):
+        models.Base.metadata.create_all(shard_engine)
+    monkeypatch.setattr(database, "stores", router)
+    monkeypatch.setattr(main, "stores", router)
+    app.dependency_overrides.pop(get_db)
+    app.dependency_overrides.pop(get_read_db)
+    client = TestClient(app)
+
+    seq = stock_events.last_seq
+    client.post("/stores/north/detections/", json=[_sample_detection("Milk", "A1")] * 2)
+    client.put("/stores/north/planogram", json=[{"product_name": "Milk", "shelf_id": "A1", "expected_stock": 10}])
+    client.post("/detections/", json=[_sample_detection("Bread", "B1")])
+
+    north = client.get("/stores/north/stock/summary")
+    assert [(p["product_name"], p["stock_level"]) for p in north.json()["products"]] == [("Milk", "LOW")]
+    assert "ETag" in north.headers
+    assert [p["product_name"] for p in client.get("/stock/summary").json()["products"]] == ["Bread"]
+    assert client.get("/stores/north/alerts").json()[0]["product_name"] == "Milk"
+    assert {e["store_id"] for e in stock_events.since(seq) if e["product_name"] == "Milk"} == {"north"}
+    with sessionmaker(bind=north_engine)() as db:
+        for model in (models.ProductDetection, models.Planogram, models.Alert):
+            assert {row.store_id for row in db.query(model)} == {"north"}
+
+    assert client.get("/stores/south/stock/summary").status_code == 404
+    assert [s["store_id"] for s in client.get("/stores").json()["stores"]] == ["default", "north"]
+    north_engine.dispose()
+    default_engine.dispose()
+
+
+def test_read_replicas_round_robin_with_health_and_lag_fallback(tmp_path, monkeypatch):
+    from backend import database, main
+    from backend.database import ReplicaSet, StoreRouter
+
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    models.Base.metadata.create_all(primary)
+    replica_set = ReplicaSet(
+        [f"sqlite:///{tmp_path / 'r1.db'}", f"sqlite:///{tmp_path / 'r2.db'}"], max_lag=5, check_interval=0
+    )
+    for replica in replica_set.replicas:
+        models.Base.metadata.create_all(replica.engine)
+    with replica_set.replicas[0].sessions() as db:
+        db.add(models.Planogram(product_name="OnReplica", shelf_id="R1", expected_stock=4))
+        db.commit()
+    assert [replica_set.choose() for _ in range(4)] == replica_set.replicas * 2
+
+    # Lagging replicas are skipped; with none left, reads go to the primary.
+    lags = {replica_set.replicas[0].name: 30.0, replica_set.replicas[1].name: 1.0}
+    monkeypatch.setattr(database, "replication_lag", lambda connection: lags[str(connection.engine.url)])
+    assert {replica_set.choose() for _ in range(3)} == {replica_set.replicas[1]}
+    lags[replica_set.replicas[1].name] = 30.0
+    assert replica_set.choose() is None
+    assert replica_set.stats()["fallbacks_total"] == 1
+
+    lags[replica_set.replicas[0].name] = 0.0
+    monkeypatch.setattr(database, "stores", StoreRouter(sessionmaker(bind=primary), {}))
+    monkeypatch.setattr(database, "replicas", replica_set)
+    monkeypatch.setattr(main, "replicas", replica_set)
+    app.dependency_overrides.pop(get_read_db)
+    planogram_cache.invalidate()
+    client = TestClient(app)
+    items = client.post("/shopping-list", json={"items": ["OnReplica"]}).json()["items"]
+    assert items[0]["shelf_id"] == "R1"
+    assert client.get("/metrics/pool").json()["replicas"]["replicas"][0]["lag_seconds"] == 0.0
+
+    # Versioned reads stay on the primary until a replica must have caught up with the last write,
+    # so a lagging body is never cached under the newer ETag.
+    with replica_set.replicas[0].sessions() as db:
+        db.add(
+            models.ShelfState(product_name="OnReplica", shelf_id="R1", count=3, scan_id=1, captured_at=datetime.utcnow())
+        )
+        db.commit()
+    monkeypatch.setattr(main.data_version, "changed_at", lambda: time.time())
+    assert client.get("/stock/summary").json()["products"] == []
+    monkeypatch.setattr(main.data_version, "changed_at", lambda: time.time() - 10)
+    assert [p["product_name"] for p in client.get("/stock/summary").json()["products"]] == ["OnReplica"]
+
+    # An unreachable replica fails its check and is taken out of rotation.
+    broken = ReplicaSet([f"sqlite:///{tmp_path / 'missing' / 'r.db'}"], check_interval=0)
+    assert broken.choose() is None and not broken.replicas[0].healthy
+    for engine_ in (primary, *(r.engine for r in replica_set.replicas)):
+        engine_.dispose()
+
+
+def test_create_detections_returns_rows_in_input_order(client):
+    payload = [_sample_detection(f"SKU{idx}", "S1") for idx in range(25)]
+    response = client.post("/detections/", json=payload)
+    assert response.status_code == 200
+    rows = response.json()
+    assert [row["product_name"] for row in rows] == [item["product_name"] for item in payload]
+    assert len({row["id"] for row in rows}) == 25
+
+
+def test_create_detections_return_minimal(client):
+    payload = [_sample_detection("Cereal", "S1") for _ in range(3)]
+    response = client.post("/detections/", json=payload, headers={"Prefer": "return=minimal"})
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 3}
+    assert response.headers["Preference-Applied"] == "return=minimal"
+    assert client.get("/stock/Cereal").json()["total_count"] == 3
+
+
+def test_create_detections_normalizes_timezone_aware_timestamps(client):
+    naive = _sample_detection("Milk", "A1")
+    naive["timestamp"] = "2026-10-17T00:00:00"
+    assert client.post("/detections/", json=[naive]).status_code == 200
+
+    # Offsets (JS toISOString()'s "Z") after a naive scan, and mixed in one payload.
+    aware = _sample_detection("Milk", "A1")
+    aware["timestamp"] = "2026-10-17T03:00:00+02:00"
+    response = client.post("/detections/", json=[aware])
+    assert response.status_code == 200
+    assert response.json()[0]["timestamp"] == "2026-10-17T01:00:00"
+    mixed = [dict(naive, timestamp="2026-10-17T02:00:00"), dict(aware, timestamp="2026-10-17T02:30:00Z")]
+    assert client.post("/detections/", json=mixed).status_code == 200
+    assert client.get("/stock/Milk").json()["last_seen"] == "2026-10-17T02:30:00"
+
+
+def _test_queue(db, **kwargs):
+    from backend.ingest_queue import IngestQueue
+
+    sessions = sessionmaker(bind=db.get_bind(), autoflush=False)
+    return IngestQueue(lambda store_id: sessions(), **kwargs)
+
+
+def test_ingest_queue_flushes_in_batches_and_on_stop(setup_database):
+    from backend import crud
+    from backend.schemas import DetectionCreate
+
+    queue = _test_queue(setup_database, batch_size=2, flush_interval=60)
+    queue.start()
+    # Each request stays its own scan, so five shelves hold one Milk each.
+    for shelf in range(5):
+        queue.enqueue([DetectionCreate(**_sample_detection("Milk", f"A{shelf}"))])
+    queue.stop()
+
+    stats = queue.stats()
+    assert stats["depth"] == 0
+    assert stats["flushed_total"] == 5
+    assert stats["flush_count"] == 3
+    assert crud.get_product_stock(setup_database, "Milk")["total_count"] == 5
+
+
+def test_ingest_queue_isolates_and_dead_letters_failing_uploads(setup_database, monkeypatch):
+    from backend import crud
+    from backend.schemas import DetectionCreate
+
+    bulk_create_uploads = crud.bulk_create_uploads
+
+    def failing_on_poison(db, uploads, **kwargs):
+        if any(d.product_name == "Poison" for upload in uploads for d in upload):
+            raise ValueError("bad upload")
+        return bulk_create_uploads(db, uploads, **kwargs)
+
+    monkeypatch.setattr(crud, "bulk_create_uploads", failing_on_poison)
+    queue = _test_queue(setup_database, batch_size=10, max_attempts=2, retry_backoff=60)
+    for product in ("Milk", "Poison", "Eggs"):
+        queue.enqueue([DetectionCreate(**_sample_detection(product, "A1"))])
+
+    # The batch fails, but retrying upload by upload still writes the good ones.
+    assert queue.flush() == 2
+    stats = queue.stats()
+    assert (stats["depth"], stats["failed_flushes"], stats["dead_lettered_uploads"]) == (1, 2, 0)
+    assert stats["retry_in_seconds"] > 0
+    # While backing off, the failing upload is not retried.
+    assert queue.flush() == 0
+    assert queue.stats()["failed_flushes"] == 2
+
+    # Its last attempt (the final flush on stop ignores the backoff) dead-letters it.
+    queue.stop()
+    stats = queue.stats()
+    assert (stats["depth"], stats["failed_flushes"], stats["dead_lettered_uploads"]) == (0, 3, 1)
+    assert queue.dead_letters[0][1][0].product_name == "Poison"
+    assert crud.get_product_stock(setup_database, "Eggs")["total_count"] == 1
+
+
+def test_ingest_queue_stamps_untimed_uploads_when_accepted(setup_database):
+    from backend.schemas import DetectionCreate
+
+    queue = _test_queue(setup_database, batch_size=10)
+    untimed = {**_sample_detection("Milk", "A1"), "timestamp": None}
+    before = datetime.utcnow()
+    queue.enqueue([DetectionCreate(**untimed)] * 2)
+    after = datetime.utcnow()
+    # A newer upload of the same shelf is flushed first, e.g. after a retry backoff.
+    queue.enqueue([DetectionCreate(**_sample_detection("Eggs", "A1"))])
+    time.sleep(0.01)
+    queue._items.rotate(1)
+    assert queue.flush() == 3
+
+    scans = setup_database.query(models.ShelfScan).order_by(models.ShelfScan.captured_at).all()
+    assert before <= scans[0].captured_at <= after
+    # The later upload stays the shelf's current scan.
+    shelf = {row.product_name: row.count for row in setup_database.query(models.ShelfState)}
+    assert shelf.get("Milk", 0) == 0 and shelf["Eggs"] == 1
+
+
+def test_create_detections_queue_mode_applies_backpressure(client, setup_database, monkeypatch):
+    from backend import main
+
+    queue = _test_queue(setup_database, max_size=3, batch_size=10)
+    monkeypatch.setattr(main, "ingest_queue", queue)
+
+    accepted = client.post("/detections/", json=[_sample_detection("Milk", "A1")] * 2)
+    assert accepted.status_code == 202
+    assert accepted.json() == {"queued": 2, "queue_depth": 2}
+
+    rejected = client.post("/detections/", json=[_sample_detection("Milk", "A1")] * 2)
+    assert rejected.status_code == 429
+    assert "Retry-After" in rejected.headers
+
+    assert client.get("/stock/Milk").status_code == 404
+    assert queue.flush() == 2
+    assert client.get("/stock/Milk").json()["total_count"] == 2
+    assert client.get("/ingest/stats").json()["queue"]["rejected_total"] == 2
+
+
+def test_async_read_endpoints_match_sync_payloads(tmp_path):
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from backend import async_api, crud
+    from backend.database import get_async_db, to_async_url
+    from backend.schemas import AlertCreate, DetectionCreate
+
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url)
+    models.Base.metadata.create_all(bind=sync_engine)
+    with sessionmaker(bind=sync_engine)() as db:
+        crud.bulk_create_detections(
+            db,
+            [DetectionCreate(**_sample_detection("Milk", shelf)) for shelf in ("A1", "A1", "B2")],
+            evaluate_alerts=False,
+        )
+        crud.create_alert(db, AlertCreate(product_name="Milk", alert_type="LOW_STOCK", message="low"))
+        expected_stock = crud.get_stock_counts(db)
+
+    async_engine = create_async_engine(to_async_url(url))
+    AsyncSessionTest = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionTest() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(async_api.router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    with TestClient(async_app) as async_client:
+        products = async_client.get("/stock/summary").json()["products"]
+        shelf = async_client.get("/shelf/A1").json()
+        alerts = async_client.get("/alerts").json()
+        streamed = async_client.get("/alerts", params={"format": "ndjson"}).text.splitlines()
+
+    assert [(p["product_name"], p["total_count"], p["shelf_breakdown"]) for p in products] == [
+        (e["product_name"], e["total_count"], e["shelf_breakdown"]) for e in expected_stock
+    ]
+    assert shelf["products"][0]["total_count"] == 2
+    assert [alert["alert_type"] for alert in alerts] == ["LOW_STOCK"]
+    assert [json.loads(line)["id"] for line in streamed] == [alerts[0]["id"]]
+    sync_engine.dispose()
+
+
+def test_to_async_url_swaps_driver():
+    from backend.database import to_async_url
+
+    assert to_async_url("postgresql://user:pw@db:5432/omnishelf") == "postgresql+asyncpg://user:pw@db:5432/omnishelf"
+    assert to_async_url("sqlite+pysqlite:///./omnishelf.db") == "sqlite+aiosqlite:///./omnishelf.db"
+
+
+def test_pool_metrics_track_overflow_and_timeouts(tmp_path):
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+    from backend.database import create_db_engine, pool_stats
+
+    pool_engine = create_db_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=1, pool_timeout=0.05
+    )
+    first = pool_engine.connect()
+    second = pool_engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        pool_engine.connect()
+
+    stats = pool_stats(pool_engine)
+    assert stats["checked_out"] == 2
+    assert stats["checkouts_total"] == 2
+    assert stats["overflow_checkouts_total"] == 1
+    assert stats["timeouts_total"] == 1
+    assert stats["wait_ms_max"] >= 50
+
+    first.close()
+    second.close()
+    assert pool_stats(pool_engine)["checked_out"] == 0
+    pool_engine.dispose()
+
+
+def _metric(text: str, sample: str) -> float:
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(sample + " "))
+
+
+def test_request_metrics_prometheus_and_server_timing(client, monkeypatch):
+    from backend.config import settings
+
+    client.post("/detections/", json=[_sample_detection("Milk", "A1"), _sample_detection("Eggs", "A2")])
+    labels = '{method="GET",route="/stock/summary"}'
+    before = client.get("/metrics").text
+
+    monkeypatch.setattr(settings, "server_timing", True)
+    with _QueryCounter() as queries:
+        response = client.get("/stock/summary")
+    timing = dict(part.split(";", 1) for part in response.headers["Server-Timing"].split(", "))
+    assert f'desc="{queries.count} queries"' in timing["db"]
+    assert set(timing) == {"db", "serialize", "app", "total"}
+
+    after = client.get("/metrics")
+    assert after.headers["content-type"].startswith("text/plain; version=0.0.4")
+    count = 'http_request_duration_seconds_count{method="GET",route="/stock/summary",status="200"}'
+    assert _metric(after.text, count) == _metric(before, count) + 1
+    assert _metric(after.text, f"http_request_db_queries_sum{labels}") - _metric(
+        before, f"http_request_db_queries_sum{labels}"
+    ) == queries.count
+    assert "# TYPE http_request_db_seconds histogram" in after.text
+    # Unrouted paths share one series instead of one per URL.
+    client.get("/no/such/path")
+    assert 'route="<unmatched>",status="404"' in client.get("/metrics").text
+
+
+def test_profiler_writes_collapsed_stacks_for_token_and_sampled_requests(client, tmp_path):
+    from backend.profiling import Profiler, ProfilingMiddleware, StackSampler
+
+    def busy_handler():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    sampler = StackSampler(0.001)
+    sampler.start()
+    busy_handler()
+    sampler.stop()
+    assert sampler.samples > 0
+    lines = sampler.collapsed().splitlines()
+    assert any("busy_handler (test_api.py:" in line and line.startswith("MainThread;") for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    profiler = Profiler(str(tmp_path), token="s3cret", interval=0.001, max_files=2)
+    profiled = TestClient(ProfilingMiddleware(app, profiler))
+    # Without the right token nothing is profiled.
+    assert "X-Profile-File" not in profiled.get("/stock/summary", headers={"X-Profile": "guess"}).headers
+    assert list(tmp_path.iterdir()) == []
+
+    response = profiled.get("/stock/summary", headers={"X-Profile": "s3cret"})
+    assert response.status_code == 200
+    name = response.headers["X-Profile-File"]
+    assert "-GET-stock_summary-" in name and (tmp_path / name).exists()
+
+    # Sampled requests are profiled too, without telling the client; old profiles are pruned.
+    profiler.token, profiler.sample_rate = "", 1.0
+    for _ in range(2):
+        assert "X-Profile-File" not in profiled.get("/stock/summary").headers
+    assert len(list(tmp_path.glob("*.folded"))) == 2
+
+
+def test_pool_metrics_endpoint(client):
+    body = client.get("/metrics/pool").json()
+    assert body["config"]["pool_size"] >= 1
+    assert "primary" in body
+
+
+def test_sqlite_partitions_seal_closed_periods_and_snapshot_expired(client, setup_database):
+    from datetime import timedelta
+
+    from backend import partitions
+
+    db = setup_database
+    now = datetime(2026, 10, 17, 12, 0)
+    expired = datetime(2026, 9, 7)
+
+    def scan(at, shelf_id, *products):
+        payload = [{**_sample_detection(p, shelf_id), "timestamp": at.isoformat()} for p in products]
+        client.post("/detections/", json=payload)
+
+    # Three scans of the same two Milk, so the stock stays 2 however often it is scanned.
+    for hour in (9, 10, 11):
+        scan(expired + timedelta(hours=hour), "A1", "Milk", "Milk")
+    scan(expired + timedelta(hours=9, minutes=30), "B2", "Eggs")
+    scan(now - timedelta(days=2), "A1", "Milk")
+    scan(now, "A1", "Milk")
+
+    result = partitions.run_maintenance(db, now=now)
+    assert result["sealed"] == ["product_detections_p20260907", "product_detections_p20261015"]
+    assert result["rolled_up_and_dropped"] == ["product_detections_p20260907"]
+    assert [p.name for p in partitions.list_partitions(db)] == ["product_detections_p20261015"]
+
+    # Only the open period stays in the live table.
+    assert db.query(models.ProductDetection).count() == 1
+    # The expired day keeps hourly snapshots of its stock from the first scan on.
+    snapshots = db.query(models.StockSnapshot).filter(models.StockSnapshot.snapshot_time < expired + timedelta(days=1))
+    by_product = {}
+    for s in snapshots:
+        by_product.setdefault(s.product_name, set()).add((s.count, s.shelf_id))
+    assert by_product == {"Milk": {(2, "A1")}, "Eggs": {(1, "B2")}}
+    assert snapshots.filter(models.StockSnapshot.product_name == "Milk").count() == 15
+    daily = db.query(models.StockRollup).filter_by(resolution="day", product_name="Milk", bucket_start=expired).one()
+    assert (daily.max_count, daily.last_count) == (2, 2)
+
+
+def test_sealed_sqlite_periods_stay_visible_to_audit_readers(client, setup_database):
+    from backend import crud, partitions, snapshots
+
+    db = setup_database
+    day = datetime(2026, 10, 1, 10)
+    for products, hours in ((["Milk", "Milk", "Eggs"], 0), (["Milk"], 1)):
+        stamp = (day + timedelta(hours=hours)).isoformat()
+        client.post("/detections/", json=[{**_sample_detection(p, "A1"), "timestamp": stamp} for p in products])
+    scan_id = db.query(models.ShelfScan).order_by(models.ShelfScan.id).first().id
+    state = sorted((r.product_name, r.count) for r in db.query(models.ShelfState))
+
+    assert [p.name for p in partitions.seal_closed_periods(db, now=day + timedelta(days=2))] == [
+        "product_detections_p20261001"
+    ]
+    assert db.query(models.ProductDetection).count() == 0
+    assert crud.rebuild_shelf_state(db) == 2
+    assert state == [("Eggs", 0), ("Milk", 1)]
+    assert sorted((r.product_name, r.count) for r in db.query(models.ShelfState)) == state
+    assert [d["product_name"] for d in client.get(f"/scans/{scan_id}/detections").json()] == ["Milk", "Milk", "Eggs"]
+    assert snapshots.backfill(db, day, day + timedelta(hours=1), now=day + timedelta(days=2), interval=3600) == 2
+    assert sorted((s.product_name, s.count) for s in db.query(models.StockSnapshot)) == [("Eggs", 1), ("Milk", 2)]
+
+
+def _rollup_rows(db):
+    return sorted(
+        (r.resolution, r.product_name, r.bucket_start, r.min_count, r.max_count, r.sum_count, r.samples, r.last_count)
+        for r in db.query(models.StockRollup)
+    )
+
+
+def test_stock_history_served_from_incremental_rollups(client, setup_database, monkeypatch):
+    from datetime import timedelta
+
+    from backend import rollups
+
+    db = setup_database
+    today = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    yesterday = today - timedelta(days=1)
+    rollups.record_snapshots(
+        db,
+        [
+            {"product_name": "Milk", "count": 10, "snapshot_time": yesterday + timedelta(minutes=5)},
+            {"product_name": "Milk", "count": 4, "snapshot_time": yesterday + timedelta(minutes=50)},
+        ],
+    )
+    rollups.record_snapshots(db, [{"product_name": "Milk", "count": 7, "snapshot_time": today + timedelta(minutes=1)}])
+
+    day_key = yesterday.strftime("%Y-%m-%d")
+    hour_key = yesterday.strftime("%Y-%m-%d %H:00")
+    daily = client.get("/analytics/stock-history", params={"days": 7}).json()["history"]["Milk"]
+    assert daily[day_key] == 4
+    hourly = client.get(
+        "/analytics/stock-history", params={"days": 2, "resolution": "hour", "stat": "max"}
+    ).json()["history"]["Milk"]
+    assert hourly[hour_key] == 10
+    averaged = client.get(
+        "/analytics/stock-history", params={"days": 2, "stat": "avg"}
+    ).json()["history"]["Milk"]
+    assert averaged[hour_key] == 7.0
+    assert client.get("/analytics/stock-history", params={"resolution": "minute"}).status_code == 422
+
+    incremental = _rollup_rows(db)
+    assert rollups.rebuild_rollups(db) == len(incremental)
+    assert _rollup_rows(db) == incremental
+
+    # Snapshots are UTC, so the window must not shift with the server's timezone.
+    recent = datetime.utcnow() - timedelta(hours=20)
+    rollups.record_snapshots(db, [{"product_name": "Eggs", "count": 2, "snapshot_time": recent}])
+    monkeypatch.setenv("TZ", "Etc/GMT-12")
+    time.tzset()
+    try:
+        history = client.get("/analytics/stock-history", params={"days": 1, "resolution": "hour"}).json()["history"]
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert "Eggs" in history
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="set TEST_POSTGRES_URL to run against Postgres")
+def test_postgres_default_partition_rows_are_moved_and_expired():
+    import uuid
+
+    from sqlalchemy.orm import Session
+
+    from backend import partitions
+
+    url = os.environ["TEST_POSTGRES_URL"]
+    schema = f"test_partitions_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(url)
+    with admin.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+    pg = create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        with Session(pg) as db:
+            partitions.create_partitioned_table(db)
+            models.Base.metadata.create_all(pg)
+            old, late = datetime(2026, 8, 1, 10), datetime(2026, 9, 1, 10)
+            for scan_id, at in ((1, old), (2, late)):
+                db.add(models.ShelfScan(id=scan_id, shelf_id="A1", captured_at=at, detection_count=2))
+                db.add_all(
+                    models.ProductDetection(
+                        product_name="Milk", confidence=0.9, bbox_x1=0, bbox_y1=0, bbox_x2=1, bbox_y2=1,
+                        shelf_id="A1", timestamp=at, scan_id=scan_id,
+                    )
+                    for _ in range(2)
+                )
+            db.commit()
+
+            def rows(name):
+                return db.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+
+            # Both periods' rows landed in DEFAULT; creating 2026-09-01 moves its rows over.
+            created = partitions.ensure_partitions(db, late, late + timedelta(hours=1))
+            assert [p.name for p in created] == ["product_detections_p20260901"]
+            assert (rows("product_detections_p20260901"), rows(partitions.DEFAULT_PARTITION)) == (2, 2)
+
+            dropped = partitions.apply_retention(db, now=datetime(2026, 9, 20), retention_days=30)
+            assert [p.name for p in dropped] == [partitions.DEFAULT_PARTITION]
+            assert (rows("product_detections_p20260901"), rows(partitions.DEFAULT_PARTITION)) == (2, 0)
+            snapshot = db.query(models.StockSnapshot).filter_by(snapshot_time=old).one()
+            assert (snapshot.product_name, snapshot.count) == ("Milk", 2)
+    finally:
+        pg.dispose()
+        with admin.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def test_snapshots_backfill_scan_history_and_tick_idempotently(client, setup_database):
+    from backend import snapshots
+
+    db = setup_database
+    day = datetime(2026, 10, 1)
+
+    def scan(shelf_id, at, *products):
+        stamp = (day + at).isoformat()
+        client.post("/detections/", json=[{**_sample_detection(p, shelf_id), "timestamp": stamp} for p in products])
+
+    scan("S1", timedelta(hours=10, minutes=15), "Milk", "Milk", "Milk", "Eggs")
+    scan("S2", timedelta(hours=10, minutes=30), "Milk", "Milk")
+    scan("S1", timedelta(hours=12, minutes=20), "Milk")
+
+    now = day + timedelta(days=1, hours=9, minutes=30)
+    assert snapshots.backfill(db, day + timedelta(hours=10), day + timedelta(hours=13), now=now, interval=3600) == 6
+    rows = sorted((s.snapshot_time.hour, s.product_name, s.count, s.shelf_id) for s in db.query(models.StockSnapshot))
+    assert rows == [
+        (10, "Eggs", 1, "S1"), (10, "Milk", 5, "S1"),
+        (11, "Eggs", 1, "S1"), (11, "Milk", 5, "S1"),
+        (12, "Eggs", 0, None), (12, "Milk", 3, "S1"),
+    ]
+    assert snapshots.backfill(db, day, day + timedelta(hours=13), now=now, interval=3600) == 0
+
+    assert snapshots.take_snapshot(db, now=now, interval=3600) == 2
+    assert snapshots.take_snapshot(db, now=now + timedelta(minutes=20), interval=3600) == 0
+    latest = db.query(models.StockSnapshot).filter(models.StockSnapshot.snapshot_time == now.replace(minute=0))
+    assert sorted((s.product_name, s.count) for s in latest) == [("Eggs", 0), ("Milk", 3)]
+    daily = {
+        (r.product_name, r.bucket_start): (r.max_count, r.last_count, r.samples)
+        for r in db.query(models.StockRollup).filter(models.StockRollup.resolution == "day")
+    }
+    assert daily[("Milk", day)] == (5, 3, 3)
+
+
+def test_racing_snapshot_ticks_write_each_bucket_once(client, setup_database, monkeypatch):
+    from sqlalchemy import false, literal, select
+
+    from backend import snapshots
+
+    client.post("/detections/", json=[_sample_detection("Milk", "S1")] * 2)
+    now = datetime(2026, 10, 2, 9, 30)
+    assert snapshots.take_snapshot(setup_database, now=now, interval=3600) == 1
+    # A tick in another worker that checked before this one's snapshot was visible.
+    monkeypatch.setattr(snapshots, "exists", lambda: select(literal(1)).where(false()).exists())
+    assert snapshots.take_snapshot(setup_database, now=now, interval=3600) == 0
+    assert setup_database.query(models.StockSnapshot).count() == 1
+    hourly = setup_database.query(models.StockRollup).filter(models.StockRollup.resolution == "hour").one()
+    assert (hourly.samples, hourly.sum_count) == (1, 2)
+
+
+def test_velocity_rates_trends_and_stockout_cached_per_snapshot_version(client, setup_database):
+    from backend import rollups
+
+    db = setup_database
+    today = datetime.utcnow().replace(hour=0, minute=30, second=0, microsecond=0)
+    series = {"Milk": [10, 8, 6, 4], "Eggs": [3, 5, 7, 7], "Bread": [5, 5, 5, 5]}
+    rollups.record_snapshots(
+        db,
+        [
+            {"product_name": name, "count": count, "snapshot_time": today - timedelta(days=3 - day)}
+            for name, counts in series.items()
+            for day, count in enumerate(counts)
+        ],
+    )
+
+    body = client.get("/analytics/velocity", params={"days": 7, "window": 3}).json()
+    assert body["resolution"] == "day"
+    products = {p["product_name"]: p for p in body["products"]}
+    assert [p["product_name"] for p in body["products"]] == ["Eggs", "Bread", "Milk"]
+    milk = products["Milk"]
+    assert (milk["current_count"], milk["change"], milk["change_percent"]) == (4, -6, -60.0)
+    assert (milk["rate_per_day"], milk["trend"], milk["days_until_stockout"]) == (-2.0, "down", 2.0)
+    # Projected from the latest snapshot, not from the start of its bucket.
+    assert milk["stockout_at"] == (today + timedelta(days=2)).isoformat()
+    assert (products["Eggs"]["trend"], products["Eggs"]["recent_rate_per_day"]) == ("up", 1.0)
+    assert products["Bread"]["trend"] == "stable" and products["Bread"]["stockout_at"] is None
+    assert body["highlights"]["biggest_decrease"]["product_name"] == "Milk"
+
+    # Served from cache until a new snapshot changes the version.
+    with _QueryCounter() as cached:
+        client.get("/analytics/velocity", params={"days": 7, "window": 3})
+    assert cached.count == 1
+    rollups.record_snapshots(db, [{"product_name": "Milk", "count": 0, "snapshot_time": today + timedelta(hours=1)}])
+    body = client.get("/analytics/velocity", params={"days": 7, "window": 3}).json()
+    assert body["highlights"]["biggest_decrease"]["current_count"] == 0
+    assert client.get("/analytics/velocity", params={"window": 1}).status_code == 422
+
+
+def test_stock_history_keyset_pages_and_ndjson_stream(client, setup_database):
+    from backend import rollups
+
+    base = datetime(2024, 3, 1, 12, 0)
+    # Two snapshots share every timestamp so paging must break ties on id.
+    rollups.record_snapshots(
+        setup_database,
+        [
+            {"product_name": f"P{i % 2}", "count": i, "shelf_id": "A1",
+             "snapshot_time": base + timedelta(minutes=i // 2)}
+            for i in range(7)
+        ],
+    )
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/stock/history", params=params)
+        assert response.status_code == 200
+        seen.extend(row["id"] for row in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 7
+
+    streamed = client.get("/stock/history", headers={"Accept": "application/x-ndjson"})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in streamed.text.splitlines()] == seen
+
+    recent = client.get(
+        "/stock/history", params={"since": (base + timedelta(minutes=3)).isoformat()}
+    ).json()
+    assert [row["count"] for row in recent] == [6]
+    assert client.get("/stock/history", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_alerts_paginate_newest_first(client):
+    ids = [
+        client.post(
+            "/alerts", json={"product_name": f"P{i}", "alert_type": "LOW_STOCK", "message": "low"}
+        ).json()["id"]
+        for i in range(5)
+    ]
+    first = client.get("/alerts", params={"limit": 2})
+    second = client.get("/alerts", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    rest = client.get("/alerts", params={"limit": 2, "cursor": second.headers["X-Next-Cursor"]})
+
+    paged = [alert["id"] for page in (first, second, rest) for alert in page.json()]
+    assert paged == ids[::-1]
+    assert "X-Next-Cursor" not in rest.headers
+
+
+def test_etag_conditional_get_and_version_bumps(client):
+    first = client.get("/stock/summary")
+    etag = first.headers["ETag"]
+    assert client.get("/stock/summary", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/stock", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/detections/", json=[_sample_detection()])
+    refreshed = client.get("/stock/summary", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+    assert refreshed.json()["products"][0]["total_count"] == 1
+
+    etag = refreshed.headers["ETag"]
+    client.post("/alerts", json={"product_name": "Soup", "alert_type": "LOW_STOCK", "message": "low"})
+    assert client.get("/alerts", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_data_version_ignores_rollback_and_shares_via_file(tmp_path):
+    from sqlalchemy.orm import Session
+
+    from backend import versioning
+
+    before = versioning.data_version.current()
+    with Session() as db:
+        db.begin()
+        versioning.mark_changed(db)
+        db.rollback()
+        db.commit()
+    assert versioning.data_version.current() == before
+
+    path = str(tmp_path / "data.version")
+    writer, reader = versioning.DataVersion(path), versioning.DataVersion(path)
+    tag = reader.etag()
+    writer.bump()
+    assert reader.etag() != tag
+    assert versioning.etag_matches(f'"x", {reader.etag()}', reader.etag())
+
+
+def test_stream_stock_websocket_resumes_from_sequence(client, monkeypatch):
+    from backend.config import settings
+    from backend.events import stock_events
+
+    monkeypatch.setattr(settings, "alert_engine", False)
+
+    start = stock_events.last_seq
+    client.post("/detections/", json=[_sample_detection("Milk", "B2"), _sample_detection("Milk", "B2")])
+
+    with client.websocket_connect(f"/stream/stock?since={start}") as ws:
+        missed = ws.receive_json()
+        assert (missed["type"], missed["product_name"], missed["shelf_id"], missed["delta"]) == (
+            "stock", "Milk", "B2", 2,
+        )
+        alert = client.post(
+            "/alerts", json={"product_name": "Milk", "alert_type": "LOW_STOCK", "message": "low"}
+        ).json()
+        live = ws.receive_json()
+        assert (live["type"], live["action"], live["alert_id"]) == ("alert", "created", alert["id"])
+        assert live["seq"] == missed["seq"] + 1
+
+    with client.websocket_connect("/stream/stock?since=999999999") as ws:
+        assert ws.receive_json()["type"] == "reset"
+
+
+def test_stock_event_bus_buffers_and_wakes_subscribers():
+    import asyncio
+
+    from backend.events import StockEventBus
+
+    bus = StockEventBus(capacity=3)
+    bus.publish([{"type": "stock", "product_name": f"P{i}"} for i in range(5)])
+    assert bus.since(0) == [{"seq": 5, "type": "reset"}]
+    assert [item["seq"] for item in bus.since(3)] == [4, 5]
+
+    async def consume():
+        stream = bus.subscribe(bus.last_seq, heartbeat=0.05)
+        assert await stream.__anext__() == []  # idle heartbeat
+        asyncio.get_running_loop().call_later(
+            0.01, bus.publish, [{"type": "stock", "product_name": "P5"}]
+        )
+        batch = await stream.__anext__()
+        await stream.aclose()
+        return batch
+
+    assert [item["seq"] for item in asyncio.run(consume())] == [6]
+
+
+def test_responses_negotiate_msgpack_and_compress_large_bodies(client):
+    import msgpack
+
+    client.post("/detections/", json=[_sample_detection(f"P{i}", "A1") for i in range(40)])
+    as_json = client.get("/stock/summary")
+    assert as_json.headers["content-type"] == "application/json"
+
+    packed = client.get("/stock/summary", headers={"Accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(packed.content) == as_json.json()
+
+    alerts = client.get("/alerts", headers={"Accept": "application/x-msgpack, application/json;q=0.5"})
+    assert msgpack.unpackb(alerts.content) == client.get("/alerts").json()
+
+    compressed = client.get("/stock/summary", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.json() == as_json.json()
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_catalog_indexes_and_hot_reload(tmp_path, monkeypatch):
+    import os
+
+    from backend import catalog as catalog_module
+    from backend.versioning import data_version
+
+    path = tmp_path / "catalog.csv"
+    path.write_text(
+        "product_name,display_name,category,price\n"
+        "sku_1,Oat Milk,Dairy,3.50\n"
+        "sku_2,Rye Bread,Bakery,2.25\n"
+        "sku_3,Goat Cheese,Dairy,6.00\n"
+    )
+    store = catalog_module.CatalogStore(path, reload_interval=0)
+    current = store.get()
+    assert current.resolve("OAT MILK") == "sku_1"
+    assert current.resolve("unknown item") == "unknown item"
+    assert current.in_category("Dairy") == ("sku_1", "sku_3")
+    assert (current.price("sku_2"), current.category("nope"), current.display_name("nope")) == (
+        2.25, "Other", "nope",
+    )
+
+    version = data_version.current()
+    path.write_text("product_name,display_name,category,price\nsku_9,Tea,Beverages,1.0\n")
+    os.utime(path, ns=(1, 1))
+    assert store.reload_if_changed()
+    assert [p.product_name for p in store.get()] == ["sku_9"]
+    assert data_version.current() > version
+
+    monkeypatch.setattr(catalog_module, "catalog_store", store)
+    assert TestClient(app).get("/products").json() == [
+        {"product_name": "sku_9", "display_name": "Tea", "category": "Beverages", "price": 1.0}
+    ]
+
+    fallback = catalog_module.CatalogStore(tmp_path / "missing.csv", reload_interval=0).get()
+    assert fallback.resolve("nutella hazelnut spread") == "grozi_29"
+
+
+def test_catalog_change_invalidates_etag_before_revalidation(tmp_path, monkeypatch):
+    import os
+
+    from backend import catalog as catalog_module
+
+    path = tmp_path / "catalog.csv"
+    path.write_text("product_name,display_name,category,price\nsku_1,Oat Milk,Dairy,3.50\n")
+    store = catalog_module.CatalogStore(path, reload_interval=0.01)
+    monkeypatch.setattr(catalog_module, "catalog_store", store)
+    client = TestClient(app)
+    first = client.get("/products")
+    assert first.json()[0]["display_name"] == "Oat Milk"
+
+    path.write_text("product_name,display_name,category,price\nsku_1,Soy Milk,Dairy,3.50\n")
+    os.utime(path, ns=(1, 1))
+    time.sleep(0.02)
+    revalidated = client.get("/products", headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 200
+    assert revalidated.json()[0]["display_name"] == "Soy Milk"
+    assert revalidated.headers["etag"] != first.headers["etag"]
+
+
+def test_product_search_and_fuzzy_shopping_list(client, setup_database):
+    hits = client.get("/products/search", params={"q": "nutela"}).json()
+    assert hits[0]["product_name"] == "grozi_29"
+    assert client.get("/products/search", params={"q": "corn flakes"}).json()[0]["display_name"] == (
+        "Kellogg's Corn Flakes"
+    )
+    assert client.get("/products/search", params={"q": "qqqq"}).json() == []
+
+    setup_database.add(models.Planogram(product_name="grozi_29", shelf_id="C3", expected_stock=10))
+    setup_database.commit()
+    items = client.post("/shopping-list", json={"items": ["nutela", "pringels", "Dragonfruit"]}).json()
+    assert [(i["product_name"], i["shelf_id"]) for i in items["items"]] == [
+        ("grozi_29", "C3"),
+        ("grozi_31", None),
+        ("Dragonfruit", None),
+    ]
+
+
+def test_alert_engine_opens_dedupes_and_auto_resolves(client, setup_database):
+    from backend.events import stock_events
+
+    setup_database.add(models.Planogram(product_name="Soup", shelf_id="D1", expected_stock=10))
+    setup_database.commit()
+
+    def open_alerts():
+        return [(a["product_name"], a["alert_type"]) for a in client.get("/alerts").json()]
+
+    client.post("/detections/", json=[_sample_detection("Soup", "D1")] * 2)
+    assert open_alerts() == [("Soup", "LOW_STOCK")]
+
+    # Still low: the open alert is kept rather than duplicated.
+    client.post("/detections/", json=[_sample_detection("Soup", "D1")])
+    assert open_alerts() == [("Soup", "LOW_STOCK")]
+
+    seq = stock_events.last_seq
+    client.post("/detections/", json=[_sample_detection("Soup", "D1")] * 5)
+    assert open_alerts() == []
+    resolved = client.get("/alerts", params={"resolved": True}).json()
+    assert [(a["alert_type"], a["resolved"]) for a in resolved] == [("LOW_STOCK", True)]
+    assert ("alert", "resolved") in [
+        (e["type"], e.get("action")) for e in stock_events.since(seq)
+    ]
+
+    # Raising the expectation re-evaluates without any new detections.
+    client.post("/alerts", json={"product_name": "Soup", "alert_type": "RECALL", "message": "manual"})
+    from backend import crud
+    from backend.schemas import PlanogramCreate
+
+    crud.create_or_update_planogram(
+        setup_database, PlanogramCreate(product_name="Soup", shelf_id="D1", expected_stock=40)
+    )
+    assert sorted(open_alerts()) == [("Soup", "LOW_STOCK"), ("Soup", "RECALL")]
+
+
+def test_open_alerts_stay_unique_under_a_racing_evaluation(client, setup_database, monkeypatch):
+    from sqlalchemy import false, select
+
+    from backend import alerts
+
+    before = datetime.utcnow()
+    manual = client.post("/alerts", json={"product_name": "Soup", "alert_type": "LOW_STOCK", "message": "low"})
+    assert before <= datetime.fromisoformat(manual.json()["created_at"]) <= datetime.utcnow()
+
+    # Another transaction opened the alert after this one read the open alerts.
+    monkeypatch.setattr(alerts, "open_alerts_query", lambda names: select(models.Alert.id).where(false()))
+    assert client.post("/detections/", json=[_sample_detection("Soup", "D1")]).status_code == 200
+    open_soup = client.get("/alerts").json()
+    assert [(a["product_name"], a["alert_type"]) for a in open_soup] == [("Soup", "LOW_STOCK")]
+
+    duplicate = client.post("/alerts", json={"product_name": "Soup", "alert_type": "LOW_STOCK", "message": "low"})
+    assert duplicate.status_code == 409
+
+
+def test_alert_engine_adds_constant_queries_per_batch(client, setup_database, monkeypatch):
+    from backend.config import settings
+
+    minimal = {"Prefer": "return=minimal"}
+    client.post("/detections/", json=[_sample_detection("Warmup", "S9")], headers=minimal)  # loads the planogram cache
+    with _QueryCounter() as small:
+        client.post("/detections/", json=[_sample_detection(f"A{i}") for i in range(2)], headers=minimal)
+    large_batch = [_sample_detection(f"B{i}", "S2") for i in range(200)]
+    with _QueryCounter() as large:
+        client.post("/detections/", json=large_batch, headers=minimal)
+    assert large.count == small.count
+
+    # A rescan that leaves every count unchanged skips evaluation entirely.
+    with _QueryCounter() as rescan:
+        client.post("/detections/", json=large_batch, headers=minimal)
+    monkeypatch.setattr(settings, "alert_engine", False)
+    with _QueryCounter() as without_engine:
+        client.post("/detections/", json=large_batch, headers=minimal)
+    assert rescan.count == without_engine.count < large.count
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    from alembic import command
+    from alembic.autogenerate import compare_metadata
+    from alembic.config import Config
+    from alembic.migration import MigrationContext
+    from sqlalchemy import inspect
+
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    with migrated.connect() as connection:
+        config = Config(str(ROOT / "alembic.ini"))
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0002")
+        connection.execute(
+            text(
+                "INSERT INTO stock_aggregate (product_name, shelf_id, count, last_seen) "
+                "VALUES ('Milk', 'A1', 4, '2026-01-01 10:00:00'), ('Eggs', 'A1', 2, NULL)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO alerts (product_name, alert_type, message, created_at, resolved) VALUES "
+                "('Milk', 'LOW_STOCK', 'low', '2026-01-01', 0), ('Milk', 'LOW_STOCK', 'low', '2026-01-02', 0)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO stock_snapshots (product_name, count, snapshot_time) VALUES "
+                "('Milk', 4, '2026-01-01 10:00:00'), ('Milk', 4, '2026-01-01 10:00:00')"
+            )
+        )
+        connection.commit()
+        command.upgrade(config, "head")
+        connection.commit()
+        assert compare_metadata(MigrationContext.configure(connection), models.Base.metadata) == []
+        # Cumulative totals carry over as one synthetic scan of the shelf.
+        carried = connection.execute(
+            text("SELECT product_name, count, scan_id FROM shelf_state ORDER BY product_name")
+        ).all()
+        assert [(name, count) for name, count, _ in carried] == [("Eggs", 2), ("Milk", 4)]
+        assert len({scan_id for *_, scan_id in carried}) == 1
+        # Duplicate open alerts collapse to the oldest before the unique index is built.
+        assert connection.execute(text("SELECT id FROM alerts WHERE resolved = 0")).all() == [(1,)]
+        assert connection.execute(text("SELECT id FROM stock_snapshots")).all() == [(1,)]
+        connection.rollback()
+
+        command.downgrade(config, "0001")
+        connection.commit()
+        alert_indexes = {index["name"] for index in inspect(connection).get_indexes("alerts")}
+        assert "ix_alerts_product_name" in alert_indexes
+        assert "ix_alerts_unresolved_created" not in alert_indexes
+    migrated.dispose()
+
+
+def test_migrations_upgrade_a_detections_table_created_at_head(tmp_path):
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import inspect
+
+    # `partitions create` builds product_detections with today's columns before migrating.
+    migrated = create_engine(f"sqlite:///{tmp_path / 'partitioned.db'}")
+    models.Base.metadata.create_all(migrated, tables=[models.ProductDetection.__table__])
+    with migrated.connect() as connection:
+        config = Config(str(ROOT / "alembic.ini"))
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        connection.commit()
+        columns = [column["name"] for column in inspect(connection).get_columns("product_detections")]
+    assert columns.count("scan_id") == 1 and columns.count("store_id") == 1
+    migrated.dispose()
+
+
+def test_migrations_upgrade_a_database_created_at_head(tmp_path):
+    from alembic import command
+    from alembic.autogenerate import compare_metadata
+    from alembic.config import Config
+    from alembic.migration import MigrationContext
+    from sqlalchemy import inspect
+
+    # init_db.sql, init_postgres.py and create_all build today's schema before any migration.
+    migrated = create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+    models.Base.metadata.create_all(migrated)
+    with migrated.connect() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO shelf_state (product_name, shelf_id, count, scan_id, captured_at) "
+                "VALUES ('Milk', 'A1', 3, 1, '2026-01-01 10:00:00')"
+            )
+        )
+        connection.commit()
+        config = Config(str(ROOT / "alembic.ini"))
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        connection.commit()
+        assert compare_metadata(MigrationContext.configure(connection), models.Base.metadata) == []
+        assert not inspect(connection).has_table("stock_aggregate")
+        assert connection.execute(text("SELECT product_name, count FROM shelf_state")).all() == [("Milk", 3)]
+    migrated.dispose()
+
+
+def test_open_alert_queries_use_partial_indexes(setup_database):
+    from backend import alerts, crud
+
+    def plan(stmt):
+        sql = stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+        return " ".join(row[-1] for row in setup_database.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+    listing = plan(crud.alerts_query(False, crud.encode_cursor(datetime.utcnow(), 10), 50))
+    assert "ix_alerts_unresolved_created" in listing
+    assert "TEMP B-TREE" not in listing
+    assert "uq_alerts_unresolved_product" in plan(alerts.open_alerts_query(["Soup"]))